@@ -5,13 +5,16 @@ from datetime import datetime, timedelta
 import numpy as np
 
 class NumerAPI(object):
-    def __init__(self, email, password):
+    def __init__(self, email, password, session=None):
         self._login_url = 'https://api.numer.ai/sessions'
         self._auth_url = 'https://api.numer.ai/upload/auth'
         self._dataset_url = 'https://api.numer.ai/competitions/current/dataset'
         self._submissions_url = 'https://api.numer.ai/submissions'
         self._users_url = 'https://api.numer.ai/users'
         self._payload = {'email':email, 'password':password}
+        # A requests.Session reuses the connections among calls. Without it every call opens a new one
+        self._session = session
+        self._http = requests if session is None else session
 
 
 
@@ -20,7 +23,7 @@ class NumerAPI(object):
         file_name = 'numerai_dataset_{0}.zip'.format(now)
         dest_file_path ='{0}/{1}'.format(dest_path, file_name)
 
-        r = requests.get(self._dataset_url)
+        r = self._http.get(self._dataset_url)
         if r.status_code!=200:
             return r.status_code
 
@@ -42,7 +45,7 @@ class NumerAPI(object):
 
         url = 'https://api.numer.ai/competitions?{ leaderboard :'
         url += ' current , end_date :{ $gt : %s }}'
-        r = requests.get((url % (dt_str)).replace(' ', '%22'))
+        r = self._http.get((url % (dt_str)).replace(' ', '%22'))
         if r.status_code!=200:
             return (None, r.status_code)
         return (r.json(), r.status_code)
@@ -50,7 +53,7 @@ class NumerAPI(object):
 
 
     def get_earnings_per_round(self, username):
-        r = requests.get('{0}/{1}'.format(self._users_url, username))
+        r = self._http.get('{0}/{1}'.format(self._users_url, username))
         if r.status_code!=200:
             return (None, r.status_code)
 
@@ -64,7 +67,7 @@ class NumerAPI(object):
 
 
     def get_scores(self, username):
-        r = requests.get('{0}/{1}'.format(self._users_url, username))
+        r = self._http.get('{0}/{1}'.format(self._users_url, username))
         if r.status_code!=200:
             return (None, r.status_code)
 
@@ -90,7 +93,7 @@ class NumerAPI(object):
 
 
     def login(self):
-        r = requests.post(self._login_url, data=self._payload)
+        r = self._http.post(self._login_url, data=self._payload)
         if r.status_code!=201:
             return (None, None, None, r.status_code)
 
@@ -106,7 +109,7 @@ class NumerAPI(object):
 
         headers = {'Authorization':'Bearer {0}'.format(accessToken)}
 
-        r = requests.post(self._auth_url,
+        r = self._http.post(self._auth_url,
                     data={'filename':file_path.split('/')[-1], 'mimetype': 'text/csv'},
                     headers=headers)
         if r.status_code!=200:
@@ -143,12 +146,12 @@ class NumerAPI(object):
         with open(file_path, 'rb') as fp:
             r = requests.Request('PUT', signedRequest, data=fp.read())
             prepped = r.prepare()
-            s = requests.Session()
+            s = requests.Session() if self._session is None else self._session
             resp = s.send(prepped)
             if resp.status_code!=200:
                 return resp.status_code
 
-        r = requests.post(self._submissions_url,
+        r = self._http.post(self._submissions_url,
                     data={'competition_id':comp_id, 'dataset_id':dataset_id, 'filename':filename},
                     headers=headers)
 
@@ -0,0 +1,106 @@
+import shutil
+import logging
+import tempfile
+import numpy as np
+from collections import OrderedDict
+from sklearn.externals.joblib import Parallel, delayed
+
+__author__ = "ivallesp"
+
+# Models loaded by each worker process, so that every worker loads (memory maps) each model once for all its chunks
+_loaded_models = {}
+
+
+def _get_loaded_model(version, alias):
+    """
+    Retrieves a stored model, loading it only the first time it is requested in the process.
+    :param version: version of the data the model was trained with (str|unicode)
+    :param alias: alias of the model (str|unicode)
+    :return: the fitted model (sklearn object)
+    """
+    from src.model_store import load_model
+    if (version, alias) not in _loaded_models:
+        _loaded_models[(version, alias)] = load_model(version, alias)
+    return _loaded_models[(version, alias)]
+
+
+def _score_chunk(version, alias, X, start, stop):
+    """
+    Scores a chunk of rows with a stored model.
+    :param X: features of the whole dataset, memory mapped (np.memmap)
+    :param start: first row of the chunk (int)
+    :param stop: row after the last one of the chunk (int)
+    :return: predicted probabilities of the positive class (np.array)
+    """
+    return _get_loaded_model(version, alias).predict_proba(X[start:stop])[:, 1]
+
+
+def _get_models_features(version, aliases):
+    """
+    Retrieves the features the models were trained with, from their stored metadata. All of them must share them.
+    :param version: version of the data (str|unicode)
+    :param aliases: aliases of the models (list)
+    :return: names of the features, or None if the metadata does not contain them (list|None)
+    """
+    from src.model_store import load_model_metadata
+    features = [load_model_metadata(version, alias)["metadata"].get("features") for alias in aliases]
+    assert all(f == features[0] for f in features), "All the models must be trained over the same features"
+    return features[0]
+
+
+def score_stored_models(version, aliases=None, chunksize=50000, n_jobs=1, verbose=0):
+    """
+    Scores the tournament dataset with several stored models in a single pass. The tournament is read once and its
+    features are stored as a contiguous memory mapped array shared by the worker processes, which score every chunk
+    with every model. The chunks are scored in order, so each chunk is scored by all the models while it is hot in the
+    page cache.
+    :param version: version of the data, used both for the models and the tournament (str|unicode)
+    :param aliases: aliases of the models. If None, every stored model of the version is used (list|None)
+    :param chunksize: number of rows scored at a time (int)
+    :param n_jobs: number of worker processes (int)
+    :param verbose: verbosity level (int)
+    :return: the tournament ids and an alias -> predicted probabilities mapping (np.array, OrderedDict)
+    """
+    logger = logging.getLogger(__name__)
+    from src.file_loaders import load_tournament_data
+    from src.model_store import list_models
+    from src.model_helpers import _dump_to_memmap
+    aliases = list_models(version) if aliases is None else aliases
+    logger.info("Requested batch scoring of {0} models over the tournament of {1}".format(len(aliases), version))
+    df = load_tournament_data(version)
+    features = _get_models_features(version, aliases)
+    if features is None:
+        features = list(df.columns[df.columns.str.startswith("feature")])
+    ids = df["t_id"].values
+    memmap_folder = tempfile.mkdtemp(prefix="numerai_inference_")
+    try:
+        X = _dump_to_memmap(df[features], memmap_folder, dtype=np.float64)
+        del df
+        chunks = [(start, min(start + chunksize, X.shape[0])) for start in range(0, X.shape[0], chunksize)]
+        jobs = [(alias, start, stop) for start, stop in chunks for alias in aliases]
+        logger.info("Scoring {0} chunks with {1} models using {2} jobs".format(len(chunks), len(aliases), n_jobs))
+        out = Parallel(n_jobs=n_jobs, verbose=verbose)(
+            delayed(_score_chunk)(version, alias, X, start, stop) for alias, start, stop in jobs)
+    finally:
+        _loaded_models.clear()
+        shutil.rmtree(memmap_folder, ignore_errors=True)
+    probs = OrderedDict((alias, np.empty(len(ids))) for alias in aliases)
+    for (alias, start, stop), chunk_probs in zip(jobs, out):
+        probs[alias][start:stop] = chunk_probs
+    return ids, probs
+
+
+def build_batch_submissions(version, aliases=None, chunksize=50000, n_jobs=1, replace=True):
+    """
+    Scores the tournament with several stored models in a single pass and builds the submission of each one of them.
+    :param version: version of the data (str|unicode)
+    :param aliases: aliases of the models. If None, every stored model of the version is used (list|None)
+    :param chunksize: number of rows scored at a time (int)
+    :param n_jobs: number of worker processes (int)
+    :param replace: if True, existing submissions with the same aliases are overwritten (bool)
+    :return: aliases of the submissions built (list)
+    """
+    from src.numerai_utilities import build_submissions
+    ids, probs = score_stored_models(version, aliases, chunksize, n_jobs)
+    build_submissions(version, ids, probs, replace=replace)
+    return list(probs)
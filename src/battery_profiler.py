@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import logging
+import resource
+import traceback
+import multiprocessing
+import numpy as np
+from collections import OrderedDict
+from sklearn.base import clone
+from sklearn.externals import joblib
+from sklearn.model_selection import ParameterGrid
+from sklearn.utils import safe_indexing
+
+__author__ = "ivallesp"
+
+DEFAULT_PROFILE_SIZES = [500, 1000, 2000]
+# Bounds of the exponents of the power laws fitted to the measurements. Noisy measurements over small subsamples can
+# otherwise extrapolate absurd growths
+EXPONENT_BOUNDS = (0.0, 3.0)
+
+
+def _read_proc_status(field):
+    """
+    Reads a memory field of /proc/self/status, in kilobytes.
+    :param field: name of the field, e.g. VmHWM (str)
+    :return: value of the field, or None if /proc is not available (int|None)
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("{0}:".format(field)):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """
+    Resets the peak resident memory of the current process to its current resident memory, so that the peak of the
+    following work can be read from VmHWM. Only available in Linux >= 4.0.
+    :return: the current resident memory in kilobytes, or None if the peak could not be reset (int|None)
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except IOError:
+        return None
+    return _read_proc_status("VmRSS")
+
+
+def _measure_fit_job(queue, estimator, X, y):
+    """
+    Fits the estimator and puts the fit time and the peak memory increase, in megabytes, in the queue. Executed in a
+    separate process, so that the peak memory of the fit is not masked by the one of the parent. The forked process
+    inherits the peak resident memory of the parent, so it is reset before the fit and the increase is measured over
+    the resident memory of the process at that point. Where it can not be reset, ru_maxrss is used instead, which
+    understates the peak of the fits which stay below the inherited peak.
+    :return: None (void)
+    """
+    try:
+        rss_before = _reset_peak_rss()
+        peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.time()
+        estimator.fit(X, y)
+        fit_time = time.time() - start
+        if rss_before is not None:
+            peak_increase = _read_proc_status("VmHWM") - rss_before
+        else:
+            peak_increase = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak_before
+        queue.put((fit_time, max(0, peak_increase) / 1024., None))
+    except Exception:
+        queue.put((None, None, traceback.format_exc()))
+
+
+def measure_fit(estimator, X, y):
+    """
+    Measures the fit time and the peak memory needed for fitting an estimator, in a separate process.
+    :param estimator: sklearn-like model (sklearn object)
+    :param X: features (np.array|pd.DataFrame)
+    :param y: target (np.array|pd.Series)
+    :return: fit time in seconds and peak memory increase in megabytes (float, float)
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure_fit_job, args=(queue, estimator, X, y))
+    process.start()
+    fit_time, peak_memory, error = queue.get()
+    process.join()
+    if error is not None:
+        raise RuntimeError("The profiled fit failed:\n{0}".format(error))
+    return fit_time, peak_memory
+
+
+def fit_power_law(sizes, values):
+    """
+    Fits value = a * size ^ b by least squares over the logarithms of the measurements.
+    :param sizes: number of rows of each measurement (list)
+    :param values: measured values (list)
+    :return: coefficient and exponent (float, float)
+    """
+    log_sizes = np.log(np.asarray(sizes, dtype=np.float64))
+    log_values = np.log(np.maximum(np.asarray(values, dtype=np.float64), 1e-6))
+    exponent, intercept = np.polyfit(log_sizes, log_values, 1)
+    exponent = float(np.clip(exponent, *EXPONENT_BOUNDS))
+    # The coefficient is refitted for the clipped exponent
+    coefficient = float(np.exp(np.mean(log_values - exponent * log_sizes)))
+    return coefficient, exponent
+
+
+def profile_candidate(estimator, params, X, y, sizes=DEFAULT_PROFILE_SIZES, random_state=655321):
+    """
+    Fits a candidate over random subsamples of increasing size and measures the fit time and peak memory of each fit.
+    :param estimator: sklearn-like model (sklearn object)
+    :param params: parameters of the candidate (dict)
+    :param sizes: number of rows of each subsample. The ones greater than the data size are ignored (list)
+    :param random_state: seed used for drawing the subsamples (int)
+    :return: measurements, one dict per subsample with the size, fit time and peak memory (list of dicts)
+    """
+    rows_order = np.random.RandomState(random_state).permutation(len(y))
+    measurements = []
+    for size in [size for size in sizes if size <= len(y)]:
+        rows = np.sort(rows_order[:size])
+        fit_time, peak_memory = measure_fit(clone(estimator).set_params(**params), safe_indexing(X, rows),
+                                            safe_indexing(y, rows))
+        measurements.append({"n_samples": size, "fit_time": fit_time, "peak_memory": peak_memory})
+    return measurements
+
+
+def _get_plan_path(cache, alias, model, param_grid, X, cv, sizes, n_profiled, random_state):
+    """
+    Builds the path of the memoized plan of a battery entry. The plan depends on the entry and the profiling settings
+    and on the shape of the data, but not on its values.
+    :return: path of the plan (str|unicode)
+    """
+    key = joblib.hash((clone(model), param_grid, np.shape(X), cv, list(sizes), n_profiled, random_state))
+    return os.path.join(cache, "{0}_{1}.json".format(alias, key))
+
+
+def profile_battery(X, y, battery, cv=10, sizes=DEFAULT_PROFILE_SIZES, n_profiled=3, random_state=655321,
+                    cache=None):
+    """
+    Estimates the cost of every entry of a battery before running it. A few random candidates of each grid are fitted
+    over small subsamples and power laws of the fit time and peak memory on the number of rows are extrapolated to the
+    size of the cross validation train folds. The plans can be memoized in a folder and reused in later runs over data
+    of the same shape.
+    :param X: features (np.array|pd.DataFrame)
+    :param y: target (np.array|pd.Series)
+    :param battery: list of (alias, model, param_grid) tuples (list)
+    :param cv: number of folds of the grid search (int)
+    :param sizes: number of rows of the profiling subsamples (list)
+    :param n_profiled: number of candidates of each grid profiled (int)
+    :param random_state: seed used for choosing the candidates and drawing the subsamples (int)
+    :param cache: folder where the plans are memoized, or True for using the default one. If None, every entry is
+    profiled (str|unicode|bool|None)
+    :return: alias -> plan mapping. Each plan contains the number of candidates and fits, the estimated fit time per
+    candidate and fold, the estimated total fit time (in CPU seconds, including the refit) and the estimated peak
+    memory in megabytes (OrderedDict)
+    """
+    logger = logging.getLogger(__name__)
+    from src.battery_scheduler import cap_inner_jobs
+    if cache is True:
+        from src.common_paths import get_profiles_path
+        cache = get_profiles_path()
+    n_train = int(len(y) * (cv - 1) / float(cv))
+    plans = OrderedDict()
+    for alias, model, param_grid in battery:
+        plan_path = None
+        if cache is not None:
+            plan_path = _get_plan_path(cache, alias, model, param_grid, X, cv, sizes, n_profiled, random_state)
+            if os.path.exists(plan_path):
+                with open(plan_path) as f:
+                    plans[alias] = json.load(f)
+                logger.info("Reusing the stored plan of {0}".format(alias))
+                continue
+        # Each entry draws from its own generator so that its plan does not depend on the memoized ones
+        rng = np.random.RandomState(random_state)
+        candidates = list(ParameterGrid(cap_inner_jobs(param_grid)))
+        profiled = [candidates[i] for i in rng.choice(len(candidates), min(n_profiled, len(candidates)),
+                                                      replace=False)]
+        logger.info("Profiling {0}: {1} of {2} candidates".format(alias, len(profiled), len(candidates)))
+        fit_times, peak_memories, time_exponents, memory_exponents = [], [], [], []
+        for params in profiled:
+            measurements = profile_candidate(model, params, X, y, sizes, random_state)
+            n_samples = [m["n_samples"] for m in measurements]
+            coefficient, exponent = fit_power_law(n_samples, [m["fit_time"] for m in measurements])
+            fit_times.append(coefficient * n_train ** exponent)
+            time_exponents.append(exponent)
+            coefficient, exponent = fit_power_law(n_samples, [m["peak_memory"] for m in measurements])
+            peak_memories.append(coefficient * n_train ** exponent)
+            memory_exponents.append(exponent)
+        fit_time = float(np.mean(fit_times))
+        plans[alias] = {"n_candidates": len(candidates),
+                        "n_fits": len(candidates) * cv + 1,
+                        "fit_time": fit_time,
+                        "total_fit_time": fit_time * (len(candidates) * cv + 1),
+                        "peak_memory": float(np.max(peak_memories)),
+                        "time_exponent": float(np.mean(time_exponents)),
+                        "memory_exponent": float(np.mean(memory_exponents))}
+        logger.info("Plan of {0}: {1} fits of {2:.1f}s each ({3:.1f} CPU hours), {4:.0f}MB of peak memory"
+                    .format(alias, plans[alias]["n_fits"], fit_time, plans[alias]["total_fit_time"] / 3600.,
+                            plans[alias]["peak_memory"]))
+        if plan_path is not None:
+            with open(plan_path, "w") as f:
+                json.dump(plans[alias], f)
+    return plans
+
+
+def get_battery_costs(plans):
+    """
+    Extracts the estimated cost of each battery entry from its plan, in the format expected by run_model_battery.
+    :param plans: alias -> plan mapping, as returned by profile_battery (dict)
+    :return: alias -> estimated total fit time mapping (OrderedDict)
+    """
+    return OrderedDict((alias, plan["total_fit_time"]) for alias, plan in plans.items())
+
+
+def fit_battery_to_budget(battery, plans, time_budget=None, memory_budget=None, random_state=655321):
+    """
+    Reshapes a battery so that every entry fits in the budgets: the entries whose peak memory exceeds the memory
+    budget are skipped and the grids whose total fit time exceeds the time budget are replaced by a random subset of
+    their candidates which fits in it.
+    :param battery: list of (alias, model, param_grid) tuples (list)
+    :param plans: alias -> plan mapping, as returned by profile_battery (dict)
+    :param time_budget: maximum total fit time of an entry, in CPU seconds. If None, there is no limit (float|None)
+    :param memory_budget: maximum peak memory of a fit, in megabytes. If None, there is no limit (float|None)
+    :param random_state: seed used for choosing the candidates kept (int)
+    :return: the reshaped battery (list)
+    """
+    logger = logging.getLogger(__name__)
+    rng = np.random.RandomState(random_state)
+    reshaped = []
+    for alias, model, param_grid in battery:
+        plan = plans[alias]
+        if memory_budget is not None and plan["peak_memory"] > memory_budget:
+            logger.warning("Skipping {0}: it needs {1:.0f}MB and the budget is {2:.0f}MB"
+                           .format(alias, plan["peak_memory"], memory_budget))
+            continue
+        if time_budget is not None and plan["total_fit_time"] > time_budget:
+            n_fits_per_candidate = plan["n_fits"] / float(plan["n_candidates"])
+            n_kept = int(time_budget / (plan["fit_time"] * n_fits_per_candidate))
+            if n_kept == 0:
+                logger.warning("Skipping {0}: a single candidate exceeds the time budget".format(alias))
+                continue
+            candidates = list(ParameterGrid(param_grid))
+            kept = sorted(rng.choice(len(candidates), n_kept, replace=False))
+            logger.warning("Reshaping {0}: keeping {1} of its {2} candidates to fit in the time budget"
+                           .format(alias, n_kept, len(candidates)))
+            param_grid = [dict((name, [value]) for name, value in candidates[i].items()) for i in kept]
+        reshaped.append((alias, model, param_grid))
+    return reshaped
@@ -0,0 +1,255 @@
+import os
+import shutil
+import logging
+import tempfile
+import traceback
+import contextlib
+import multiprocessing
+from Queue import Empty
+from collections import OrderedDict
+from sklearn.model_selection import ParameterGrid
+
+__author__ = "ivallesp"
+
+# Relative cost of a single fit of each battery estimator, identified by the name of the last step of its pipeline
+ESTIMATOR_COSTS = {"nb": 1, "glm": 5, "glmnet": 5, "tree": 5, "knn": 20, "hgb": 20, "mlp": 50, "svc": 100,
+                   "et": 150, "rf": 200}
+DEFAULT_ESTIMATOR_COST = 10
+INNER_THREADS_VARIABLES = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]
+# Seconds a job process is given for exiting after its result has been received, before terminating it
+JOIN_TIMEOUT = 10
+
+
+def _get_estimator_name(estimator):
+    """
+    Retrieves the name identifying an estimator: the name of the last step if it is a pipeline or the class name
+    otherwise.
+    :param estimator: sklearn-like model (sklearn object)
+    :return: name of the estimator (str)
+    """
+    if hasattr(estimator, "steps"):
+        return estimator.steps[-1][0]
+    return type(estimator).__name__
+
+
+def _count_candidates(param_grid):
+    """
+    Counts the number of parameter sets of a grid.
+    :param param_grid: dictionary or list of dictionaries of parameters (dict|list)
+    :return: number of parameter sets (int)
+    """
+    return len(ParameterGrid(param_grid))
+
+
+def estimate_battery_cost(battery, cv=10, estimator_costs=None):
+    """
+    Estimates the relative cost of each entry of a battery as the cost of a single fit times the number of fits
+    needed by the grid search.
+    :param battery: list of (alias, model, param_grid) tuples (list)
+    :param cv: number of folds (int)
+    :param estimator_costs: cost of a single fit of each estimator. If None, ESTIMATOR_COSTS is used (dict|None)
+    :return: alias -> cost mapping (OrderedDict)
+    """
+    estimator_costs = ESTIMATOR_COSTS if estimator_costs is None else estimator_costs
+    costs = OrderedDict()
+    for alias, model, params in battery:
+        fit_cost = estimator_costs.get(_get_estimator_name(model), DEFAULT_ESTIMATOR_COST)
+        costs[alias] = fit_cost * _count_candidates(params) * cv
+    return costs
+
+
+def allocate_cores(costs, n_cores, max_cores=None):
+    """
+    Assigns a number of cores to each job proportionally to its cost. Every job gets at least one core and never more
+    than n_cores or its maximum.
+    :param costs: alias -> cost mapping (dict)
+    :param n_cores: number of cores available (int)
+    :param max_cores: alias -> maximum number of cores the job can use (dict|None)
+    :return: alias -> number of cores mapping (OrderedDict)
+    """
+    total_cost = float(sum(costs.values())) or 1.0
+    cores = OrderedDict()
+    for alias, cost in costs.items():
+        n = int(round(n_cores * cost / total_cost))
+        if max_cores is not None:
+            n = min(n, max_cores[alias])
+        cores[alias] = max(1, min(n_cores, n))
+    return cores
+
+
+@contextlib.contextmanager
+def limit_inner_threads(n_threads=1):
+    """
+    Caps the number of threads used by BLAS/OpenMP in the current process while the context is active, so that a
+    worker process does not oversubscribe the cores assigned to it, and restores the previous limits afterwards. The
+    thread pools of the libraries already loaded (e.g. the BLAS a forked worker inherits from its parent) can only be
+    resized at runtime, which is done with threadpoolctl if it is installed; the environment variables only affect the
+    libraries initialized inside the context. Variables already defined by the user are respected.
+    :param n_threads: number of threads (int)
+    :return: None (void)
+    """
+    logger = logging.getLogger(__name__)
+    previous = dict((variable, os.environ.get(variable)) for variable in INNER_THREADS_VARIABLES)
+    for variable in INNER_THREADS_VARIABLES:
+        os.environ.setdefault(variable, str(n_threads))
+    limiter = None
+    try:
+        from threadpoolctl import threadpool_limits
+        limiter = threadpool_limits(limits=n_threads)
+    except ImportError:
+        logger.warning("threadpoolctl is not installed: the BLAS/OpenMP libraries already loaded are not capped")
+    try:
+        yield
+    finally:
+        if limiter is not None:
+            limiter.restore_original_limits()
+        for variable, value in previous.items():
+            if value is None:
+                os.environ.pop(variable, None)
+            else:
+                os.environ[variable] = value
+
+
+def cap_inner_jobs(param_grid):
+    """
+    Forces every n_jobs parameter of a grid to 1, so that the parallelism is handled by the grid search only.
+    :param param_grid: dictionary or list of dictionaries of parameters (dict|list)
+    :return: the capped grid (dict|list)
+    """
+    if isinstance(param_grid, dict):
+        return dict((k, [1] if k.endswith("n_jobs") else v) for k, v in param_grid.items())
+    return [cap_inner_jobs(grid) for grid in param_grid]
+
+
+def _get_process_context():
+    """
+    Retrieves the multiprocessing context the battery jobs are launched from: forkserver (or spawn) where the start
+    methods can be chosen, so that the jobs do not inherit the threads and executors of the parent, and the default
+    fork otherwise (Python 2).
+    :return: context exposing Process and Queue (multiprocessing context|module)
+    """
+    if not hasattr(multiprocessing, "get_context"):
+        return multiprocessing
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def _run_battery_job(queue, alias, X_path, y, model, params, n_jobs, cv, verbose, search_kwargs):
+    """
+    Trains a battery entry and puts the result in the queue. Executed in a separate process, which attaches to the
+    memory mapped features. The search runs its jobs in a multiprocessing pool, which is closed when the search
+    finishes; reusable executors (e.g. the loky one) would keep the process alive after its result is reported.
+    :return: None (void)
+    """
+    import numpy as np
+    from sklearn.externals.joblib import parallel_backend
+    from src.model_helpers import train_model_with_gridsearch
+    try:
+        X = np.load(X_path, mmap_mode="r")
+        with limit_inner_threads(), parallel_backend("multiprocessing"):
+            model, results = train_model_with_gridsearch(X=X, y=y, estimator=model, param_grid=params, cv=cv,
+                                                         n_jobs=n_jobs, verbose=verbose, memmap=False,
+                                                         **search_kwargs)
+        queue.put((alias, model, results, None))
+    except Exception:
+        queue.put((alias, None, None, traceback.format_exc()))
+
+
+def run_model_battery(X, y, battery, n_cores=None, cv=10, costs=None, verbose=0, store_oof=False, poll_interval=5,
+                      errors=None, **search_kwargs):
+    """
+    Trains all the entries of a battery concurrently. Each entry gets a number of cores proportional to its estimated
+    cost and runs its grid search in a separate process with that number of jobs; the inner n_jobs of the estimators
+    and the BLAS/OpenMP threads of the process are capped to 1. Jobs are launched from the most to the least
+    expensive, whenever there are enough free cores. A job whose process dies without reporting (e.g. killed by the
+    OOM killer or by a segfault) is reported as failed. The failed jobs do not stop the rest: the entries which
+    finished are returned and the failures are logged and reported in the errors mapping.
+    :param X: features (np.array|pd.DataFrame)
+    :param y: target (np.array|pd.Series)
+    :param battery: list of (alias, model, param_grid) tuples (list)
+    :param n_cores: number of cores to use. If None, all of them are used (int|None)
+    :param cv: number of folds (int)
+    :param costs: alias -> estimated cost mapping. If None, it is estimated with estimate_battery_cost (dict|None)
+    :param verbose: verbosity level (int)
+    :param store_oof: if True, the out of fold predictions of every candidate are captured in the out of fold store of
+    its alias (bool)
+    :param poll_interval: seconds waited for a result before checking if any running process died (float)
+    :param errors: mapping filled with the alias -> error of the failed entries (dict|None)
+    :param search_kwargs: extra arguments passed to train_model_with_gridsearch
+    :return: alias -> (model, results) mapping of the entries which finished, in the battery order (OrderedDict)
+    """
+    logger = logging.getLogger(__name__)
+    from src.model_helpers import _dump_to_memmap
+    n_cores = n_cores or multiprocessing.cpu_count()
+    logger.info("Requested battery run of {0} models using {1} cores".format(len(battery), n_cores))
+    costs = costs or estimate_battery_cost(battery, cv)
+    max_cores = dict((alias, _count_candidates(params) * cv) for alias, _, params in battery)
+    cores = allocate_cores(costs, n_cores, max_cores)
+    logger.info("Cores assigned: {0}".format(dict(cores)))
+    jobs = dict((alias, (model, cap_inner_jobs(params))) for alias, model, params in battery)
+    pending = sorted(jobs, key=lambda alias: costs[alias], reverse=True)
+
+    memmap_folder = tempfile.mkdtemp(prefix="numerai_battery_")
+    context = _get_process_context()
+    queue = context.Queue()
+    running = {}
+    outputs = {}
+    errors = {} if errors is None else errors
+    exited = set()
+    free_cores = n_cores
+    try:
+        X_path = _dump_to_memmap(X, memmap_folder).filename
+        y = getattr(y, "values", y)
+        while pending or running:
+            launchable = [alias for alias in pending if cores[alias] <= free_cores]
+            if not running and not launchable:
+                launchable = pending[:1]
+            for alias in launchable:
+                if running and cores[alias] > free_cores:
+                    continue
+                model, params = jobs[alias]
+                logger.info("Launching {0} with {1} cores".format(alias, cores[alias]))
+                job_kwargs = dict(search_kwargs, oof_alias=alias) if store_oof else search_kwargs
+                process = context.Process(target=_run_battery_job,
+                                          args=(queue, alias, X_path, y, model, params, cores[alias], cv, verbose,
+                                                job_kwargs))
+                process.start()
+                running[alias] = process
+                pending.remove(alias)
+                free_cores -= cores[alias]
+            try:
+                alias, model, results, error = queue.get(timeout=poll_interval)
+            except Empty:
+                # A dead process is only considered failed if its result did not arrive in the next poll either,
+                # since it may have exited right after putting it in the queue
+                for alias in [alias for alias in running if alias in exited]:
+                    exitcode = running.pop(alias).exitcode
+                    free_cores += cores[alias]
+                    logger.error("Battery job {0} died with exit code {1}".format(alias, exitcode))
+                    errors[alias] = "Process died with exit code {0}".format(exitcode)
+                exited = set(alias for alias, process in running.items() if process.exitcode is not None)
+                continue
+            if alias not in running:
+                logger.warning("Ignoring the late result of {0}, already reported as failed".format(alias))
+                continue
+            process = running.pop(alias)
+            process.join(JOIN_TIMEOUT)
+            if process.is_alive():
+                logger.warning("Battery job {0} did not exit after reporting its result, terminating it".format(alias))
+                process.terminate()
+                process.join()
+            exited.discard(alias)
+            free_cores += cores[alias]
+            if error is not None:
+                logger.error("Battery job {0} failed:\n{1}".format(alias, error))
+                errors[alias] = error
+            else:
+                logger.info("Battery job {0} finished".format(alias))
+                outputs[alias] = (model, results)
+    finally:
+        for process in running.values():
+            process.terminate()
+        shutil.rmtree(memmap_folder, ignore_errors=True)
+    if errors:
+        logger.error("Battery jobs failed: {0}".format(", ".join(sorted(errors))))
+    return OrderedDict((alias, outputs[alias]) for alias, _, _ in battery if alias in outputs)
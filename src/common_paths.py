@@ -3,6 +3,42 @@ __author__ = "ivallesp"
 import os
 import json
 
+SETTINGS_PATH = "./settings.json"
+
+_settings_cache = {"stamp": None, "settings": None}
+_resolved_paths = {}
+
+
+def get_settings():
+    """
+    Retrieves the settings of the project. They are loaded once per process and reloaded only when the settings.json
+    file changes (detected through its mtime and size). Reloading them also invalidates the memoized paths.
+    :return: the settings (dict)
+    """
+    stat = os.stat(SETTINGS_PATH)
+    stamp = (stat.st_mtime, stat.st_size)
+    if _settings_cache["stamp"] != stamp:
+        with open(SETTINGS_PATH) as f:
+            _settings_cache["settings"] = json.load(f)
+        _settings_cache["stamp"] = stamp
+        _resolved_paths.clear()
+    return _settings_cache["settings"]
+
+
+def _memoize_path(path):
+    """
+    Decorator function intended for memoizing the output of a path retrieval function. The memoized paths are
+    invalidated when the settings change.
+    """
+    def memoized_path(*args):
+        get_settings()
+        key = (path, args)
+        if key not in _resolved_paths:
+            _resolved_paths[key] = path(*args)
+        return _resolved_paths[key]
+    return memoized_path
+
+
 def _norm_path(path):
     """
     Decorator function intended for using it to normalize a the output of a path retrieval function. Useful for
@@ -19,24 +55,34 @@ def _assure_path_exists(path):
     fixing the slash/backslash windows cases.
     """
     def assure_exists(*args):
-        assert os.path.exists(path(*args))
-        return path(*args)
+        resolved_path = path(*args)
+        assert os.path.exists(resolved_path)
+        return resolved_path
     return assure_exists
 
 
 def _is_output_path(path):
     """
     Decorator function intended for grouping the functions which are applied over the output of an output path retrieval
-    function
+    function. The path is memoized, but its existence is checked on every call so that it is created again if it was
+    removed.
     """
+    @_memoize_path
     @_norm_path
     @_assure_path_exists
     def check_existence_or_create_it(*args):
-        if not os.path.exists(path(*args)):
-            "Path didn't exist... creating it: {}".format(path(*args))
-            os.makedirs(path(*args))
-        return path(*args)
-    return check_existence_or_create_it
+        resolved_path = path(*args)
+        if not os.path.exists(resolved_path):
+            "Path didn't exist... creating it: {}".format(resolved_path)
+            os.makedirs(resolved_path)
+        return resolved_path
+
+    def create_it_if_removed(*args):
+        resolved_path = check_existence_or_create_it(*args)
+        if not os.path.exists(resolved_path):
+            os.makedirs(resolved_path)
+        return resolved_path
+    return create_it_if_removed
 
 
 def _is_input_path(path):
@@ -44,6 +90,7 @@ def _is_input_path(path):
     Decorator function intended for grouping the functions which are applied over the output of an input path retrieval
     function
     """
+    @_memoize_path
     @_norm_path
     @_assure_path_exists
     def check_existence(*args):
@@ -57,16 +104,12 @@ def get_project_path():
     Function used for retrieving the path where the project is located
     :return: the checked path (str|unicode)
     """
-    with open("./settings.json") as f:
-        settings = json.load(f)
-    return settings["project_path"]
+    return get_settings()["project_path"]
 
 
 @_is_input_path
 def get_data_path():
-    with open("./settings.json") as f:
-        settings = json.load(f)
-    return settings["data_path"]
+    return get_settings()["data_path"]
 
 
 @_is_input_path
@@ -94,6 +137,26 @@ def get_reports_path():
     return os.path.join(get_data_path(), "reports")
 
 
+@_is_output_path
+def get_cv_cache_path():
+    return os.path.join(get_data_path(), "cv_cache")
+
+
+@_is_output_path
+def get_oof_path():
+    return os.path.join(get_data_path(), "oof")
+
+
+@_is_output_path
+def get_models_path():
+    return os.path.join(get_data_path(), "models")
+
+
+@_is_output_path
+def get_profiles_path():
+    return os.path.join(get_data_path(), "profiles")
+
+
 @_is_output_path
 def get_raw_data_version_path(version):
     """
@@ -102,7 +165,7 @@ def get_raw_data_version_path(version):
     retrieved from the settings.json file and used to build the path (str|unicode|None).
     :return: the path of the data requested (str|unicode).
     """
-    from utilities import get_last_data_version
+    from src.utilities import get_last_data_version
     if not version:
         version = get_last_data_version()
     return os.path.join(get_raw_data_path(), version,"numerai_datasets")
@@ -115,7 +178,7 @@ def get_reports_version_path(version):
     retrieved from the settings.json file and used to build the path (str|unicode|None).
     :return: the path of the data requested (str|unicode).
     """
-    from utilities import get_last_data_version
+    from src.utilities import get_last_data_version
     if not version:
         version = get_last_data_version()
     return os.path.join(get_reports_path(), version)
@@ -128,19 +191,39 @@ def get_submissions_version_path(version=None):
     retrieved from the settings.json file and used to build the path (str|unicode|None).
     :return: the path of the data requested (str|unicode).
     """
-    from utilities import get_last_data_version
+    from src.utilities import get_last_data_version
     if not version:
         version = get_last_data_version()
     return os.path.join(get_submissions_path(), version)
 
 
-def get_submission_filepath(version, alias):
+@_is_output_path
+def get_models_version_path(version=None):
+    """
+    Retrieves the path where the models trained over a version of the data are stored
+    :param version: version of the data the models were trained with. If not specified, the last version name is
+    retrieved from the settings.json file and used to build the path (str|unicode|None).
+    :return: the path of the models requested (str|unicode).
+    """
+    from src.utilities import get_last_data_version
+    if not version:
+        version = get_last_data_version()
+    return os.path.join(get_models_path(), version)
+
+
+def get_submission_filepath(version, alias, compress=None):
     """
-    Retrieves the path of the submissios given by a version and an alias.
+    Retrieves the path of the submissios given by a version and an alias. Submissions are stored either as .csv or as
+    gzip compressed .csv.gz files.
     :param version: version of the data which is intended to be accessed (str|unicode).
     :param alias: version of the submission which is intended to be accessed (str|unicode).
+    :param compress: True for the .csv.gz path, False for the .csv one or None for the existing submission. If both
+    exist, the most recent one is returned, and if none does, the .csv path (bool|None)
     :return: the path of the submission file (str|unicode)
     """
     path = get_submissions_version_path(version)
     path = os.path.join(path, "submission_{0}.csv".format(alias))
-    return path
+    if compress is None:
+        existing = [p for p in [path, path + ".gz"] if os.path.exists(p)]
+        return max(existing, key=os.path.getmtime) if existing else path
+    return path + ".gz" if compress else path
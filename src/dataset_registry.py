@@ -0,0 +1,196 @@
+import os
+import csv
+import json
+import glob
+import shutil
+import hashlib
+import logging
+import datetime
+
+__author__ = "ivallesp"
+
+
+def get_manifest_path():
+    """
+    Retrieves the path of the manifest file where all the registered data versions are described.
+    :return: path of the manifest (str|unicode)
+    """
+    from src.common_paths import get_raw_data_path
+    return os.path.join(get_raw_data_path(), "manifest.json")
+
+
+def load_manifest():
+    """
+    Loads the manifest of the registered data versions.
+    :return: the manifest, with a "versions" key containing a version name -> description mapping (dict)
+    """
+    manifest_path = get_manifest_path()
+    if not os.path.exists(manifest_path):
+        return {"versions": {}}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _store_manifest(manifest):
+    """
+    Stores the manifest atomically: it is written in a temporary file which is then renamed.
+    :param manifest: manifest to be stored (dict)
+    :return: None (void)
+    """
+    from src.utilities import replace_file
+    manifest_path = get_manifest_path()
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps(manifest, sort_keys=True, indent=4, separators=(',', ': ')))
+    replace_file(tmp_path, manifest_path)
+
+
+def hash_file(filepath, block_size=2 ** 20):
+    """
+    Computes the SHA-256 hash of a file, reading it in blocks.
+    :param filepath: path of the file (str|unicode)
+    :param block_size: number of bytes read at a time (int)
+    :return: hexadecimal digest (str)
+    """
+    sha = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _describe_csv(filepath, block_size=2 ** 20):
+    """
+    Reads the header and counts the rows of a csv file without parsing it.
+    :param filepath: path of the csv file (str|unicode)
+    :param block_size: number of bytes read at a time (int)
+    :return: number of rows (excluding the header) and columns of the file (int, list)
+    """
+    with open(filepath, "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8")]))
+        n_lines = 1
+        last_block = b"\n"
+        for block in iter(lambda: f.read(block_size), b""):
+            n_lines += block.count(b"\n")
+            last_block = block
+    if not last_block.endswith(b"\n"):
+        n_lines += 1
+    return n_lines - 1, header
+
+
+def _get_version_folder(version):
+    """
+    Retrieves the folder where a data version is downloaded (the archive and its extracted contents).
+    :param version: name of the version (str|unicode)
+    :return: path of the folder (str|unicode)
+    """
+    from src.common_paths import get_raw_data_path
+    return os.path.normpath(os.path.join(get_raw_data_path(), version))
+
+
+def find_dataset_archive(folder):
+    """
+    Finds the last numerai_dataset_*.zip archive stored in a folder.
+    :param folder: folder where the archive is looked up (str|unicode)
+    :return: path of the archive or None if there is none (str|unicode|None)
+    """
+    archives = sorted(glob.glob(os.path.join(folder, "numerai_dataset_*.zip")))
+    return archives[-1] if archives else None
+
+
+def register_data_version(version, archive_path=None, duplicate_of=None, archive_sha256=None):
+    """
+    Describes a data version in the manifest: hash of its archive, hash, row count and columns of each csv file and
+    the features available.
+    :param version: name of the version (str|unicode)
+    :param archive_path: path of the dataset archive. If None, it is looked up in the version folder (str|unicode|None)
+    :param duplicate_of: name of the version with the same content, if this one was linked from it (str|unicode|None)
+    :param archive_sha256: hash of the archive, if it is already known. If None, it is computed (str|None)
+    :return: description of the version (dict)
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Requested registration of data version {0}".format(version))
+    folder = _get_version_folder(version)
+    if archive_path is None:
+        archive_path = find_dataset_archive(folder)
+    if archive_sha256 is None and archive_path:
+        archive_sha256 = hash_file(archive_path)
+    files = {}
+    features = []
+    for root, dirs, filenames in os.walk(folder):
+        if "cache" in dirs:
+            dirs.remove("cache")
+        for filename in sorted(filenames):
+            if not filename.endswith(".csv"):
+                continue
+            filepath = os.path.join(root, filename)
+            n_rows, columns = _describe_csv(filepath)
+            files[os.path.relpath(filepath, folder)] = {"sha256": hash_file(filepath), "n_rows": n_rows,
+                                                        "columns": columns}
+            if filename == "numerai_training_data.csv":
+                features = [c for c in columns if c.startswith("feature")]
+    description = {"archive": os.path.basename(archive_path) if archive_path else None,
+                   "archive_sha256": archive_sha256,
+                   "files": files,
+                   "features": features,
+                   "duplicate_of": duplicate_of,
+                   "registered_at": datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")}
+    manifest = load_manifest()
+    manifest["versions"][version] = description
+    _store_manifest(manifest)
+    logger.info("Data version {0} registered successfully".format(version))
+    return description
+
+
+def find_version_by_archive_hash(archive_sha256, exclude=None):
+    """
+    Finds a registered version whose archive has the given hash.
+    :param archive_sha256: hash of the archive (str)
+    :param exclude: name of a version to be ignored (str|unicode|None)
+    :return: the name of the version or None if there is no match (str|unicode|None)
+    """
+    for version, description in sorted(load_manifest()["versions"].items()):
+        if version != exclude and description["archive_sha256"] == archive_sha256:
+            if os.path.exists(_get_version_folder(version)):
+                return version
+    return None
+
+
+def _link_tree(source, destination, copied=()):
+    """
+    Replicates a folder using hard links, falling back to copies when they are not supported.
+    :param source: folder to be replicated (str|unicode)
+    :param destination: destination folder (str|unicode)
+    :param copied: names of the files which are always copied, because they are modified after being replicated
+    (tuple)
+    :return: None (void)
+    """
+    for root, dirs, filenames in os.walk(source):
+        target_root = os.path.join(destination, os.path.relpath(root, source))
+        if not os.path.exists(target_root):
+            os.makedirs(target_root)
+        for filename in filenames:
+            target = os.path.join(target_root, filename)
+            if os.path.exists(target):
+                os.remove(target)
+            if filename in copied:
+                shutil.copy2(os.path.join(root, filename), target)
+                continue
+            try:
+                os.link(os.path.join(root, filename), target)
+            except (OSError, AttributeError):
+                shutil.copy2(os.path.join(root, filename), target)
+
+
+def link_data_version(source_version, version):
+    """
+    Makes a version share the files of an existing version with the same content, using hard links. The binary caches
+    are linked too, so they do not need to be rebuilt. The validation memo is copied instead, since each version
+    updates its own.
+    :param source_version: name of the existing version (str|unicode)
+    :param version: name of the new version (str|unicode)
+    :return: None (void)
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Linking data version {0} to the existing version {1}".format(version, source_version))
+    _link_tree(_get_version_folder(source_version), _get_version_folder(version), copied=("validation.json",))
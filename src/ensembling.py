@@ -0,0 +1,226 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from scipy.optimize import minimize
+
+__author__ = "ivallesp"
+
+BLEND_METHODS = ["greedy", "weights", "rank"]
+
+
+def _iter_column_batches(n_columns, batch_size):
+    """
+    Splits the columns of a matrix in contiguous batches.
+    :param n_columns: number of columns (int)
+    :param batch_size: maximum number of columns per batch (int)
+    :return: slices of each batch (generator)
+    """
+    for start in range(0, n_columns, batch_size):
+        yield slice(start, min(start + batch_size, n_columns))
+
+
+def log_loss_columns(P, y, eps=1e-15, batch_size=256):
+    """
+    Computes the log loss of every column of a matrix of predicted probabilities at once. The columns are processed
+    in batches so that the memory needed is bounded by n_samples x batch_size.
+    :param P: predicted probabilities, one column per candidate (np.array)
+    :param y: binary target (np.array)
+    :param eps: probabilities are clipped to [eps, 1 - eps] (float)
+    :param batch_size: number of columns evaluated at a time (int)
+    :return: log loss of each column, or a float if P is one-dimensional (np.array|float)
+    """
+    y = np.asarray(y).astype(bool)
+    if P.ndim == 1:
+        return float(log_loss_columns(P[:, None], y, eps, batch_size)[0])
+    losses = np.empty(P.shape[1])
+    for batch in _iter_column_batches(P.shape[1], batch_size):
+        probs = np.clip(np.asarray(P[:, batch], dtype=np.float64), eps, 1 - eps)
+        probs[~y] = 1 - probs[~y]
+        losses[batch] = -np.log(probs).mean(axis=0)
+    return losses
+
+
+def load_prediction_matrix(candidates, top_k=None):
+    """
+    Loads the out of fold predictions of several battery entries (see oof_store) as the columns of a matrix.
+    :param candidates: aliases of the battery entries (list) or alias -> parameter set mapping, to load a single
+    column per alias (dict)
+    :param top_k: when candidates is a list, maximum number of parameter sets (the best ones) per alias. If None, all
+    the complete ones are loaded (int|None)
+    :return: predictions matrix, (alias, parameter set) name of each column and the target (np.array, list, np.array)
+    """
+    from src.oof_store import get_oof_store_path, get_params_key, load_oof_predictions
+    columns = []
+    names = []
+    y = None
+    for alias in candidates:
+        if isinstance(candidates, dict):
+            filepath = os.path.join(get_oof_store_path(alias), "{0}.npy".format(get_params_key(candidates[alias])))
+            assert os.path.exists(filepath), "No out of fold predictions of {0} for {1}".format(alias,
+                                                                                            candidates[alias])
+            predictions = OrderedDict([(repr(candidates[alias]), np.load(filepath, mmap_mode="r"))])
+            target = np.load(os.path.join(get_oof_store_path(alias), "target.npy"))
+        else:
+            predictions, target = load_oof_predictions(alias)
+        assert y is None or np.array_equal(y, target), "{0} was cross validated over a different target".format(alias)
+        y = target
+        selected = list(predictions.items())
+        if top_k is not None and not isinstance(candidates, dict):
+            losses = log_loss_columns(np.column_stack([values for _, values in selected]), y)
+            selected = [selected[i] for i in np.argsort(losses, kind="mergesort")[:top_k]]
+        for params, values in selected:
+            assert np.isfinite(values).all(), "Incomplete out of fold predictions of {0}: {1}".format(alias, params)
+            columns.append(values)
+            names.append((alias, params))
+    return np.column_stack(columns).astype(np.float32), names, y
+
+
+def greedy_ensemble_selection(P, y, n_iter=100, init_size=1, eps=1e-15, batch_size=256):
+    """
+    Greedy forward ensemble selection with replacement (Caruana et al., 2004). Starting from the average of the
+    init_size best columns, at each iteration the column whose addition to the average gives the lowest log loss is
+    added. The losses of all the candidate additions are computed at once.
+    :param P: predicted probabilities, one column per candidate (np.array)
+    :param y: binary target (np.array)
+    :param n_iter: maximum number of additions (int)
+    :param init_size: number of columns the ensemble is initialized with (int)
+    :param eps: probabilities are clipped to [eps, 1 - eps] (float)
+    :param batch_size: number of columns evaluated at a time (int)
+    :return: weight of each column and the log loss after each iteration (np.array, list)
+    """
+    logger = logging.getLogger(__name__)
+    y = np.asarray(y).astype(bool)
+    counts = np.zeros(P.shape[1], dtype=int)
+    initial = np.argsort(log_loss_columns(P, y, eps, batch_size), kind="mergesort")[:init_size]
+    counts[initial] += 1
+    blend_sum = P[:, initial].sum(axis=1, dtype=np.float64)
+    history = [log_loss_columns(blend_sum / counts.sum(), y, eps)]
+    for _ in range(n_iter):
+        n = counts.sum()
+        losses = np.empty(P.shape[1])
+        for batch in _iter_column_batches(P.shape[1], batch_size):
+            losses[batch] = log_loss_columns((blend_sum[:, None] + P[:, batch]) / (n + 1), y, eps, batch_size)
+        best = int(np.argmin(losses))
+        if losses[best] >= history[-1]:
+            break
+        counts[best] += 1
+        blend_sum += P[:, best]
+        history.append(float(losses[best]))
+    logger.info("Greedy ensemble selection finished with {0} columns and log loss {1}"
+                .format(int((counts > 0).sum()), history[-1]))
+    return counts / float(counts.sum()), history
+
+
+def _softmax(z):
+    """
+    Maps unconstrained values to weights which are positive and sum one.
+    :param z: unconstrained values (np.array)
+    :return: weights (np.array)
+    """
+    e = np.exp(z - z.max())
+    return e / e.sum()
+
+
+def optimize_blend_weights(P, y, initial_weights=None, eps=1e-15, max_iter=200):
+    """
+    Finds the convex combination of the columns which minimizes the log loss. The weights are parametrized with a
+    softmax and optimized with L-BFGS using the analytical gradient, so each iteration costs two matrix products.
+    :param P: predicted probabilities, one column per candidate (np.array)
+    :param y: binary target (np.array)
+    :param initial_weights: starting point. If None, uniform weights are used (np.array|None)
+    :param eps: probabilities are clipped to [eps, 1 - eps] (float)
+    :param max_iter: maximum number of iterations of the optimizer (int)
+    :return: weight of each column and the log loss of the blend (np.array, float)
+    """
+    y = np.asarray(y).astype(np.float64)
+    n_samples, n_columns = P.shape
+    if initial_weights is None:
+        initial_weights = np.ones(n_columns) / n_columns
+    z0 = np.log(np.clip(initial_weights, 1e-6, None))
+
+    def loss_and_gradient(z):
+        w = _softmax(z)
+        p = np.clip(P.dot(w), eps, 1 - eps)
+        loss = -np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))
+        gradient_w = -P.T.dot(y / p - (1 - y) / (1 - p)) / n_samples
+        return loss, w * (gradient_w - w.dot(gradient_w))
+
+    result = minimize(loss_and_gradient, z0, jac=True, method="L-BFGS-B", options={"maxiter": max_iter})
+    weights = _softmax(result.x)
+    return weights, log_loss_columns(P.dot(weights), y, eps)
+
+
+def rank_columns(P):
+    """
+    Replaces every column by its normalized ranks, in (0, 1).
+    :param P: predictions, one column per candidate (np.array)
+    :return: ranks (np.array)
+    """
+    ranks = np.empty(P.shape, dtype=np.float64)
+    order = np.argsort(P, axis=0, kind="mergesort")
+    ranks[order, np.arange(P.shape[1])] = np.arange(1, P.shape[0] + 1)[:, None]
+    return ranks / (P.shape[0] + 1)
+
+
+def blend_predictions(P, weights, method="greedy"):
+    """
+    Combines the columns of a matrix of predictions with the weights found by optimize_blend.
+    :param P: predicted probabilities, one column per candidate (np.array)
+    :param weights: weight of each column (np.array)
+    :param method: blending method, one of BLEND_METHODS. The rank method averages the normalized ranks of the columns
+    instead of the probabilities (str)
+    :return: blended predictions (np.array)
+    """
+    assert method in BLEND_METHODS, "The blending method must be one of {0}".format(BLEND_METHODS)
+    if method == "rank":
+        P = rank_columns(P)
+    return P.dot(weights)
+
+
+def optimize_blend(P, y, methods=BLEND_METHODS, n_iter=100, eps=1e-15):
+    """
+    Fits every blending method over the same matrix of out of fold predictions. The weights optimization starts from
+    the greedy selection solution and the rank averaging uses uniform weights.
+    :param P: predicted probabilities, one column per candidate (np.array)
+    :param y: binary target (np.array)
+    :param methods: blending methods to be fitted (list)
+    :param n_iter: maximum number of additions of the greedy selection (int)
+    :param eps: probabilities are clipped to [eps, 1 - eps] (float)
+    :return: method -> (weights, log loss) mapping, sorted from the best to the worst method (OrderedDict)
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Requested blend optimization of {0} columns and {1} rows".format(P.shape[1], P.shape[0]))
+    blends = {}
+    greedy_weights, history = greedy_ensemble_selection(P, y, n_iter=n_iter, eps=eps)
+    if "greedy" in methods:
+        blends["greedy"] = (greedy_weights, history[-1])
+    if "weights" in methods:
+        blends["weights"] = optimize_blend_weights(P, y, initial_weights=greedy_weights, eps=eps)
+    if "rank" in methods:
+        weights = np.ones(P.shape[1]) / P.shape[1]
+        blends["rank"] = (weights, log_loss_columns(blend_predictions(P, weights, "rank"), y, eps))
+    for method, (_, loss) in blends.items():
+        logger.info("Blending method {0}: log loss {1}".format(method, loss))
+    return OrderedDict(sorted(blends.items(), key=lambda item: item[1][1]))
+
+
+def build_blended_submission(version, aliases, weights, method="greedy", alias="Ensemble", replace=True):
+    """
+    Blends the submissions already built for several aliases into a new submission.
+    :param version: version of the data the submissions were built for (str|unicode)
+    :param aliases: aliases of the submissions, in the order of the weights (list)
+    :param weights: weight of each submission (np.array)
+    :param method: blending method, one of BLEND_METHODS (str)
+    :param alias: alias of the blended submission (str|unicode)
+    :param replace: if True, an existing submission with the same alias is overwritten (bool)
+    :return: None (void)
+    """
+    from src.common_paths import get_submission_filepath
+    from src.numerai_utilities import build_submission
+    submissions = [pd.read_csv(get_submission_filepath(version, a), compression="infer") for a in aliases]
+    ids = submissions[0]["t_id"].values
+    assert all(np.array_equal(ids, s["t_id"].values) for s in submissions), "The submissions are not aligned"
+    P = np.column_stack([s["probability"].values for s in submissions])
+    build_submission(version, ids, blend_predictions(P, weights, method), alias, replace=replace)
@@ -1,53 +1,583 @@
 import os
+import json
+import shutil
+import zipfile
 import pandas as pd
+import numpy as np
 import logging
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 __author__ = "ivallesp"
 
+CACHE_FORMAT_VERSION = 2
+SCHEMAS = [None, "compact", "quantized"]
+QUANTIZATION_LEVELS = 255
+HASH_PRIME = np.uint64(1099511628211)
+HASH_OFFSET = np.uint64(14695981039346656037)
 
-def load_train_data(version=None):
+_validation_memo = {}
+_cache_lock = threading.Lock()
+
+
+def _get_file_fingerprint(filepath):
+    """
+    Builds a cheap fingerprint of a file, used for detecting if it changed since the last time it was read.
+    :param filepath: path of the file to be fingerprinted (str|unicode)
+    :return: fingerprint of the file (dict)
+    """
+    stat = os.stat(filepath)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _get_source_fingerprint(filepath, archive_path=None):
+    """
+    Builds the fingerprint of the source of a numerai csv file: the file itself or, if it is read from the dataset
+    archive, the archive plus the name of the member.
+    :param filepath: path of the csv file (str|unicode)
+    :param archive_path: path of the zip archive containing the file, if it is read from it (str|unicode|None)
+    :return: fingerprint of the source (dict)
+    """
+    if archive_path is None:
+        return _get_file_fingerprint(filepath)
+    return dict(_get_file_fingerprint(archive_path), member=os.path.basename(filepath))
+
+
+def _parse_numerai_csv(filepath, archive_path=None, **kwargs):
+    """
+    Parses a numerai csv file, either from disk or straight from the dataset zip archive without extracting it.
+    :param filepath: path of the csv file. If archive_path is specified, only its basename is used for finding the
+    member of the archive (str|unicode)
+    :param archive_path: path of the zip archive containing the file (str|unicode|None)
+    :param kwargs: extra arguments passed to pd.read_csv
+    :return: the dataset (pd.DataFrame)
+    """
+    if archive_path is None:
+        return pd.read_csv(filepath, sep=",", encoding="utf-8", index_col=False, **kwargs)
+    filename = os.path.basename(filepath)
+    with zipfile.ZipFile(archive_path) as z:
+        members = [name for name in z.namelist() if os.path.basename(name) == filename]
+        assert len(members) == 1, "{0} not found in {1}".format(filename, archive_path)
+        with z.open(members[0]) as f:
+            return pd.read_csv(f, sep=",", encoding="utf-8", index_col=False, **kwargs)
+
+
+def _find_dataset_archive(version=None):
+    """
+    Finds the numerai_dataset_*.zip archive of a version. It is looked up in the raw data version path and in its
+    parent folder, which is where the NumerAPI downloads it.
+    :param version: version of the data (str|unicode|None)
+    :return: path of the last archive found (str|unicode)
+    """
+    from src.common_paths import get_raw_data_version_path
+    from src.dataset_registry import find_dataset_archive
+    path = get_raw_data_version_path(version)
+    for folder in [path, os.path.dirname(path)]:
+        archive_path = find_dataset_archive(folder)
+        if archive_path is not None:
+            return archive_path
+    raise IOError("No numerai dataset archive found for version {0}".format(version))
+
+
+def _get_cache_path(filepath, schema=None, archive_path=None):
+    """
+    Retrieves the folder where the binary cache of a csv file is stored. It lives next to the csv, inside a "cache"
+    folder. Each schema has its own cache, and so does each source: the csv read from a zip archive has a different
+    fingerprint than the extracted one, which may live in the same folder.
+    :param filepath: path of the csv file (str|unicode)
+    :param schema: schema used for loading the file (str|None)
+    :param archive_path: path of the zip archive the file is read from, if any (str|unicode|None)
+    :return: path of the cache folder (str|unicode)
+    """
+    folder, filename = os.path.split(filepath)
+    name = os.path.splitext(filename)[0]
+    if schema:
+        name = "{0}_{1}".format(name, schema)
+    if archive_path:
+        name = "{0}_zip".format(name)
+    return os.path.join(folder, "cache", name)
+
+
+def build_numerai_schema(filepath, archive_path=None):
+    """
+    Reads the header of a numerai csv file and builds an explicit schema for it: float32 features, int8 target and
+    string t_id. Passing it to the parser avoids allocating the float64/int64 columns guessed by pandas.
+    :param filepath: path of the csv file (str|unicode)
+    :param archive_path: path of the zip archive containing the file, if it is read from it (str|unicode|None)
+    :return: column name -> dtype mapping (dict)
+    """
+    header = _parse_numerai_csv(filepath, archive_path, nrows=0).columns
+    schema = {}
+    for column in header:
+        if column.startswith("feature"):
+            schema[column] = np.float32
+        elif column == "target":
+            schema[column] = np.int8
+        elif column == "t_id":
+            schema[column] = str
+    return schema
+
+
+def quantize_features(df):
+    """
+    Quantizes in place the feature columns of a numerai dataset (bounded in [0, 1]) into uint8 levels. The
+    conversion is done column by column so that only one float column is alive at a time.
+    :param df: dataset to be quantized (pd.DataFrame)
+    :return: the quantized dataset (pd.DataFrame)
+    """
+    for column in df.columns[df.columns.str.startswith("feature")]:
+        df[column] = np.round(df[column].values * QUANTIZATION_LEVELS).astype(np.uint8)
+    return df
+
+
+def _get_cache_blocks(df):
+    """
+    Groups the columns of a dataframe into the blocks stored in its binary cache: one block per numeric dtype and one
+    block per object column, since the strings of each column are stored with their own width.
+    :param df: dataframe to be cached (pd.DataFrame)
+    :return: positions of the columns of each block, in column order (list of lists)
+    """
+    blocks = OrderedDict()
+    for i, dtype in enumerate(df.dtypes):
+        key = i if dtype == object else str(dtype)
+        blocks.setdefault(key, []).append(i)
+    return list(blocks.values())
+
+
+def _store_cache(df, cache_path, fingerprint):
+    """
+    Stores a dataframe as a set of .npy files plus a JSON file with the metadata needed for rebuilding it. The columns
+    sharing a dtype are stored together as a single 2-D block of shape (n_columns, n_rows), which is the layout pandas
+    uses internally, so that the dataframe can be rebuilt over the memory mapped block without copying it. The cache
+    is written in a temporary folder and renamed at the end so that a half-written cache is never read.
+    :param df: dataframe to be cached (pd.DataFrame)
+    :param cache_path: folder where the cache is going to be stored (str|unicode)
+    :param fingerprint: fingerprint of the source csv file (dict)
+    :return: None (void)
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Storing binary cache in {0}".format(cache_path))
+    tmp_path = cache_path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    with _cache_lock:
+        os.makedirs(tmp_path)
+    blocks = _get_cache_blocks(df)
+    for k, positions in enumerate(blocks):
+        first = df.iloc[:, positions[0]].values
+        if first.dtype == object:
+            first = first.astype(np.unicode_)
+        # The block is filled column by column in a file, so only one column is copied in memory at a time
+        block = np.lib.format.open_memmap(os.path.join(tmp_path, "block_{0}.npy".format(k)), mode="w+",
+                                          dtype=first.dtype, shape=(len(positions), df.shape[0]))
+        block[0] = first
+        for j, position in enumerate(positions[1:], 1):
+            block[j] = df.iloc[:, position].values
+        block.flush()
+        del block
+    meta = {"format_version": CACHE_FORMAT_VERSION,
+            "fingerprint": fingerprint,
+            "n_rows": df.shape[0],
+            "columns": df.columns.tolist(),
+            "dtypes": [str(dtype) for dtype in df.dtypes],
+            "blocks": blocks}
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    if os.path.exists(cache_path):
+        shutil.rmtree(cache_path)
+    os.rename(tmp_path, cache_path)
+    logger.info("Binary cache stored successfully")
+
+
+def _load_cache_blocks(cache_path, fingerprint):
+    """
+    Memory maps the blocks stored in a binary cache, without building any dataframe.
+    :param cache_path: folder where the cache is stored (str|unicode)
+    :param fingerprint: fingerprint of the source csv file. If it does not match the one stored in the cache, the
+    cache is considered stale (dict)
+    :return: the cache metadata and the memory mapped blocks, or None if there is no valid cache (tuple|None)
+    """
+    logger = logging.getLogger(__name__)
+    meta_path = os.path.join(cache_path, "meta.json")
+    if not os.path.exists(meta_path):
+        logger.info("No binary cache found in {0}".format(cache_path))
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta["format_version"] != CACHE_FORMAT_VERSION or meta["fingerprint"] != fingerprint:
+        logger.info("Binary cache in {0} is stale".format(cache_path))
+        return None
+    blocks = [np.load(os.path.join(cache_path, "block_{0}.npy".format(k)), mmap_mode="r")
+              for k in range(len(meta["blocks"]))]
+    return meta, blocks
+
+
+def _build_frame_from_blocks(meta, blocks, start=None, stop=None):
+    """
+    Builds a dataframe from (a slice of) the memory mapped blocks of a binary cache. The largest block (the features)
+    becomes the dataframe block as it is, without copying it, and the rest of the columns are inserted in their
+    positions. The object columns are converted from the fixed width strings of the cache, so they are copied.
+    :param meta: metadata of the cache (dict)
+    :param blocks: memory mapped blocks, of shape (n_columns, n_rows) (list of np.memmap)
+    :param start: first row of the slice (int|None)
+    :param stop: last row (excluded) of the slice (int|None)
+    :return: the dataset (pd.DataFrame)
+    """
+    largest = max(range(len(blocks)), key=lambda k: len(meta["blocks"][k]))
+    df = pd.DataFrame(blocks[largest][:, start:stop].T, columns=[meta["columns"][i] for i in meta["blocks"][largest]],
+                      copy=False)
+    others = sorted((position, k, j) for k, positions in enumerate(meta["blocks"]) if k != largest
+                    for j, position in enumerate(positions))
+    # Inserting the columns in ascending position leaves every column before each one already in place
+    for position, k, j in others:
+        values = blocks[k][j, start:stop]
+        if meta["dtypes"][position] == "object":
+            values = values.astype(object)
+        df.insert(position, meta["columns"][position], values)
+    return df
+
+
+def _load_cache(cache_path, fingerprint):
+    """
+    Loads a dataframe from its binary cache. The blocks are memory mapped from disk.
+    :param cache_path: folder where the cache is stored (str|unicode)
+    :param fingerprint: fingerprint of the source csv file. If it does not match the one stored in the cache, the
+    cache is considered stale (dict)
+    :return: the cached dataset or None if there is no valid cache (pd.DataFrame|None)
+    """
+    cache = _load_cache_blocks(cache_path, fingerprint)
+    if cache is None:
+        return None
+    meta, blocks = cache
+    return _build_frame_from_blocks(meta, blocks)
+
+
+def _hash_column(values):
+    """
+    Computes a 64-bit hash of every value of a column. Numeric values are hashed by reinterpreting their raw buffer
+    as unsigned integers; other values are hashed by pandas.
+    :param values: values of the column (np.array)
+    :return: hashes (np.array of np.uint64)
+    """
+    if values.dtype == object:
+        return pd.util.hash_array(values)
+    values = np.ascontiguousarray(values)
+    return values.view(np.dtype("u{0}".format(values.dtype.itemsize))).astype(np.uint64)
+
+
+def hash_rows(df, columns=None, visit_column=None):
+    """
+    Computes a 64-bit hash of every row of a dataset, combining the hashes of its columns. Two datasets loaded with
+    the same schema produce the same hash for the same row.
+    :param df: dataset (pd.DataFrame)
+    :param columns: columns taken into account. If None, all of them are (list|None)
+    :param visit_column: function called with the name and values of every column while it is hashed, so that other
+    checks can be done in the same pass over the data (function|None)
+    :return: hashes (np.array of np.uint64)
+    """
+    row_hashes = np.empty(df.shape[0], dtype=np.uint64)
+    row_hashes.fill(HASH_OFFSET)
+    with np.errstate(over="ignore"):
+        for column in (df.columns if columns is None else columns):
+            values = df[column].values
+            if visit_column is not None:
+                visit_column(column, values)
+            row_hashes = (row_hashes ^ _hash_column(values)) * HASH_PRIME
+    return row_hashes
+
+
+def _count_duplicated_rows(df, row_hashes):
+    """
+    Counts the duplicated rows of a dataset given its row hashes. Only the rows sharing a hash are compared exactly,
+    so hash collisions never produce false positives.
+    :param df: dataset (pd.DataFrame)
+    :param row_hashes: 64-bit hash of every row (np.array of np.uint64)
+    :return: number of duplicated rows (int)
+    """
+    sorted_hashes = np.sort(row_hashes)
+    repeated_hashes = np.unique(sorted_hashes[1:][sorted_hashes[1:] == sorted_hashes[:-1]])
+    if len(repeated_hashes) == 0:
+        return 0
+    candidates = np.in1d(row_hashes, repeated_hashes)
+    return int(df[candidates].duplicated().sum())
+
+
+def validate_numerai_data(df, kind):
+    """
+    Validates a numerai dataset traversing its columns once: checks the schema, the missing values, the range of the
+    features and target and the duplicated rows (using the 64-bit row hashes of hash_rows, which visits the columns
+    for the rest of the checks). Raises an AssertionError if the dataset is not valid.
+    :param df: dataset to be validated (pd.DataFrame)
+    :param kind: either "train" or "tournament" (str)
+    :return: validation report (dict)
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Validating {0} dataset".format(kind))
+    assert kind in ["train", "tournament"]
+    columns = df.columns.tolist()
+    if kind == "train":
+        assert "target" in columns, "The training dataset has no target"
+    else:
+        assert "target" not in columns, "The tournament dataset contains a target"
+        assert "t_id" in columns, "The tournament dataset has no t_id"
+    features = [c for c in columns if c not in ["t_id", "target"]]
+    assert all(c.startswith("feature") for c in features), "Unexpected columns found in the {0} dataset".format(kind)
+    counts = {"n_nulls": 0, "n_out_of_range": 0}
+
+    def check_column(column, values):
+        if values.dtype == object:
+            counts["n_nulls"] += int(pd.isnull(values).sum())
+        elif values.dtype.kind == "f":
+            counts["n_nulls"] += int(np.isnan(values).sum())
+        if column == "target":
+            counts["n_out_of_range"] += int((~np.in1d(values, [0, 1])).sum())
+        elif column in features and values.dtype.kind == "f":
+            counts["n_out_of_range"] += int(((values < 0) | (values > 1)).sum())
+
+    n_duplicates = _count_duplicated_rows(df, hash_rows(df, columns, check_column))
+    n_nulls, n_out_of_range = counts["n_nulls"], counts["n_out_of_range"]
+    report = {"kind": kind, "n_rows": df.shape[0], "n_features": len(features), "n_nulls": n_nulls,
+              "n_out_of_range": n_out_of_range, "n_duplicates": n_duplicates}
+    logger.info("Validation report: {0}".format(report))
+    assert n_nulls == 0, "{0} missing values found in the {1} dataset".format(n_nulls, kind)
+    assert n_out_of_range == 0, "{0} values out of range found in the {1} dataset".format(n_out_of_range, kind)
+    assert n_duplicates == 0, "{0} duplicated rows found in the {1} dataset".format(n_duplicates, kind)
+    return report
+
+
+def _get_validation_memo_path(filepath):
+    """
+    Retrieves the path of the file where the validations of the numerai csv files of a folder are memoized.
+    :param filepath: path of the csv file (str|unicode)
+    :return: path of the memo file (str|unicode)
+    """
+    return os.path.join(os.path.dirname(filepath), "cache", "validation.json")
+
+
+def _get_validation_report(filepath, schema=None, archive_path=None):
+    """
+    Retrieves the memoized validation report of a numerai csv file, if the same file (identified by its fingerprint)
+    was already validated using the same schema.
+    :param filepath: path of the csv file (str|unicode)
+    :param schema: schema used for loading the file (str|None)
+    :param archive_path: path of the zip archive the file is read from, if any (str|unicode|None)
+    :return: validation report, or None if the file was not validated yet (dict|None)
+    """
+    key = os.path.basename(_get_cache_path(filepath, schema, archive_path))
+    fingerprint = _get_source_fingerprint(filepath, archive_path)
+    memo_path = _get_validation_memo_path(filepath)
+    with _cache_lock:
+        if not _validation_memo.get(memo_path) and os.path.exists(memo_path):
+            with open(memo_path) as f:
+                _validation_memo[memo_path] = json.load(f)
+        memo = _validation_memo.setdefault(memo_path, {})
+        if key in memo and memo[key]["fingerprint"] == fingerprint:
+            return memo[key]["report"]
+    return None
+
+
+def _validate_numerai_file(df, filepath, kind, schema=None, archive_path=None):
+    """
+    Validates a dataset loaded from a numerai csv file, unless the same file (identified by its fingerprint) was
+    already validated using the same schema. The validations performed are memoized in memory and in the
+    "validation.json" file of the cache folder, which is replaced instead of rewritten in place since it may be hard
+    linked from another data version.
+    :param df: dataset loaded from the file (pd.DataFrame)
+    :param filepath: path of the csv file (str|unicode)
+    :param kind: either "train" or "tournament" (str)
+    :param schema: schema used for loading the file (str|None)
+    :param archive_path: path of the zip archive the file was read from, if any (str|unicode|None)
+    :return: validation report (dict)
+    """
+    logger = logging.getLogger(__name__)
+    report = _get_validation_report(filepath, schema, archive_path)
+    if report is not None:
+        logger.info("Dataset {0} already validated, skipping validation".format(filepath))
+        return report
+    report = validate_numerai_data(df, kind)
+    key = os.path.basename(_get_cache_path(filepath, schema, archive_path))
+    memo_path = _get_validation_memo_path(filepath)
+    with _cache_lock:
+        memo = _validation_memo.setdefault(memo_path, {})
+        memo[key] = {"fingerprint": _get_source_fingerprint(filepath, archive_path), "report": report}
+        if not os.path.exists(os.path.dirname(memo_path)):
+            os.makedirs(os.path.dirname(memo_path))
+        from src.utilities import replace_file
+        tmp_path = "{0}.{1}.tmp".format(memo_path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(memo, f)
+        replace_file(tmp_path, memo_path)
+    return report
+
+
+def _read_numerai_csv(filepath, dtype=None, use_cache=True, schema=None, archive_path=None):
+    """
+    Reads a numerai csv file. If use_cache is True, the binary cache of the file is used when it is valid, and it is
+    built when it is not.
+    :param filepath: path of the csv file (str|unicode)
+    :param dtype: dtypes to be passed to the csv parser (dict|None)
+    :param use_cache: whether to use the binary cache or not (bool)
+    :param schema: None for letting pandas guess the dtypes, "compact" for float32 features and int8 target or
+    "quantized" for uint8 features and int8 target (str|None)
+    :param archive_path: if specified, the file is read from this zip archive instead of from disk (str|unicode|None)
+    :return: the dataset (pd.DataFrame)
+    """
+    logger = logging.getLogger(__name__)
+    assert schema in SCHEMAS
+    if use_cache:
+        cache_path = _get_cache_path(filepath, schema, archive_path)
+        fingerprint = _get_source_fingerprint(filepath, archive_path)
+        df = _load_cache(cache_path, fingerprint)
+        if df is not None:
+            logger.info("Dataset loaded from binary cache {0}".format(cache_path))
+            return df
+    if schema:
+        logger.info("Using {0} schema".format(schema))
+        dtype = dict(build_numerai_schema(filepath, archive_path), **(dtype or {}))
+    df = _parse_numerai_csv(filepath, archive_path, dtype=dtype)
+    if schema == "quantized":
+        df = quantize_features(df)
+    if use_cache:
+        _store_cache(df, cache_path, fingerprint)
+    return df
+
+
+def load_train_data(version=None, use_cache=True, schema=None, from_zip=False):
     """
     Loads the training dataset
     :param version: version which is intended to be loaded. If None, last version is loaded. (str|None)
+    :param use_cache: if True, the dataset is read from its binary cache, which is built on the first load (bool)
+    :param schema: None for the dtypes guessed by pandas, "compact" for float32 features and int8 target or "quantized"
+    for uint8 features and int8 target (str|None)
+    :param from_zip: if True, the dataset is read straight from the dataset zip archive, without extracting it (bool)
     :return: the dataset (pd.Dataframe)
     """
     logger = logging.getLogger(__name__)
-    from common_paths import get_raw_data_version_path
+    from src.common_paths import get_raw_data_version_path
     logger.info("Requested training data load")
-    filepath = os.path.join(get_raw_data_version_path(version), "numerai_training_data.csv")
-    logger.info("Loading train dataset from {0}".format(filepath))
-    df = pd.read_csv(filepath, sep=",", encoding="utf-8", index_col=False)
+    archive_path = _find_dataset_archive(version) if from_zip else None
+    folder = os.path.dirname(archive_path) if from_zip else get_raw_data_version_path(version)
+    filepath = os.path.join(folder, "numerai_training_data.csv")
+    logger.info("Loading train dataset from {0}".format(archive_path or filepath))
+    df = _read_numerai_csv(filepath, use_cache=use_cache, schema=schema, archive_path=archive_path)
     logger.info("Train dataset loaded successfully")
-    assert df.isnull().sum().sum() == 0
-    assert df.duplicated().sum() == 0
-    assert "target" in df.columns
+    _validate_numerai_file(df, filepath, "train", schema, archive_path)
     return df
 
-def load_tournament_data(version=None):
+def load_tournament_data(version=None, use_cache=True, schema=None, from_zip=False):
     """
     Loads the tournament dataset
     :param version: version which is intended to be loaded. If None, last version is loaded. (str|None)
+    :param use_cache: if True, the dataset is read from its binary cache, which is built on the first load (bool)
+    :param schema: None for the dtypes guessed by pandas, "compact" for float32 features or "quantized" for uint8
+    features (str|None)
+    :param from_zip: if True, the dataset is read straight from the dataset zip archive, without extracting it (bool)
     :return: the dataset (pd.Dataframe)
     """
     logger = logging.getLogger(__name__)
-    from common_paths import get_raw_data_version_path
+    from src.common_paths import get_raw_data_version_path
     logger.info("Requested tournament data load")
-    filepath = os.path.join(get_raw_data_version_path(version), "numerai_tournament_data.csv")
-    logger.info("Loading test dataset from {0}".format(filepath))
-    df = pd.read_csv(filepath, sep=",", encoding="utf-8", index_col=False, dtype={"t_id": str})
+    archive_path = _find_dataset_archive(version) if from_zip else None
+    folder = os.path.dirname(archive_path) if from_zip else get_raw_data_version_path(version)
+    filepath = os.path.join(folder, "numerai_tournament_data.csv")
+    logger.info("Loading test dataset from {0}".format(archive_path or filepath))
+    df = _read_numerai_csv(filepath, dtype={"t_id": str}, use_cache=use_cache, schema=schema,
+                           archive_path=archive_path)
     logger.info("Test dataset loaded successfully")
-    assert df.isnull().sum().sum() == 0
-    assert df.duplicated().sum() == 0
-    assert "target" not in df.columns
+    _validate_numerai_file(df, filepath, "tournament", schema, archive_path)
     return df
 
-def load_numerai_data(version=None):
+def _iter_numerai_csv(filepath, chunksize, archive_path=None, **kwargs):
+    """
+    Parses a numerai csv file incrementally, either from disk or straight from the dataset zip archive. The archive is
+    kept open until the last chunk is read.
+    :param filepath: path of the csv file. If archive_path is specified, only its basename is used for finding the
+    member of the archive (str|unicode)
+    :param chunksize: number of rows of each chunk (int)
+    :param archive_path: path of the zip archive containing the file (str|unicode|None)
+    :param kwargs: extra arguments passed to pd.read_csv
+    :return: chunks of the dataset (generator of pd.DataFrame)
+    """
+    if archive_path is None:
+        for df in pd.read_csv(filepath, sep=",", encoding="utf-8", index_col=False, chunksize=chunksize, **kwargs):
+            yield df
+        return
+    filename = os.path.basename(filepath)
+    with zipfile.ZipFile(archive_path) as z:
+        members = [name for name in z.namelist() if os.path.basename(name) == filename]
+        assert len(members) == 1, "{0} not found in {1}".format(filename, archive_path)
+        with z.open(members[0]) as f:
+            for df in pd.read_csv(f, sep=",", encoding="utf-8", index_col=False, chunksize=chunksize, **kwargs):
+                yield df
+
+
+def iter_tournament_data(version=None, chunksize=10000, use_cache=True, schema=None, from_zip=False):
+    """
+    Generator which yields the tournament dataset in chunks of a fixed number of rows, so that the memory needed for
+    processing it is bounded by the chunk size. If a valid binary cache exists, the chunks are sliced from it;
+    otherwise the csv file is parsed incrementally. The dataset is validated with the same memoized validation of
+    load_tournament_data: if the file was not validated yet, it is loaded (and its binary cache built) once for
+    validating it before streaming it.
+    :param version: version which is intended to be loaded. If None, last version is loaded. (str|None)
+    :param chunksize: number of rows of each chunk (int)
+    :param use_cache: if True, the chunks are sliced from the binary cache when it is valid (bool)
+    :param schema: dtypes schema used for loading the dataset: None, "compact" or "quantized" (str|None)
+    :param from_zip: if True, the dataset is read straight from the dataset zip archive, without extracting it (bool)
+    :return: chunks of the dataset (generator of pd.DataFrame)
+    """
+    logger = logging.getLogger(__name__)
+    from src.common_paths import get_raw_data_version_path
+    logger.info("Requested tournament data streaming in chunks of {0} rows".format(chunksize))
+    assert schema in SCHEMAS
+    archive_path = _find_dataset_archive(version) if from_zip else None
+    folder = os.path.dirname(archive_path) if from_zip else get_raw_data_version_path(version)
+    filepath = os.path.join(folder, "numerai_tournament_data.csv")
+    if _get_validation_report(filepath, schema, archive_path) is None:
+        logger.info("Test dataset not validated yet, loading it once for validating it")
+        load_tournament_data(version, use_cache=use_cache, schema=schema, from_zip=from_zip)
+    cache = None
+    if use_cache:
+        cache = _load_cache_blocks(_get_cache_path(filepath, schema, archive_path),
+                                   _get_source_fingerprint(filepath, archive_path))
+    if cache is not None:
+        logger.info("Streaming test dataset from its binary cache")
+        meta, blocks = cache
+        chunks = (_build_frame_from_blocks(meta, blocks, start, start + chunksize)
+                  for start in range(0, meta["n_rows"], chunksize))
+    else:
+        logger.info("Streaming test dataset from {0}".format(archive_path or filepath))
+        dtype = {"t_id": str}
+        if schema:
+            dtype = dict(build_numerai_schema(filepath, archive_path), **dtype)
+        chunks = _iter_numerai_csv(filepath, chunksize, archive_path, dtype=dtype)
+    for df in chunks:
+        if schema == "quantized" and cache is None:
+            df = quantize_features(df)
+        yield df
+
+
+def load_numerai_data(version=None, use_cache=True, schema=None, from_zip=False):
     """
     Function responsible for calling the train and test loader functions.
     :param version: version to load (str|unicode)
+    :param use_cache: if True, the datasets are read from their binary caches (bool)
+    :param schema: dtypes schema used for loading the datasets: None, "compact" or "quantized" (str|None)
+    :param from_zip: if True, both datasets are read concurrently (one thread each) straight from the dataset zip
+    archive, overlapping the decompression and the parsing and skipping the extraction (bool)
     :return: training_set, test_set (tuple of pd.DataFrames)
     """
-    df_train = load_train_data(version)
-    df_test = load_tournament_data(version)
+    if from_zip:
+        pool = ThreadPool(2)
+        try:
+            train_result = pool.apply_async(load_train_data, (version, use_cache, schema, True))
+            test_result = pool.apply_async(load_tournament_data, (version, use_cache, schema, True))
+            df_train, df_test = train_result.get(), test_result.get()
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        df_train = load_train_data(version, use_cache=use_cache, schema=schema)
+        df_test = load_tournament_data(version, use_cache=use_cache, schema=schema)
     assert ["t_id"] + df_train.columns.tolist() == df_test.columns.tolist() + ["target"]
     return df_train, df_test
@@ -0,0 +1,204 @@
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.utils import check_random_state
+
+__author__ = "ivallesp"
+
+# Number of bins of every feature. The uniform binning uses the same levels as the "quantized" schema of the
+# file_loaders (round(x * 255)), so the uint8 datasets loaded with that schema are already binned
+N_BINS = 256
+BINNINGS = ["uniform", "quantile"]
+
+
+def _sigmoid(raw):
+    """
+    Logistic function, with the input clipped for avoiding overflows.
+    :param raw: log odds (np.array)
+    :return: probabilities (np.array)
+    """
+    return 1. / (1. + np.exp(-np.clip(raw, -35, 35)))
+
+
+def _build_histograms(X_binned, gradients, hessians):
+    """
+    Builds the gradient, hessian and count histograms of a node one feature at a time, so that no temporary of the size
+    of the node rows times the features is allocated on top of the binned matrix.
+    :param X_binned: binned features of the rows of a node (np.array of uint8)
+    :param gradients: gradients of the rows of the node (np.array)
+    :param hessians: hessians of the rows of the node (np.array)
+    :return: gradient, hessian and count histograms, each one of shape (n_features, N_BINS) (tuple)
+    """
+    n_features = X_binned.shape[1]
+    g = np.empty((n_features, N_BINS))
+    h = np.empty((n_features, N_BINS))
+    c = np.empty((n_features, N_BINS))
+    for j in range(n_features):
+        bins = X_binned[:, j]
+        g[j] = np.bincount(bins, weights=gradients, minlength=N_BINS)
+        h[j] = np.bincount(bins, weights=hessians, minlength=N_BINS)
+        c[j] = np.bincount(bins, minlength=N_BINS)
+    return g, h, c
+
+
+def _find_best_split(histograms, min_samples_leaf, l2_regularization):
+    """
+    Finds the split with the greatest gain among all the features and bins of a node, evaluating all of them at once
+    from the cumulative sums of the histograms.
+    :param histograms: gradient, hessian and count histograms of the node (tuple)
+    :param min_samples_leaf: minimum number of rows of each side of the split (int)
+    :param l2_regularization: L2 penalty of the leaf values (float)
+    :return: feature, bin threshold (rows with a bin lower or equal go left) and gain of the split (int, int, float)
+    """
+    g, h, c = histograms
+    g_total, h_total, c_total = g[0].sum(), h[0].sum(), c[0].sum()
+    g_left, h_left, c_left = [np.cumsum(hist, axis=1)[:, :-1] for hist in histograms]
+    g_right, h_right, c_right = g_total - g_left, h_total - h_left, c_total - c_left
+    gain = (g_left ** 2 / (h_left + l2_regularization) + g_right ** 2 / (h_right + l2_regularization) -
+            g_total ** 2 / (h_total + l2_regularization))
+    gain[(c_left < min_samples_leaf) | (c_right < min_samples_leaf)] = -np.inf
+    feature, threshold = np.unravel_index(np.argmax(gain), gain.shape)
+    return int(feature), int(threshold), float(gain[feature, threshold])
+
+
+def _predict_tree(tree, X_binned):
+    """
+    Computes the output of a tree for every row, moving all the rows one level down at a time.
+    :param tree: arrays describing the nodes of the tree (dict)
+    :param X_binned: binned features (np.array of uint8)
+    :return: output of the tree (np.array)
+    """
+    nodes = np.zeros(X_binned.shape[0], dtype=np.intp)
+    while True:
+        rows = np.nonzero(tree["feature"][nodes] >= 0)[0]
+        if len(rows) == 0:
+            return tree["value"][nodes]
+        current = nodes[rows]
+        goes_left = X_binned[rows, tree["feature"][current]] <= tree["threshold"][current]
+        nodes[rows] = np.where(goes_left, tree["left"][current], tree["right"][current])
+
+
+class HistGradientBoostingClassifier(BaseEstimator, ClassifierMixin):
+    """
+    Binary gradient boosting classifier over binned features. Every feature is discretized in at most 256 levels
+    (uint8) and the split search of each node works over gradient histograms instead of sorted values, so that its
+    cost is linear in the number of rows and the data is stored in a single byte per value. Histograms of the larger
+    child of every split are obtained by subtracting the smaller child's one from the parent's.
+
+    uint8 inputs are assumed to be already binned (e.g. the "quantized" schema of the file_loaders). Float inputs are
+    binned uniformly over [0, 1] (the numerai features range) or by quantiles.
+    """
+    def __init__(self, n_estimators=100, learning_rate=0.1, max_depth=3, min_samples_leaf=20, l2_regularization=1.0,
+                 subsample=1.0, binning="uniform", warm_start=False, random_state=None):
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.l2_regularization = l2_regularization
+        self.subsample = subsample
+        self.binning = binning
+        self.warm_start = warm_start
+        self.random_state = random_state
+
+    def _fit_bins(self, X):
+        X = np.asarray(X)
+        self.bin_edges_ = None
+        if X.dtype != np.uint8 and self.binning == "quantile":
+            rows = X if X.shape[0] <= 200000 else X[check_random_state(0).choice(X.shape[0], 200000, False)]
+            percentiles = np.linspace(0, 100, N_BINS + 1)[1:-1]
+            self.bin_edges_ = [np.unique(np.percentile(rows[:, j], percentiles)) for j in range(X.shape[1])]
+        return self._bin(X)
+
+    def _bin(self, X):
+        X = np.asarray(X)
+        if X.dtype == np.uint8:
+            return X
+        assert self.binning in BINNINGS, "The binning must be one of {0}".format(BINNINGS)
+        if self.bin_edges_ is None:
+            return np.round(np.clip(X, 0, 1) * (N_BINS - 1)).astype(np.uint8)
+        X_binned = np.empty(X.shape, dtype=np.uint8)
+        for j, edges in enumerate(self.bin_edges_):
+            X_binned[:, j] = np.searchsorted(edges, X[:, j], side="right")
+        return X_binned
+
+    def _grow_tree(self, X_binned, gradients, hessians, rows):
+        feature, threshold, left, right, value = [], [], [], [], []
+
+        def add_node():
+            for attribute, default in zip([feature, threshold, left, right, value], [-1, 0, -1, -1, 0.]):
+                attribute.append(default)
+            return len(feature) - 1
+
+        stack = [(add_node(), rows, _build_histograms(X_binned[rows], gradients[rows], hessians[rows]), 0)]
+        while stack:
+            node, node_rows, histograms, depth = stack.pop()
+            value[node] = -self.learning_rate * histograms[0][0].sum() / (histograms[1][0].sum() +
+                                                                          self.l2_regularization)
+            if depth >= self.max_depth or len(node_rows) < 2 * self.min_samples_leaf:
+                continue
+            best_feature, best_threshold, gain = _find_best_split(histograms, self.min_samples_leaf,
+                                                                  self.l2_regularization)
+            if not gain > 0:
+                continue
+            goes_left = X_binned[node_rows, best_feature] <= best_threshold
+            children_rows = [node_rows[goes_left], node_rows[~goes_left]]
+            small = int(len(children_rows[1]) < len(children_rows[0]))
+            children_histograms = [None, None]
+            small_rows = children_rows[small]
+            children_histograms[small] = _build_histograms(X_binned[small_rows], gradients[small_rows],
+                                                           hessians[small_rows])
+            children_histograms[1 - small] = tuple(parent - child for parent, child
+                                                   in zip(histograms, children_histograms[small]))
+            children = [add_node(), add_node()]
+            feature[node], threshold[node], left[node], right[node] = (best_feature, best_threshold) + tuple(children)
+            for child, child_rows, child_histograms in zip(children, children_rows, children_histograms):
+                stack.append((child, child_rows, child_histograms, depth + 1))
+        return {"feature": np.array(feature, dtype=np.intp), "threshold": np.array(threshold, dtype=np.uint8),
+                "left": np.array(left, dtype=np.intp), "right": np.array(right, dtype=np.intp),
+                "value": np.array(value)}
+
+    def _raw_predict(self, X_binned):
+        raw = np.full(X_binned.shape[0], self.init_)
+        for tree in self.trees_:
+            raw += _predict_tree(tree, X_binned)
+        return raw
+
+    def fit(self, X, y):
+        classes, y = np.unique(y, return_inverse=True)
+        assert len(classes) == 2, "Only binary targets are supported"
+        y = y.astype(np.float64)
+        if self.warm_start and hasattr(self, "trees_"):
+            X_binned = self._bin(X)
+            self.trees_ = self.trees_[:self.n_estimators]
+            raw = self._raw_predict(X_binned)
+        else:
+            X_binned = self._fit_bins(X)
+            self.classes_ = classes
+            prior = np.clip(y.mean(), 1e-6, 1 - 1e-6)
+            self.init_ = np.log(prior / (1 - prior))
+            self.trees_ = []
+            self.seed_ = check_random_state(self.random_state).randint(2 ** 30)
+            raw = np.full(len(y), self.init_)
+        n_rows = max(1, int(self.subsample * len(y)))
+        for i in range(len(self.trees_), self.n_estimators):
+            probs = _sigmoid(raw)
+            gradients = probs - y
+            hessians = np.maximum(probs * (1 - probs), 1e-16)
+            if n_rows < len(y):
+                # Each tree gets its own seed, so a warm started fit draws the same rows as a fit from scratch
+                rows = np.sort(np.random.RandomState(self.seed_ + i).choice(len(y), n_rows, replace=False))
+            else:
+                rows = np.arange(len(y))
+            tree = self._grow_tree(X_binned, gradients, hessians, rows)
+            self.trees_.append(tree)
+            raw += _predict_tree(tree, X_binned)
+        return self
+
+    def decision_function(self, X):
+        return self._raw_predict(self._bin(X))
+
+    def predict_proba(self, X):
+        probs = _sigmoid(self.decision_function(X))
+        return np.column_stack([1 - probs, probs])
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
@@ -0,0 +1,112 @@
+import logging
+import numpy as np
+from sklearn.pipeline import Pipeline
+
+__author__ = "ivallesp"
+
+
+def _get_steps(model):
+    """
+    Retrieves the steps of a model, which is considered a single step pipeline if it is not a pipeline.
+    :param model: sklearn-like model (sklearn object)
+    :return: steps (list of tuples)
+    """
+    return model.steps if isinstance(model, Pipeline) else [(None, model)]
+
+
+def supports_incremental_training(model):
+    """
+    Checks if every step of a model can be updated with partial_fit, e.g. a StandardScaler followed by an
+    SGDClassifier, a GaussianNB or an MLPClassifier with the sgd or adam solver.
+    :param model: sklearn-like model (sklearn object)
+    :return: whether the model can be trained incrementally (bool)
+    """
+    return all(hasattr(step, "partial_fit") for _, step in _get_steps(model))
+
+
+def get_new_rows(df, previous_df, columns=None):
+    """
+    Finds the rows of a dataset which are not present in a previous version of it, comparing their 64-bit hashes.
+    :param df: dataset (pd.DataFrame)
+    :param previous_df: previous version of the dataset (pd.DataFrame)
+    :param columns: columns used for identifying the rows. If None, all of them are (list|None)
+    :return: mask of the new rows (np.array of bools)
+    """
+    from src.file_loaders import hash_rows
+    return ~np.in1d(hash_rows(df, columns), hash_rows(previous_df, columns))
+
+
+def partial_fit_pipeline(model, X, y, classes=None):
+    """
+    Updates a fitted model with new data: the statistics of every transformer (e.g. the mean and variance of a
+    StandardScaler) are updated with partial_fit before transforming the data for the next step, and the final
+    estimator is updated with partial_fit.
+    :param model: fitted model whose steps support partial_fit (sklearn object)
+    :param X: new features (np.array|pd.DataFrame)
+    :param y: new target (np.array|pd.Series)
+    :param classes: classes of the target. If None, the ones of the final estimator are used (np.array|None)
+    :return: the updated model (sklearn object)
+    """
+    steps = _get_steps(model)
+    Xt = X
+    for _, step in steps[:-1]:
+        step.partial_fit(Xt)
+        Xt = step.transform(Xt)
+    estimator = steps[-1][1]
+    estimator.partial_fit(Xt, y, classes=estimator.classes_ if classes is None else classes)
+    return model
+
+
+def train_incrementally(version, previous_version, alias, n_epochs=1, random_state=655321):
+    """
+    Trains the model of an alias for a new data version starting from the model stored for the previous version. Only
+    the training rows which are new in this version are used, so the cost depends on the size of the delta instead of
+    on the size of the whole history. The updated model is stored for the new version.
+    :param version: new version of the data (str|unicode)
+    :param previous_version: version whose stored model is updated (str|unicode)
+    :param alias: alias of the model (str|unicode)
+    :param n_epochs: number of passes over the new rows, each one in a different random order (int)
+    :param random_state: seed used for shuffling the new rows (int)
+    :return: the updated model (sklearn object)
+    """
+    logger = logging.getLogger(__name__)
+    from src.file_loaders import load_train_data
+    from src.model_store import load_model, load_model_metadata, store_model
+    logger.info("Requested incremental training of {0} from version {1} to {2}".format(alias, previous_version,
+                                                                                          version))
+    model = load_model(previous_version, alias, mmap_mode=None)
+    assert supports_incremental_training(model), "{0} does not support incremental training".format(alias)
+    metadata = load_model_metadata(previous_version, alias)["metadata"]
+    df = load_train_data(version)
+    features = metadata.get("features") or list(df.columns[df.columns.str.startswith("feature")])
+    new_rows = np.nonzero(get_new_rows(df, load_train_data(previous_version), features + ["target"]))[0]
+    logger.info("{0} new rows out of {1} found in version {2}".format(len(new_rows), df.shape[0], version))
+    rng = np.random.RandomState(random_state)
+    for _ in range(n_epochs if len(new_rows) else 0):
+        rows = rng.permutation(new_rows)
+        model = partial_fit_pipeline(model, df[features].values[rows], df["target"].values[rows])
+    metadata = dict(metadata, incremental_from=previous_version, n_new_rows=len(new_rows))
+    store_model(version, alias, model, metadata=metadata)
+    return model
+
+
+def retrain_battery_incrementally(version, previous_version, aliases=None, n_epochs=1):
+    """
+    Updates incrementally every stored model of the previous version which supports it.
+    :param version: new version of the data (str|unicode)
+    :param previous_version: version whose stored models are updated (str|unicode)
+    :param aliases: aliases of the models. If None, every stored model of the previous version is considered
+    (list|None)
+    :param n_epochs: number of passes over the new rows (int)
+    :return: aliases of the models updated (list)
+    """
+    logger = logging.getLogger(__name__)
+    from src.model_store import list_models, load_model
+    updated = []
+    for alias in (list_models(previous_version) if aliases is None else aliases):
+        if not supports_incremental_training(load_model(previous_version, alias)):
+            logger.info("{0} does not support incremental training. Skipping it".format(alias))
+            continue
+        train_incrementally(version, previous_version, alias, n_epochs)
+        updated.append(alias)
+    return updated
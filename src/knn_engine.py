@@ -0,0 +1,94 @@
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.decomposition import PCA
+from sklearn.neighbors import NearestNeighbors
+
+__author__ = "ivallesp"
+
+# Parameters of the k-nearest neighbors step that can vary among the candidates sharing a neighbor search
+SHARED_NEIGHBORS_PARAMS = ["n_neighbors", "weights", "p", "n_jobs"]
+
+
+def predict_proba_from_neighbors(distances, indices, y_train, n_neighbors, weights="uniform", classes=None):
+    """
+    Computes the k-nearest neighbors class probabilities from the result of a neighbor search done for a greater or
+    equal k. The neighbors must be sorted by distance, as returned by kneighbors, so the first n_neighbors columns are
+    the neighbors for this k. The weighting reproduces the one of KNeighborsClassifier.
+    :param distances: distances to the neighbors of each test row, sorted (np.array)
+    :param indices: train indices of the neighbors of each test row (np.array)
+    :param y_train: target of the train rows (np.array)
+    :param n_neighbors: number of neighbors used (int)
+    :param weights: "uniform" or "distance" (str)
+    :param classes: sorted classes of the target. If None, they are computed from y_train (np.array|None)
+    :return: probabilities of each class (np.array)
+    """
+    assert weights in ["uniform", "distance"], "Only the uniform and distance weightings are supported"
+    classes = np.unique(y_train) if classes is None else classes
+    labels = np.searchsorted(classes, np.asarray(y_train))[indices[:, :n_neighbors]]
+    if weights == "uniform":
+        w = np.ones(labels.shape)
+    else:
+        with np.errstate(divide="ignore"):
+            w = 1. / distances[:, :n_neighbors]
+        # Rows with an exact match only take into account the neighbors at distance zero
+        inf_mask = np.isinf(w)
+        inf_rows = inf_mask.any(axis=1)
+        w[inf_rows] = inf_mask[inf_rows]
+    probs = np.column_stack([(w * (labels == c)).sum(axis=1) for c in range(len(classes))])
+    return probs / probs.sum(axis=1)[:, None]
+
+
+class PrecomputedClassifier(object):
+    """
+    Exposes already computed probabilities through the classifier interface used by the sklearn scorers.
+    """
+    _estimator_type = "classifier"
+
+    def __init__(self, classes, probs):
+        self.classes_ = classes
+        self.probs = probs
+
+    def predict_proba(self, X):
+        return self.probs
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.probs, axis=1)]
+
+
+class ProjectedKNeighborsClassifier(BaseEstimator, ClassifierMixin):
+    """
+    k-nearest neighbors classifier over a PCA projection of the features onto n_components dimensions: the neighbors
+    are searched exactly, with a tree index, in the projected space. It is a different model from a k-nearest neighbors
+    over all the features (its neighbors are not an approximation of theirs), so it has its own grid, which tunes
+    n_components too. The tree index over a few dimensions makes scoring large datasets (e.g. the whole tournament)
+    much faster than a search over all the features.
+    """
+    def __init__(self, n_neighbors=5, weights="uniform", p=2, n_components=8, leaf_size=30, n_jobs=1,
+                 random_state=None):
+        self.n_neighbors = n_neighbors
+        self.weights = weights
+        self.p = p
+        self.n_components = n_components
+        self.leaf_size = leaf_size
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        self.classes_ = np.unique(y)
+        self.y_ = np.asarray(y)
+        self.projection_ = PCA(n_components=min(self.n_components, X.shape[1]), svd_solver="randomized",
+                               random_state=self.random_state).fit(X)
+        self.index_ = NearestNeighbors(algorithm="kd_tree", leaf_size=self.leaf_size, p=self.p,
+                                       n_jobs=self.n_jobs).fit(self.projection_.transform(X))
+        return self
+
+    def kneighbors(self, X, n_neighbors=None):
+        return self.index_.kneighbors(self.projection_.transform(X), n_neighbors or self.n_neighbors)
+
+    def predict_proba(self, X):
+        distances, indices = self.kneighbors(X)
+        return predict_proba_from_neighbors(distances, indices, self.y_, self.n_neighbors, self.weights,
+                                            self.classes_)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
@@ -2,14 +2,19 @@ import pandas as pd
 import numpy as np
 import logging
 import os
+from collections import OrderedDict
 from src.common_paths import *
 from src.logging_tools import setup_logging_environment
-from src.file_loaders import load_numerai_data
+from src.file_loaders import load_train_data
 from src.numerai_utilities import download_last_numerai_data
 from src.reporting_tools import generate_correlation_matrices, generate_profiling_reports
-from src.model_helpers import train_model_with_gridsearch
+from src.battery_scheduler import run_model_battery
+from src.battery_profiler import profile_battery, get_battery_costs
 from src.model_battery import *
-from src.numerai_utilities import build_submission, upload_submission
+from src.numerai_utilities import upload_submission
+from src.batch_inference import build_batch_submissions
+from src.model_store import store_model
+from src.ensembling import load_prediction_matrix, optimize_blend, build_blended_submission
 __author__ = "ivallesp"
 
 
@@ -23,11 +28,17 @@ if not os.listdir(get_raw_data_version_path(version)):
     generate_correlation_matrices(version_name=version)
 
 # Prepare data
-df_train, df_test = load_numerai_data(version)
+df_train = load_train_data(version)
 df_whole = df_train.copy()
 df_dev = df_train.sample(frac=0.1, random_state=655321)
 df_train = df_train.drop(df_dev.index)
 
+# The histogram boosting is fed with the features already binned by the quantized schema, so that they are not binned
+# again on every fit. The split uses the same rows
+df_whole_quantized = load_train_data(version, schema="quantized")
+df_dev_quantized = df_whole_quantized.loc[df_dev.index]
+df_train_quantized = df_whole_quantized.drop(df_dev.index)
+
 train_vars = df_train.columns[~df_train.columns.str.contains("target")]
 target_var = "target"
 
@@ -86,20 +97,42 @@ models.append(model)
 param_grids.append(params)
 
 
-for alias, model, params in zip(aliases, models, param_grids):
-    print "TRAIN MODEL WITH ALIAS %s"% alias
-    model, results = train_model_with_gridsearch(X=df_train[train_vars],
-                                                 y=df_train[target_var],
-                                                 estimator=model,
-                                                 param_grid=params,
-                                                 n_jobs=1,
-                                                 verbose=1)
-    dev_score = -model.score(df_dev[train_vars], df_dev[target_var])
-    model.fit(df_whole[train_vars],
-              df_whole[target_var])
-    preds = model.predict_proba(df_test[train_vars])[:,1]
-    build_submission(version=version, indices=df_test.t_id, probs=preds, alias=alias)
-    status, score = upload_submission(version = version, alias=alias)
+battery = list(zip(aliases, models, param_grids))
+# Profiling fits a few candidates of every entry, so it is opt-in and its plans are reused among runs
+costs = None
+if get_settings().get("profile_battery", False):
+    plans = profile_battery(X=df_train[train_vars], y=df_train[target_var], battery=battery, cache=True)
+    costs = get_battery_costs(plans)
+trained_battery = run_model_battery(X=df_train[train_vars], y=df_train[target_var], battery=battery, verbose=1,
+                                    costs=costs, cache_transformers=True, store_oof=True)
+
+model, params = get_general_hgb()
+trained_battery.update(run_model_battery(X=df_train_quantized[train_vars], y=df_train_quantized[target_var],
+                                         battery=[("HGBGeneral", model, params)], verbose=1, store_oof=True))
+datasets = {"HGBGeneral": (df_dev_quantized, df_whole_quantized)}
+
+for alias, (model, results) in trained_battery.items():
+    print "SUBMIT MODEL WITH ALIAS %s"% alias
+    df_dev_alias, df_whole_alias = datasets.get(alias, (df_dev, df_whole))
+    dev_score = -model.score(df_dev_alias[train_vars], df_dev_alias[target_var])
+    model.fit(df_whole_alias[train_vars],
+              df_whole_alias[target_var])
+    store_model(version=version, alias=alias, model=model.best_estimator_,
+                metadata={"dev_score": float(dev_score), "best_params": repr(model.best_params_),
+                          "features": list(train_vars)})
     scores_dev["alias"] = dev_score
     results_json["alias"] = results
 
+# Score the tournament with all the stored models in a single pass
+build_batch_submissions(version=version, aliases=list(trained_battery), n_jobs=-1)
+for alias in trained_battery:
+    status, score = upload_submission(version=version, alias=alias)
+
+# Blend the submitted models using their out of fold predictions
+best_params = OrderedDict((alias, model.best_params_) for alias, (model, _) in trained_battery.items())
+P, names, y_oof = load_prediction_matrix(best_params)
+blends = optimize_blend(P, y_oof)
+method, (weights, oof_score) = list(blends.items())[0]
+print "SUBMIT ENSEMBLE (%s) WITH OUT OF FOLD LOG LOSS %f" % (method, oof_score)
+build_blended_submission(version=version, aliases=list(best_params), weights=weights, method=method, alias="Ensemble")
+status, score = upload_submission(version=version, alias="Ensemble")
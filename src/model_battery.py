@@ -86,13 +86,37 @@ def get_general_knn(n_jobs_model=-1, random_seed=655321):
     return model, params
 
 
-def get_general_svc(n_jobs_model=-1, random_seed=655321):
+def get_projected_knn(n_jobs_model=-1, random_seed=655321):
+    """
+    Projected KNN gridsearch for classification: k-nearest neighbors over a PCA projection of the features, which
+    makes scoring the tournament much faster (24 parameter sets)
+    :param n_jobs_model: number of jobs (model passed as a model parameter (int)
+    :param random_seed: random seed of the model to be tested (int)
+    :return: model, parameters
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Requested projected KNN grid search for classification. 24 parameters sets retrieved")
+    from src.knn_engine import ProjectedKNeighborsClassifier
+    model = Pipeline([("stdsc", StandardScaler()), ("knn", ProjectedKNeighborsClassifier())])
+    params = {"knn__n_components": [4, 8, 16],
+              "knn__n_neighbors": [5, 13, 34, 89],
+              "knn__weights": ["uniform", "distance"],
+              "knn__random_state": [random_seed],
+              "knn__n_jobs": [n_jobs_model]}
+    return model, params
+
+
+def get_general_svc(n_jobs_model=-1, random_seed=655321, approximation=None):
     """
     SVM gridsearch for classification (60 parameter trials)
     :param n_jobs_model: number of jobs (model passed as a model parameter (int)
     :param random_seed: random seed of the model to be tested (int)
+    :param approximation: if "nystroem" or "rbf_sampler", the kernel is approximated with an explicit feature map and
+    a linear SVM is trained over it, which scales linearly with the number of rows (str|None)
     :return: model, parameters
     """
+    if approximation is not None:
+        return get_approximate_svc(approximation, n_jobs_model, random_seed)
     logger = logging.getLogger(__name__)
     logger.info("Requested SVC general grid search for classification. 60 parameters sets retrieved")
     from sklearn.svm import SVC
@@ -118,6 +142,44 @@ def get_general_svc(n_jobs_model=-1, random_seed=655321):
     return model, params
 
 
+def get_approximate_svc(approximation="nystroem", n_jobs_model=-1, random_seed=655321):
+    """
+    Approximate kernel SVM gridsearch for classification: an explicit approximation of the kernel feature map
+    followed by a linear SVM with sigmoid calibrated probabilities (24 parameter sets with nystroem, 8 with
+    rbf_sampler)
+    :param approximation: "nystroem" (rbf and poly kernels) or "rbf_sampler" (random Fourier features) (str)
+    :param n_jobs_model: number of jobs (model passed as a model parameter (int)
+    :param random_seed: random seed of the model to be tested (int)
+    :return: model, parameters
+    """
+    logger = logging.getLogger(__name__)
+    assert approximation in ["nystroem", "rbf_sampler"], "Unknown kernel approximation: {0}".format(approximation)
+    from sklearn.svm import LinearSVC
+    from sklearn.calibration import CalibratedClassifierCV
+    svc = CalibratedClassifierCV(LinearSVC(class_weight="balanced", random_state=random_seed), method="sigmoid", cv=3)
+    if approximation == "nystroem":
+        logger.info("Requested Nystroem SVC grid search for classification. 24 parameters sets retrieved")
+        from sklearn.kernel_approximation import Nystroem
+        model = Pipeline([("stdsc", StandardScaler()), ("kmap", Nystroem(random_state=random_seed)), ("svc", svc)])
+        params = [{"kmap__kernel": ["rbf"],
+                   "kmap__gamma": [None, 0.01, 0.001, 0.0001],
+                   "kmap__n_components": [500],
+                   "svc__base_estimator__C": [.01, 0.1, 1.0, 10.0]},
+
+                  {"kmap__kernel": ["poly"],
+                   "kmap__degree": [2, 3],
+                   "kmap__n_components": [500],
+                   "svc__base_estimator__C": [.01, 0.1, 1.0, 10.0]}]
+    else:
+        logger.info("Requested random features SVC grid search for classification. 8 parameters sets retrieved")
+        from sklearn.kernel_approximation import RBFSampler
+        model = Pipeline([("stdsc", StandardScaler()), ("kmap", RBFSampler(random_state=random_seed)), ("svc", svc)])
+        params = {"kmap__gamma": [0.01, 0.001],
+                  "kmap__n_components": [1000],
+                  "svc__base_estimator__C": [.01, 0.1, 1.0, 10.0]}
+    return model, params
+
+
 def get_general_rf(n_jobs_model=-1, random_seed=655321):
     """
     RandomForest gridsearch for classification (24 parameter trials)
@@ -160,6 +222,27 @@ def get_general_et(n_jobs_model=-1, random_seed=655321):
     return model, params
 
 
+def get_general_hgb(n_jobs_model=-1, random_seed=655321):
+    """
+    Histogram gradient boosting gridsearch for classification (16 parameter sets). The features are binned into uint8
+    levels, so it can be fed directly with the data loaded with the "quantized" schema
+    :param n_jobs_model: number of jobs (model passed as a model parameter (int)
+    :param random_seed: random seed of the model to be tested (int)
+    :return: model, parameters
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Requested HGB general grid search for classification. 16 parameters sets retrieved")
+    from src.histogram_boosting import HistGradientBoostingClassifier
+    model = Pipeline([("hgb", HistGradientBoostingClassifier())])
+    params = {"hgb__n_estimators": [100, 300],
+              "hgb__learning_rate": [0.1, 0.05],
+              "hgb__max_depth": [3, 5],
+              "hgb__min_samples_leaf": [20, 100],
+              "hgb__subsample": [0.8],
+              "hgb__random_state": [random_seed]}
+    return model, params
+
+
 def get_general_nb(n_jobs_model=-1, random_seed=655321):
     """
     Naive Bayes gridsearch for classification (1 parameter trial)
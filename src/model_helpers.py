@@ -1,9 +1,311 @@
 __author__ = "ivallesp"
+import os
+import json
+import time
+import shutil
+import functools
+import tempfile
 import logging
 import numpy as np
-from sklearn.model_selection import GridSearchCV
+from scipy.stats import rankdata
+from sklearn.base import clone
+from sklearn.metrics.scorer import check_scoring
+from sklearn.model_selection import GridSearchCV, ParameterGrid, check_cv
+from sklearn.pipeline import Pipeline
+from sklearn.utils import safe_indexing
+from sklearn.externals import joblib
+from sklearn.externals.joblib import Parallel, delayed
 
-def train_model_with_gridsearch(X, y, estimator, param_grid, scoring="neg_log_loss", cv=10, n_jobs=1, verbose=0):
+
+def _dump_to_memmap(X, folder, dtype=None):
+    """
+    Converts a matrix into a contiguous array and stores it in a memory mapped file, so that the worker processes
+    attach to it instead of receiving a pickled copy.
+    :param X: matrix to be stored (np.array|pd.DataFrame)
+    :param folder: folder where the file is going to be stored (str|unicode)
+    :param dtype: dtype of the stored array. If None, the dtype of the input is kept (np.dtype|None)
+    :return: memory mapped array (np.memmap)
+    """
+    filepath = os.path.join(folder, "X.npy")
+    np.save(filepath, np.ascontiguousarray(X, dtype=dtype))
+    return np.load(filepath, mmap_mode="r")
+
+
+def _get_cv_splits(X, y, cv):
+    """
+    Materializes the train/test indices of a cross validation scheme.
+    :param cv: either a cv object or an integer indicating the number of folds (sklearn obj|int)
+    :return: train and test indices of each fold (list of tuples)
+    """
+    return list(check_cv(cv, y, classifier=True).split(X, y))
+
+
+def _get_scorer_key(scorer):
+    """
+    Builds the key identifying a scorer in the fold results cache. Scorers which can not be pickled (e.g. lambdas) are
+    identified by their repr, which changes between runs, so their results are never reused.
+    :param scorer: scoring function with signature scorer(estimator, X, y) (func)
+    :return: key of the scorer (str)
+    """
+    try:
+        return joblib.hash(scorer)
+    except Exception:
+        return joblib.hash(repr(scorer))
+
+
+def _get_data_fingerprint(X, y, memo):
+    """
+    Fingerprints the features and target of a search. The fingerprints are memoized by the identity of the data, so
+    that the data is hashed once per search (once per rung for the halving over rows) instead of once per evaluation.
+    :param memo: dictionary where the fingerprints of the search are memoized. It keeps a reference to the data, so
+    that the ids are not reused (dict)
+    :return: fingerprint (str)
+    """
+    key = (id(X), id(y))
+    if key not in memo:
+        memo[key] = (X, y, joblib.hash((X, y)))
+    return memo[key][2]
+
+
+def _get_fold_cache_folder(cache_root, X, y, splits, estimator, scorer, memo):
+    """
+    Retrieves the folder where the fold results of an estimator over a dataset are cached. It is keyed by the
+    fingerprint of the data (features and target) and of the folds, by the estimator class and its base parameters
+    and by the scorer, so that the scores of a different metric are never reused.
+    :param cache_root: root folder of the cache (str|unicode)
+    :param splits: train and test indices of each fold (list of tuples)
+    :param scorer: scoring function with signature scorer(estimator, X, y) (func)
+    :param memo: dictionary used for not fingerprinting the same data twice during a search (dict)
+    :return: path of the folder (str|unicode)
+    """
+    # Only the (small) test indices are hashed on every call, the data is hashed once per search
+    data_key = joblib.hash((_get_data_fingerprint(X, y, memo), [test for _, test in splits]))
+    estimator_key = "{0}_{1}".format(type(estimator).__name__, joblib.hash(clone(estimator)))
+    folder = os.path.join(cache_root, data_key, estimator_key, "scorer_{0}".format(_get_scorer_key(scorer)))
+    if not os.path.exists(folder):
+        try:
+            os.makedirs(folder)
+        except OSError:
+            assert os.path.exists(folder)
+    return folder
+
+
+def _get_fold_cache_path(folder, params, fold):
+    """
+    Retrieves the path of the cached result of a parameter set over a fold.
+    :param folder: folder of the cache of the estimator and data (str|unicode)
+    :param params: parameter set (dict)
+    :param fold: index of the fold (int)
+    :return: path of the cached result (str|unicode)
+    """
+    return os.path.join(folder, "{0}_{1}.json".format(joblib.hash(sorted(params.items())), fold))
+
+
+def _split_cacheable_steps(estimator, candidates):
+    """
+    Splits a pipeline into its leading steps whose parameters are not tuned by any candidate, which produce the same
+    output for every candidate, and the remaining steps.
+    :param estimator: sklearn-like model (sklearn object)
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :return: the cacheable leading steps and the remaining ones, or None and the estimator if there are no cacheable
+    steps (Pipeline|None, sklearn object)
+    """
+    if not isinstance(estimator, Pipeline):
+        return None, estimator
+    tuned_steps = set(name.split("__")[0] for params in candidates for name in params)
+    n_cacheable = 0
+    for name, _ in estimator.steps[:-1]:
+        if name in tuned_steps:
+            break
+        n_cacheable += 1
+    if n_cacheable == 0:
+        return None, estimator
+    return Pipeline(estimator.steps[:n_cacheable]), Pipeline(estimator.steps[n_cacheable:])
+
+
+def _transform_fold(transformer, X, y, train, test):
+    """
+    Fits the transformer over the train rows of a fold and transforms its train and test rows.
+    :param transformer: sklearn-like transformer (sklearn object)
+    :param train: indices of the training rows (np.array)
+    :param test: indices of the test rows (np.array)
+    :return: transformed train and test rows and the time spent (tuple, float)
+    """
+    start = time.time()
+    fold_transformer = clone(transformer)
+    X_train = fold_transformer.fit_transform(safe_indexing(X, train), safe_indexing(y, train))
+    X_test = fold_transformer.transform(safe_indexing(X, test))
+    return (X_train, X_test), time.time() - start
+
+
+def _run_fold_jobs(jobs, run_job, X, y, splits, transformer=None, n_jobs=1, verbose=0, transform_times=None):
+    """
+    Runs jobs bound to the folds of a cross validation in parallel. If a transformer is given, the folds are processed
+    one at a time: the transformer is fitted and applied over the fold, the jobs of the fold are run over its output and
+    the output is released before the next fold, so that the transformed rows of a single fold are alive at a time.
+    :param jobs: jobs to be run, as tuples whose last element is the index of their fold (list of tuples)
+    :param run_job: function building the delayed call of a job, with signature run_job(job, transformed_fold), where
+    transformed_fold is None if there is no transformer (func)
+    :param splits: train and test indices of each fold (list of tuples)
+    :param transformer: leading pipeline steps whose output is shared by all the jobs of a fold (sklearn object|None)
+    :param n_jobs: number of jobs (int)
+    :param verbose: verbosity level (int)
+    :param transform_times: list where the time spent transforming each fold is appended (list|None)
+    :return: outputs of the jobs, in the same order (list)
+    """
+    if transformer is None:
+        return Parallel(n_jobs=n_jobs, verbose=verbose)(run_job(job, None) for job in jobs)
+    outputs = {}
+    for j, (train, test) in enumerate(splits):
+        fold_jobs = [job for job in jobs if job[-1] == j]
+        if not fold_jobs:
+            continue
+        transformed_fold, transform_time = _transform_fold(transformer, X, y, train, test)
+        if transform_times is not None:
+            transform_times.append(transform_time)
+        fold_outputs = Parallel(n_jobs=n_jobs, verbose=verbose)(run_job(job, transformed_fold) for job in fold_jobs)
+        outputs.update(zip(fold_jobs, fold_outputs))
+        transformed_fold = None
+    return [outputs[job] for job in jobs]
+
+
+def _fit_and_score_fold(estimator, params, X, y, train, test, scorer, cache_path=None, transformed_fold=None,
+                        oof_path=None):
+    """
+    Fits a clone of the estimator with the given parameters over the train indices and scores it over the test ones.
+    :param estimator: sklearn-like model (sklearn object)
+    :param params: parameters to be set in the estimator (dict)
+    :param train: indices of the training rows (np.array)
+    :param test: indices of the test rows (np.array)
+    :param scorer: scoring function with signature scorer(estimator, X, y) (func)
+    :param cache_path: if specified, the result is stored in this file as soon as it is computed (str|unicode|None)
+    :param transformed_fold: already transformed train and test rows of the fold. If specified, they are used instead
+    of X (tuple|None)
+    :param oof_path: if specified, the predicted probabilities of the test rows are written in this out of fold
+    predictions file (str|unicode|None)
+    :return: test score, fit time and score time of the fold (dict)
+    """
+    model = clone(estimator).set_params(**params)
+    if transformed_fold is None:
+        X_train, X_test = safe_indexing(X, train), safe_indexing(X, test)
+    else:
+        X_train, X_test = transformed_fold
+    start = time.time()
+    model.fit(X_train, safe_indexing(y, train))
+    fit_time = time.time() - start
+    start = time.time()
+    test_score = scorer(model, X_test, safe_indexing(y, test))
+    result = {"test_score": float(test_score), "fit_time": fit_time, "score_time": time.time() - start}
+    if oof_path is not None:
+        from src.oof_store import write_oof_predictions
+        write_oof_predictions(oof_path, test, model.predict_proba(X_test)[:, 1])
+    if cache_path is not None:
+        tmp_path = "{0}.{1}.tmp".format(cache_path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        os.rename(tmp_path, cache_path)
+    return result
+
+
+def _has_oof_predictions(oof_path, rows):
+    """
+    Checks if the out of fold predictions of some rows are already stored. If they are not being captured, they are
+    considered stored.
+    :param oof_path: path of the out of fold predictions file (str|unicode|None)
+    :param rows: indices of the rows (np.array)
+    :return: whether the predictions are stored (bool)
+    """
+    if oof_path is None:
+        return True
+    from src.oof_store import has_oof_predictions
+    return has_oof_predictions(oof_path, rows)
+
+
+def _evaluate_candidates(X, y, estimator, candidates, splits, scorer, n_jobs=1, verbose=0, cache_root=None,
+                         fingerprint_memo=None, cache_transformers=False, oof_store=None, oof_n_samples=None,
+                         transform_times=None):
+    """
+    Cross validates a list of candidate parameter sets, parallelizing over candidates and folds. If a cache is used,
+    the folds already evaluated in previous runs are read from it and only the missing ones are computed. If
+    cache_transformers is True, the leading pipeline steps which are not tuned (e.g. the StandardScaler) are fitted
+    and applied once per fold and their output is reused by every candidate.
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :param splits: train and test indices of each fold (list of tuples)
+    :param scorer: scoring function with signature scorer(estimator, X, y) (func)
+    :param n_jobs: number of jobs (int)
+    :param verbose: verbosity level (int)
+    :param cache_root: root folder of the persistent fold results cache. If None, no cache is used (str|unicode|None)
+    :param fingerprint_memo: dictionary used for not fingerprinting the same data twice during a search (dict|None)
+    :param cache_transformers: whether to compute the output of the untuned leading pipeline steps once per fold (bool)
+    :param oof_store: folder of the out of fold predictions store where the test predictions of every fold are
+    written. If None, they are not captured (str|unicode|None)
+    :param oof_n_samples: number of rows of the data the store was opened for. Evaluations over a different number of
+    rows (e.g. halving rungs) are not captured (int|None)
+    :param transform_times: list where the time spent transforming each fold is appended (list|None)
+    :return: fold results of each candidate (list of lists of dicts)
+    """
+    logger = logging.getLogger(__name__)
+    fold_results = [[None] * len(splits) for _ in candidates]
+    cache_paths = {}
+    oof_paths = [None] * len(candidates)
+    if oof_store is not None and len(y) == oof_n_samples:
+        from src.oof_store import get_oof_predictions_path
+        oof_paths = [get_oof_predictions_path(oof_store, params) for params in candidates]
+    if cache_root is not None:
+        folder = _get_fold_cache_folder(cache_root, X, y, splits, estimator, scorer,
+                                        {} if fingerprint_memo is None else fingerprint_memo)
+        for i, params in enumerate(candidates):
+            for j in range(len(splits)):
+                cache_paths[(i, j)] = _get_fold_cache_path(folder, params, j)
+                if os.path.exists(cache_paths[(i, j)]) and _has_oof_predictions(oof_paths[i], splits[j][1]):
+                    with open(cache_paths[(i, j)]) as f:
+                        fold_results[i][j] = json.load(f)
+    jobs = [(i, j) for i in range(len(candidates)) for j in range(len(splits)) if fold_results[i][j] is None]
+    if cache_root is not None:
+        logger.info("{0} folds read from the cache, {1} to be computed".format(len(cache_paths) - len(jobs),
+                                                                                 len(jobs)))
+    transformer = None
+    if cache_transformers and jobs:
+        transformer, estimator = _split_cacheable_steps(estimator, candidates)
+        if transformer is not None:
+            logger.info("Caching the output of the steps {0} for each fold".format(
+                [name for name, _ in transformer.steps]))
+
+    def run_job(job, transformed_fold):
+        i, j = job
+        return delayed(_fit_and_score_fold)(estimator, candidates[i], X, y, splits[j][0], splits[j][1], scorer,
+                                            cache_paths.get((i, j)), transformed_fold, oof_paths[i])
+    out = _run_fold_jobs(jobs, run_job, X, y, splits, transformer, n_jobs, verbose, transform_times)
+    for (i, j), fold_result in zip(jobs, out):
+        fold_results[i][j] = fold_result
+    return fold_results
+
+
+def _build_cv_results(candidates, fold_results):
+    """
+    Builds a results dictionary with the same structure as the cv_results_ attribute of GridSearchCV.
+    :param candidates: parameter sets evaluated (list of dicts)
+    :param fold_results: fold results of each candidate (list of lists of dicts)
+    :return: results (dict)
+    """
+    results = {"params": candidates}
+    for metric in ["test_score", "fit_time", "score_time"]:
+        values = np.array([[fold[metric] for fold in folds] for folds in fold_results], dtype=np.float64)
+        results["mean_{0}".format(metric)] = values.mean(axis=1)
+        results["std_{0}".format(metric)] = values.std(axis=1)
+        if metric == "test_score":
+            for j in range(values.shape[1]):
+                results["split{0}_test_score".format(j)] = values[:, j]
+    results["rank_test_score"] = rankdata(-results["mean_test_score"], method="min").astype(int)
+    param_names = sorted(set(name for params in candidates for name in params))
+    for name in param_names:
+        results["param_{0}".format(name)] = [params.get(name) for params in candidates]
+    return results
+
+
+def train_model_with_gridsearch(X, y, estimator, param_grid, scoring="neg_log_loss", cv=10, n_jobs=1, verbose=0,
+                                memmap=False, memmap_dtype=None, search="grid", random_state=655321, cv_cache=None,
+                                cache_transformers=False, oof_alias=None, **search_options):
     """
     Trains a model using gridsearch and returns the best model trained with all the data and the results dictionary.
     :param estimator: sklearn-like model (sklearn object)
@@ -12,16 +314,76 @@ def train_model_with_gridsearch(X, y, estimator, param_grid, scoring="neg_log_lo
     :param cv: either a cv object or an integer indicating the number of folds (sklearn obj|int)
     :param n_jobs: number of jobs (int)
     :param verbose: verbosity level (the greater the number, the more verbose is the model) (int)
+    :param memmap: if True, X is converted once into a memory mapped array shared by all the workers (bool)
+    :param memmap_dtype: dtype of the memory mapped array, e.g. np.float32 for halving its size. If None, the dtype of
+    X is kept, so the scores do not change (np.dtype|None)
+    :param search: search strategy, one of search_strategies.SEARCH_STRATEGIES. "grid" evaluates every candidate,
+    "random" evaluates at most n_iter random candidates within the time budget, "halving" runs a successive halving
+    search, "path" walks the values of path_param with warm starts and "pruning" scores the folds one at a time and
+    abandons the candidates falling behind (str)
+    :param random_state: seed of the random and successive halving searches (int)
+    :param cv_cache: folder of the persistent fold results cache, or True for using the default one. The score and fit
+    time of every fold is stored as soon as it is computed, so that interrupted runs and extended grids only evaluate
+    the new folds. When it is used, the grid search does not compute train scores. It is ignored (with a warning) by
+    the "path" search and by the grids evaluated sharing neighbor searches or kernel matrices (str|unicode|bool|None)
+    :param cache_transformers: if True, the leading pipeline steps which are not tuned (e.g. the StandardScaler) are
+    fitted and applied once per fold and reused by every candidate. The folds are transformed one at a time and the
+    time spent on each one is reported in the "transform_time" entry of the results instead of in the fit times. When
+    it is used, the grid search does not compute train scores (bool)
+    :param oof_alias: if specified, the out of fold probabilities of every candidate are captured in the out of fold
+    predictions store of this alias (see oof_store). When it is used, the grid search does not compute train scores
+    (str|unicode|None)
+    :param search_options: options of the search strategy, e.g. n_iter and time_budget for "random", factor, resource
+    and min_resources for "halving", path_param for "path", pruning, percentile and min_folds for "pruning" or
+    share_neighbors and share_kernels for "grid" (see search_strategies)
     :return: model, results dict (sklearn model|dictionary)
     """
     logger = logging.getLogger(__name__)
+    from src.search_strategies import SEARCH_STRATEGIES, FittedSearch, SearchContext, uses_shared_evaluation
     logger.info("Requested gridsearch process")
-    logger.info("Training the requested estimator using gridsearch")
+    assert search in SEARCH_STRATEGIES, "The search must be one of {0}".format(list(SEARCH_STRATEGIES))
+    memmap_folder = None
+    if memmap:
+        memmap_folder = tempfile.mkdtemp(prefix="numerai_gridsearch_")
+        logger.info("Storing the features in a memory mapped file in {0}".format(memmap_folder))
+        X = _dump_to_memmap(X, memmap_folder, memmap_dtype)
+        y = np.asarray(y)
+    logger.info("Training the requested estimator using {0} search".format(search))
+
+    if cv_cache is True:
+        from src.common_paths import get_cv_cache_path
+        cv_cache = get_cv_cache_path()
 
-    grid_search = GridSearchCV(estimator=estimator, param_grid=param_grid, scoring=scoring, cv=cv, n_jobs=n_jobs,
-                               refit=True, verbose=verbose, return_train_score=True)
+    oof_store = None
+    if oof_alias:
+        from src.oof_store import open_oof_store
+        oof_store = open_oof_store(oof_alias, y)
 
-    trained_model = grid_search.fit(X, y)
+    try:
+        candidates = list(ParameterGrid(param_grid))
+        custom_evaluation = cv_cache or cache_transformers or oof_alias
+        if search == "grid" and not custom_evaluation and not uses_shared_evaluation(estimator, candidates,
+                                                                                      **search_options):
+            grid_search = GridSearchCV(estimator=estimator, param_grid=param_grid, scoring=scoring, cv=cv,
+                                       n_jobs=n_jobs, refit=True, verbose=verbose, return_train_score=True)
+            trained_model = grid_search.fit(X, y)
+        else:
+            scorer = check_scoring(estimator, scoring)
+            transform_times = []
+            fingerprint_memo = {}
+            evaluate = functools.partial(_evaluate_candidates, scorer=scorer, n_jobs=n_jobs, verbose=verbose,
+                                         cache_root=cv_cache or None, fingerprint_memo=fingerprint_memo,
+                                         cache_transformers=cache_transformers, oof_store=oof_store,
+                                         oof_n_samples=len(y), transform_times=transform_times)
+            context = SearchContext(X, y, estimator, cv, scorer, evaluate, n_jobs, verbose, random_state,
+                                    cache_transformers, cv_cache, oof_store, transform_times, fingerprint_memo)
+            results = SEARCH_STRATEGIES[search](context, candidates, **search_options)
+            if context.transform_times:
+                results["transform_time"] = context.transform_times
+            trained_model = FittedSearch(estimator, results, scoring).fit(X, y)
+    finally:
+        if memmap_folder is not None:
+            shutil.rmtree(memmap_folder, ignore_errors=True)
     results = trained_model.cv_results_
     logger.info("Gridsearch trained successfully. Generating results JSON")
     # Fix dictionary for allowing a further JSON conversion
@@ -29,4 +391,3 @@ def train_model_with_gridsearch(X, y, estimator, param_grid, scoring="neg_log_lo
         if type(results[key]) in [np.ndarray, np.array, np.ma.core.MaskedArray]:
             results[key] = results[key].tolist()
     return trained_model, results
-
@@ -0,0 +1,131 @@
+import os
+import json
+import shutil
+import logging
+import datetime
+from sklearn.externals import joblib
+
+__author__ = "ivallesp"
+
+MODEL_FILENAME = "model.pkl"
+METADATA_FILENAME = "metadata.json"
+
+
+def get_model_path(version, alias):
+    """
+    Retrieves the folder where the model of an alias trained over a data version is stored.
+    :param version: version of the data the model was trained with (str|unicode)
+    :param alias: alias of the model (str|unicode)
+    :return: path of the folder (str|unicode)
+    """
+    from src.common_paths import get_models_version_path
+    return os.path.join(get_models_version_path(version), alias)
+
+
+def store_model(version, alias, model, metadata=None):
+    """
+    Stores a fitted model. It is dumped without compression, so that its numpy arrays can be memory mapped when it is
+    loaded. The model is written in a temporary folder which is then renamed, so a stored model is never partial.
+    :param version: version of the data the model was trained with (str|unicode)
+    :param alias: alias of the model (str|unicode)
+    :param model: fitted model (sklearn object)
+    :param metadata: extra JSON serializable information stored next to the model, e.g. its scores (dict|None)
+    :return: path of the folder where the model is stored (str|unicode)
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Requested storage of model {0} of version {1}".format(alias, version))
+    model_path = get_model_path(version, alias)
+    tmp_path = "{0}.{1}.tmp".format(model_path, os.getpid())
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    joblib.dump(model, os.path.join(tmp_path, MODEL_FILENAME))
+    description = {"alias": alias,
+                   "version": version,
+                   "class": type(model).__name__,
+                   "stored_at": datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+                   "metadata": metadata or {}}
+    with open(os.path.join(tmp_path, METADATA_FILENAME), "w") as f:
+        f.write(json.dumps(description, sort_keys=True, indent=4, separators=(',', ': ')))
+    if os.path.exists(model_path):
+        shutil.rmtree(model_path)
+    os.rename(tmp_path, model_path)
+    logger.info("Model stored successfully in {0}".format(model_path))
+    return model_path
+
+
+def has_model(version, alias):
+    """
+    Checks if the model of an alias trained over a data version is stored.
+    :param version: version of the data (str|unicode)
+    :param alias: alias of the model (str|unicode)
+    :return: whether the model is stored (bool)
+    """
+    return os.path.exists(os.path.join(get_model_path(version, alias), MODEL_FILENAME))
+
+
+def load_model_metadata(version, alias):
+    """
+    Loads the description of a stored model: alias, version, class, storage date and the extra metadata.
+    :param version: version of the data (str|unicode)
+    :param alias: alias of the model (str|unicode)
+    :return: description of the model (dict)
+    """
+    with open(os.path.join(get_model_path(version, alias), METADATA_FILENAME)) as f:
+        return json.load(f)
+
+
+def load_model(version, alias, mmap_mode="r"):
+    """
+    Loads a stored model. With the default mmap_mode, its numpy arrays (coefficients, training data of the neighbor
+    models, node arrays of the histogram boosting trees...) are memory mapped read only instead of copied, so every
+    process loading the same model shares them through the page cache. Structures which sklearn copies when
+    unpickling (e.g. the Cython trees of the forests) are not shared.
+    :param version: version of the data (str|unicode)
+    :param alias: alias of the model (str|unicode)
+    :param mmap_mode: memory mapping mode of the numpy arrays, or None for loading them in memory (str|None)
+    :return: the fitted model (sklearn object)
+    """
+    assert has_model(version, alias), "There is no stored model {0} for version {1}".format(alias, version)
+    return joblib.load(os.path.join(get_model_path(version, alias), MODEL_FILENAME), mmap_mode=mmap_mode)
+
+
+def list_models(version):
+    """
+    Lists the aliases of the models stored for a data version.
+    :param version: version of the data (str|unicode)
+    :return: sorted aliases (list)
+    """
+    from src.common_paths import get_models_version_path
+    folder = get_models_version_path(version)
+    return sorted(alias for alias in os.listdir(folder) if os.path.exists(os.path.join(folder, alias, MODEL_FILENAME)))
+
+
+class LazyModel(object):
+    """
+    Proxy of a stored model which is only loaded (memory mapped) the first time it is used. When it is sent to another
+    process only its location travels, and the receiving process maps the same files instead of receiving a copy of
+    the model.
+    """
+    def __init__(self, version, alias, mmap_mode="r"):
+        self.version = version
+        self.alias = alias
+        self.mmap_mode = mmap_mode
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = load_model(self.version, self.alias, self.mmap_mode)
+        return self._model
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name == "_model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def __getstate__(self):
+        return {"version": self.version, "alias": self.alias, "mmap_mode": self.mmap_mode, "_model": None}
+
+    def __repr__(self):
+        return "LazyModel(version={0!r}, alias={1!r})".format(self.version, self.alias)
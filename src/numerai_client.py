@@ -0,0 +1,102 @@
+import json
+import time
+import base64
+import logging
+import datetime
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from NumerAPI.numerapi import NumerAPI
+
+__author__ = "ivallesp"
+
+# Lifetime assumed for the tokens whose expiration can not be read from them, in seconds
+DEFAULT_TOKEN_TTL = 30 * 60
+# Margin before the expiration of a token from which it is not used anymore, in seconds
+TOKEN_EXPIRY_MARGIN = 60
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def get_pooled_session(pool_maxsize=10):
+    """
+    Builds a requests session which keeps its connections alive and reuses them among calls.
+    :param pool_maxsize: maximum number of connections kept per host (int)
+    :return: the session (requests.Session)
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_token_expiry(token, default_ttl=DEFAULT_TOKEN_TTL):
+    """
+    Reads the expiration time of a JSON web token from its "exp" claim. The signature is not verified.
+    :param token: access token (str|unicode)
+    :param default_ttl: lifetime assumed from now when the token does not contain its expiration, in seconds (int)
+    :return: expiration time, in seconds since the epoch (float)
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(str(payload)))["exp"])
+    except Exception:
+        return time.time() + default_ttl
+
+
+class CachedNumerAPI(NumerAPI):
+    """
+    NumerAPI client which sends all its requests through a pooled session, keeps the access and refresh tokens until
+    they expire instead of logging in on every upload, and memoizes the dataset and competition ids of the current
+    round until it ends instead of downloading the leaderboard on every upload.
+    """
+    def __init__(self, email, password, session=None, pool_maxsize=10):
+        super(CachedNumerAPI, self).__init__(email, password,
+                                             session=get_pooled_session(pool_maxsize) if session is None else session)
+        self._lock = threading.Lock()
+        self._tokens = None
+        self._token_expiry = 0.
+        self._competition = None
+        self._competition_end = None
+
+    def invalidate_tokens(self):
+        with self._lock:
+            self._tokens = None
+            self._token_expiry = 0.
+
+    def login(self):
+        logger = logging.getLogger(__name__)
+        with self._lock:
+            if self._tokens is not None and time.time() < self._token_expiry - TOKEN_EXPIRY_MARGIN:
+                return self._tokens + (201,)
+            logger.info("Logging in the Numer.ai API")
+            access_token, refresh_token, id_, status_code = super(CachedNumerAPI, self).login()
+            if status_code == 201:
+                self._tokens = (access_token, refresh_token, id_)
+                self._token_expiry = get_token_expiry(access_token)
+            return access_token, refresh_token, id_, status_code
+
+    def authorize(self, file_path):
+        filename, signed_request, headers, status_code = super(CachedNumerAPI, self).authorize(file_path)
+        if status_code == 401:
+            # The token was revoked before its expiration, so a fresh one is requested once
+            self.invalidate_tokens()
+            filename, signed_request, headers, status_code = super(CachedNumerAPI, self).authorize(file_path)
+        return filename, signed_request, headers, status_code
+
+    def get_current_competition(self):
+        now = datetime.datetime.now()
+        if self._competition is not None and now < self._competition_end:
+            return self._competition + (200,)
+        leaderboard, status_code = self.get_leaderboard()
+        if status_code != 200:
+            return None, None, status_code
+        for c in leaderboard:
+            start_date = datetime.datetime.strptime(c["start_date"], DATE_FORMAT)
+            end_date = datetime.datetime.strptime(c["end_date"], DATE_FORMAT)
+            if start_date < now < end_date:
+                self._competition = (c["dataset_id"], c["_id"])
+                self._competition_end = end_date
+                return self._competition + (status_code,)
+        return None, None, 404
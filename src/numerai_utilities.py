@@ -8,34 +8,71 @@ import numpy as np
 __author__ = "ivallesp"
 
 
-def get_numerai_api_access():
+# Clients already authenticated, by credentials, so that the connections and tokens are reused among calls
+_api_clients = {}
+# Secrets of the numerai account, reloaded only when the secrets.json file changes
+_secrets_cache = {"stamp": None, "secrets": None}
+
+
+def get_numerai_secrets():
     """
-    Returns an authenticated object for accessing comfortably to the numerai API.
-    :return: None (void)
+    Retrieves the secrets of the numerai account (email, password and username). They are loaded once per process and
+    reloaded only when the secrets.json file changes (detected through its mtime and size), like the settings.
+    :return: the secrets (dict)
+    """
+    from src.common_paths import get_numerai_secrets_path
+    secrets_path = get_numerai_secrets_path()
+    stat = os.stat(secrets_path)
+    stamp = (stat.st_mtime, stat.st_size)
+    if _secrets_cache["stamp"] != stamp:
+        with open(secrets_path) as f:
+            _secrets_cache["secrets"] = json.load(f)
+        _secrets_cache["stamp"] = stamp
+    return _secrets_cache["secrets"]
+
+
+def get_numerai_api_access(cached=True):
+    """
+    Returns an authenticated object for accessing comfortably to the numerai API. By default a single pooled client
+    which caches its tokens and the ids of the current round is built for each credentials and reused by every call.
+    :param cached: if False, a new plain client is built and logged in (bool)
+    :return: numerai API client (NumerAPI)
     """
     logger = logging.getLogger(__name__)
     logger.info("Requested Numer.ai api access")
     from NumerAPI.numerapi import NumerAPI
-    from src.common_paths import get_numerai_secrets_path
-    secrets = json.load(open(get_numerai_secrets_path()))
-    n_api = NumerAPI(email=secrets["email"], password=secrets["password"])
+    from src.numerai_client import CachedNumerAPI
+    secrets = get_numerai_secrets()
+    credentials = (secrets["email"], secrets["password"])
+    if cached and credentials in _api_clients:
+        return _api_clients[credentials]
+    n_api = (CachedNumerAPI if cached else NumerAPI)(email=credentials[0], password=credentials[1])
     logger.info("Authenticating with Numer.ai API...")
     _, _, _, status = n_api.login()
     logger.info("Numer.ai API returned status {0}".format(status))
+    if cached and status == 201:
+        _api_clients[credentials] = n_api
     return n_api
 
 
-def download_last_numerai_data(version_name=None):
+def download_last_numerai_data(version_name=None, unzip=True):
     """
     Downloads the last version of the dataset from the numerai API, stores it in the data/raw folder and
-    updates the settings.json file with the name of the version downloaded.
+    updates the settings.json file with the name of the version downloaded. The downloaded archive is registered in the
+    data versions manifest; if its content matches an already registered version, the files (and binary caches) of
+    that version are hard linked instead of extracting the archive again.
     :version_name: If it is specified, it will be used as the new version name, instead of building it using the date.
     (str|none)
+    :unzip: if False, the archive is not extracted. The data can then be loaded straight from it using
+    load_numerai_data(version, from_zip=True) (bool)
     :return: None (void)
     """
     logger = logging.getLogger(__name__)
     logger.info("Requested numer.ai data download")
+    import zipfile
     from src.common_paths import get_raw_data_path
+    from src.dataset_registry import (find_dataset_archive, find_version_by_archive_hash, hash_file,
+                                      link_data_version, register_data_version)
     n_api = get_numerai_api_access()
     if not version_name:
         version_name = datetime.datetime.now().strftime("%Y%m%d")
@@ -43,8 +80,24 @@ def download_last_numerai_data(version_name=None):
     if not os.path.exists(path):
         os.makedirs(path)
     logger.info('Downloading data with version name: {0}'.format(version_name))
-    status = n_api.download_current_dataset(dest_path=path)
+    status = n_api.download_current_dataset(dest_path=path, unzip=False)
     logger.info("Numer.ai API returned status {0}".format(status))
+    if status != 200:
+        return status
+    archive_path = find_dataset_archive(path)
+    archive_sha256 = hash_file(archive_path)
+    duplicate_of = find_version_by_archive_hash(archive_sha256, exclude=version_name)
+    if duplicate_of:
+        logger.info("Downloaded data is identical to version {0}. Linking its files".format(duplicate_of))
+        os.remove(archive_path)
+        link_data_version(duplicate_of, version_name)
+        archive_path = find_dataset_archive(path)
+    elif unzip:
+        logger.info("Extracting {0}".format(archive_path))
+        with zipfile.ZipFile(archive_path, "r") as z:
+            z.extractall(path)
+    # The linked archive has the same content, so the digest is reused
+    register_data_version(version_name, archive_path, duplicate_of=duplicate_of, archive_sha256=archive_sha256)
     logger.info("New data sets stored in {0}".format(path))
     with open("settings.json", 'rb') as f:
         settings = json.load(f)
@@ -53,7 +106,94 @@ def download_last_numerai_data(version_name=None):
         f.write(json.dumps(settings, sort_keys=True, indent=4, separators=(',', ': ')))
     return status
 
-def build_submission(version, indices, probs, alias, replace=False):
+def _format_ids(indices):
+    """
+    Formats the t_id column of a submission once, as the "<t_id>," prefix of every line.
+    :param indices: indices to be put in the submission (list|np.array|pd.Series)
+    :return: prefixes (np.array of unicode)
+    """
+    return np.char.add(np.asarray(indices).astype(np.unicode_), u",")
+
+
+def _format_probs(probs, precision):
+    """
+    Formats probabilities with a fixed number of decimals using vectorized integer arithmetic instead of formatting
+    every float in Python.
+    :param probs: probabilities, in [0, 1] (np.array)
+    :param precision: number of decimals (int)
+    :return: formatted probabilities (np.array of unicode)
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    assert np.isfinite(probs).all(), "The submission contains non finite probabilities"
+    scaled = np.round(np.clip(probs, 0, 1) * 10 ** precision).astype(np.int64)
+    whole = (scaled // 10 ** precision).astype(np.unicode_)
+    decimals = np.char.zfill((scaled % 10 ** precision).astype(np.unicode_), precision)
+    return np.char.add(np.char.add(whole, u"."), decimals)
+
+
+def _get_tmp_path(path):
+    """
+    Retrieves the path of the temporary file a submission is written into before being moved over its final path.
+    :param path: path of the submission file (str|unicode)
+    :return: temporary path (str|unicode)
+    """
+    return "{0}.{1}.tmp".format(path, os.getpid())
+
+
+def _write_submission_chunks(path, chunks, precision=6, compress=False):
+    """
+    Writes a submission file chunk by chunk into a temporary file which is renamed once it is complete, so a partial
+    submission is never left in place.
+    :param path: path of the submission file (str|unicode)
+    :param chunks: (formatted t_id column, as returned by _format_ids, probabilities predicted) pairs (iterable)
+    :param precision: number of decimals of the probabilities (int)
+    :param compress: if True, the file is gzip compressed (bool)
+    :return: number of rows written (int)
+    """
+    import gzip
+    from src.utilities import replace_file
+    tmp_path = _get_tmp_path(path)
+    n_rows = 0
+    with (gzip.open(tmp_path, "wb") if compress else open(tmp_path, "wb")) as f:
+        f.write(b"t_id,probability\n")
+        for id_prefixes, probs in chunks:
+            assert len(id_prefixes) == len(probs)
+            lines = np.char.add(id_prefixes, _format_probs(probs, precision))
+            f.write((u"\n".join(lines.tolist()) + u"\n").encode("utf-8"))
+            n_rows += len(probs)
+    replace_file(tmp_path, path)
+    return n_rows
+
+
+def _write_submission_file(path, id_prefixes, probs, precision=6, compress=False, chunksize=100000):
+    """
+    Writes a submission file whose predictions are already in memory, formatting chunksize rows at a time.
+    :param path: path of the submission file (str|unicode)
+    :param id_prefixes: formatted t_id column, as returned by _format_ids (np.array)
+    :param probs: probabilities predicted (np.array)
+    :param precision: number of decimals of the probabilities (int)
+    :param compress: if True, the file is gzip compressed (bool)
+    :param chunksize: number of rows formatted at a time (int)
+    :return: None (void)
+    """
+    assert len(id_prefixes) == len(probs)
+    _write_submission_chunks(path, ((id_prefixes[start:start + chunksize], probs[start:start + chunksize])
+                                    for start in range(0, len(probs), chunksize)), precision, compress)
+
+
+def _get_submission_path(version, alias, compress=False, replace=False):
+    """
+    Retrieves the path of a submission to be built, checking that it does not exist unless it can be replaced.
+    :return: path of the submission (str|unicode)
+    """
+    from src.common_paths import get_submission_filepath
+    path = get_submission_filepath(version, alias, compress)
+    if not replace:
+        assert not os.path.exists(path)
+    return path
+
+
+def build_submission(version, indices, probs, alias, replace=False, compress=False, precision=6):
     """
     Given a set of indices and probs, builds a submission ad stores it in the submissions folder.
     :param version: Version of the data used to generate the submission (str|unicode)
@@ -61,25 +201,82 @@ def build_submission(version, indices, probs, alias, replace=False):
     :param probs: probabilities predicted (list|np.array|pd.Series)
     :param alias: unique alias of the submission. Used to build the csv name in order to identify the submission among
     the other ones (str|unicode)
+    :param replace: if True, an existing submission with the same alias is overwritten (bool)
+    :param compress: if True, the submission is gzip compressed and ".gz" is appended to its name (bool)
+    :param precision: number of decimals of the probabilities (int)
     :return: None (void)
     """
     logger = logging.getLogger(__name__)
     logger.info("Requested numer.ai submission build: {0}, {1}".format(version, alias))
-    from src.common_paths import get_submissions_version_path
-    if not type(indices) == list:
-        indices = list(indices)
-    if not type(probs) == list:
-        probs = list(probs)
+    probs = np.asarray(probs)
     assert len(indices) == len(probs)
-    path = os.path.join(get_submissions_version_path(version), "submission_{0}.csv".format(alias))
-    if not replace:
-        assert not os.path.exists(path)
+    path = _get_submission_path(version, alias, compress, replace)
     logger.info("Storing submission")
-    df = pd.DataFrame({"t_id": indices, "probability": probs})[["t_id", "probability"]]
-    df.to_csv(path, sep=",", index=False, decimal=".", encoding="utf-8")
+    _write_submission_file(path, _format_ids(indices), probs, precision, compress)
     logger.info("Submission stored successfully in: {0}".format(path))
 
 
+def build_submissions(version, indices, probs, replace=False, compress=False, precision=6, n_threads=4):
+    """
+    Builds the submissions of several aliases sharing the same indices. The t_id column is formatted once and the
+    files are written concurrently.
+    :param version: Version of the data used to generate the submissions (str|unicode)
+    :param indices: Indices to be put in the submissions (list|np.array|pd.Series)
+    :param probs: alias -> probabilities predicted mapping (dict)
+    :param replace: if True, existing submissions with the same aliases are overwritten (bool)
+    :param compress: if True, the submissions are gzip compressed and ".gz" is appended to their names (bool)
+    :param precision: number of decimals of the probabilities (int)
+    :param n_threads: number of files written at the same time (int)
+    :return: alias -> path of the submission mapping (dict)
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Requested numer.ai submissions build: {0}, {1}".format(version, sorted(probs)))
+    from multiprocessing.pool import ThreadPool
+    id_prefixes = _format_ids(indices)
+    paths = dict((alias, _get_submission_path(version, alias, compress, replace)) for alias in probs)
+    assert all(len(alias_probs) == len(id_prefixes) for alias_probs in probs.values())
+    pool = ThreadPool(max(1, min(n_threads, len(probs))))
+    try:
+        pending = [pool.apply_async(_write_submission_file, (paths[alias], id_prefixes, np.asarray(alias_probs),
+                                                             precision, compress))
+                   for alias, alias_probs in probs.items()]
+        for result in pending:
+            result.get()
+    finally:
+        pool.close()
+        pool.join()
+    logger.info("{0} submissions stored successfully".format(len(paths)))
+    return paths
+
+
+def build_streamed_submission(version, estimator, features, alias, chunksize=10000, replace=False, compress=False,
+                              precision=6):
+    """
+    Scores the tournament dataset chunk by chunk and writes the predictions of each chunk as soon as they are
+    computed, so that the memory needed is bounded by the chunk size instead of by the size of the tournament. The file
+    is formatted and written like the ones of build_submission.
+    :param version: Version of the data used to generate the submission (str|unicode)
+    :param estimator: fitted model implementing predict_proba (sklearn object)
+    :param features: names of the columns to be fed into the estimator (list|pd.Index)
+    :param alias: unique alias of the submission. Used to build the csv name in order to identify the submission among
+    the other ones (str|unicode)
+    :param chunksize: number of rows scored at a time (int)
+    :param replace: if True, an existing submission with the same alias is overwritten (bool)
+    :param compress: if True, the submission is gzip compressed and ".gz" is appended to its name (bool)
+    :param precision: number of decimals of the probabilities (int)
+    :return: None (void)
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Requested numer.ai streamed submission build: {0}, {1}".format(version, alias))
+    from src.file_loaders import iter_tournament_data
+    path = _get_submission_path(version, alias, compress, replace)
+    logger.info("Scoring and storing submission in chunks of {0} rows".format(chunksize))
+    chunks = ((_format_ids(df_chunk["t_id"].values), estimator.predict_proba(df_chunk[features])[:, 1])
+              for df_chunk in iter_tournament_data(version, chunksize=chunksize))
+    n_rows = _write_submission_chunks(path, chunks, precision, compress)
+    logger.info("Submission with {0} rows stored successfully in: {1}".format(n_rows, path))
+
+
 def upload_submission(version, alias, restore_best_submission=True, store_scores=True):
     """
     Given a submission, uploads it and returns the score obtained.
@@ -90,11 +287,9 @@ def upload_submission(version, alias, restore_best_submission=True, store_scores
     """
     logger = logging.getLogger(__name__)
     logger.info("Requested numer.ai data submission upload: {0}, {1}".format(version, alias))
-    from src.common_paths import get_submissions_version_path, get_project_path, get_submission_filepath
-    with open(os.path.join(get_project_path(), "NumerAPI", "secrets.json")) as f:
-        secrets = json.load(f)
-    username = secrets["username"]
-    path = os.path.join(get_submission_filepath(version, alias))
+    from src.common_paths import get_submission_filepath
+    username = get_numerai_secrets()["username"]
+    path = get_submission_filepath(version, alias)
     logger.info("Using submission path: {0}".format(path))
     assert os.path.exists(path)
     n_api = get_numerai_api_access()
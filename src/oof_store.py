@@ -0,0 +1,159 @@
+import os
+import json
+import shutil
+import logging
+import numpy as np
+from collections import OrderedDict
+from sklearn.externals import joblib
+
+__author__ = "ivallesp"
+
+
+def get_params_key(params):
+    """
+    Builds a stable key identifying a parameter set.
+    :param params: parameter set (dict)
+    :return: key (str)
+    """
+    return joblib.hash(sorted(params.items()))
+
+
+def get_oof_store_path(alias):
+    """
+    Retrieves the folder where the out of fold predictions of a battery entry are stored.
+    :param alias: alias of the battery entry (str|unicode)
+    :return: path of the folder (str|unicode)
+    """
+    from src.common_paths import get_oof_path
+    return os.path.join(get_oof_path(), alias)
+
+
+def _load_index(store_path):
+    """
+    Loads the index of a store: the fingerprint of the target and the parameter sets stored.
+    :param store_path: folder of the store (str|unicode)
+    :return: the index or None if the store does not exist (dict|None)
+    """
+    index_path = os.path.join(store_path, "index.json")
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def _store_index(store_path, index):
+    """
+    Stores the index of a store atomically.
+    :param store_path: folder of the store (str|unicode)
+    :param index: index to be stored (dict)
+    :return: None (void)
+    """
+    tmp_path = os.path.join(store_path, "index.json.tmp")
+    from src.utilities import replace_file
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    replace_file(tmp_path, os.path.join(store_path, "index.json"))
+
+
+def open_oof_store(alias, y):
+    """
+    Opens the out of fold predictions store of a battery entry for writing. If it was built over a different target,
+    it is emptied. The target is stored next to the predictions.
+    :param alias: alias of the battery entry (str|unicode)
+    :param y: target of the data being cross validated (np.array|pd.Series)
+    :return: folder of the store (str|unicode)
+    """
+    logger = logging.getLogger(__name__)
+    store_path = get_oof_store_path(alias)
+    y = np.asarray(y)
+    fingerprint = joblib.hash(y)
+    index = _load_index(store_path)
+    if index is not None and index["target_fingerprint"] != fingerprint:
+        logger.info("Out of fold store {0} was built over a different target. Emptying it".format(store_path))
+        shutil.rmtree(store_path)
+        index = None
+    if index is None:
+        if not os.path.exists(store_path):
+            os.makedirs(store_path)
+        np.save(os.path.join(store_path, "target.npy"), y)
+        _store_index(store_path, {"target_fingerprint": fingerprint, "n_samples": len(y), "params": {}})
+    return store_path
+
+
+def get_oof_predictions_path(store_path, params):
+    """
+    Retrieves the path of the out of fold predictions of a parameter set, creating the file (filled with NaNs) and
+    registering the parameters in the index if it does not exist.
+    :param store_path: folder of the store (str|unicode)
+    :param params: parameter set (dict)
+    :return: path of the predictions file (str|unicode)
+    """
+    key = get_params_key(params)
+    filepath = os.path.join(store_path, "{0}.npy".format(key))
+    if not os.path.exists(filepath):
+        index = _load_index(store_path)
+        predictions = np.lib.format.open_memmap(filepath, mode="w+", dtype=np.float32, shape=(index["n_samples"],))
+        predictions[:] = np.nan
+        predictions.flush()
+        del predictions
+        index["params"][key] = repr(params)
+        _store_index(store_path, index)
+    return filepath
+
+
+def write_oof_predictions(filepath, rows, probs):
+    """
+    Writes the predictions of a fold into the rows of a predictions file. Different folds write disjoint rows, so
+    they can be written concurrently from different processes.
+    :param filepath: path of the predictions file (str|unicode)
+    :param rows: indices of the rows of the fold (np.array)
+    :param probs: predicted probabilities of the positive class (np.array)
+    :return: None (void)
+    """
+    predictions = np.load(filepath, mmap_mode="r+")
+    predictions[rows] = probs
+    predictions.flush()
+
+
+def has_oof_predictions(filepath, rows):
+    """
+    Checks if the predictions of some rows have already been written.
+    :param filepath: path of the predictions file (str|unicode)
+    :param rows: indices of the rows (np.array)
+    :return: whether all the rows are filled (bool)
+    """
+    return bool(np.isfinite(np.load(filepath, mmap_mode="r")[rows]).all())
+
+
+def load_oof_predictions(alias, complete_only=True):
+    """
+    Loads the out of fold predictions stored for a battery entry. The predictions are memory mapped.
+    :param alias: alias of the battery entry (str|unicode)
+    :param complete_only: if True, only the parameter sets with a prediction for every row are returned (bool)
+    :return: parameter sets (as strings) -> predictions mapping and the target (OrderedDict, np.array)
+    """
+    store_path = get_oof_store_path(alias)
+    index = _load_index(store_path)
+    assert index is not None, "There is no out of fold store for {0}".format(alias)
+    predictions = OrderedDict()
+    for key, params in sorted(index["params"].items(), key=lambda item: item[1]):
+        values = np.load(os.path.join(store_path, "{0}.npy".format(key)), mmap_mode="r")
+        if complete_only and not np.isfinite(values).all():
+            continue
+        predictions[params] = values
+    return predictions, np.load(os.path.join(store_path, "target.npy"))
+
+
+def score_oof_predictions(alias, eps=1e-15):
+    """
+    Computes the log loss of every parameter set of a battery entry from its stored out of fold predictions.
+    :param alias: alias of the battery entry (str|unicode)
+    :param eps: probabilities are clipped to [eps, 1 - eps] (float)
+    :return: parameter sets (as strings) -> log loss mapping, sorted from best to worst (OrderedDict)
+    """
+    predictions, y = load_oof_predictions(alias)
+    scores = {}
+    for params, probs in predictions.items():
+        probs = np.clip(probs, eps, 1 - eps)
+        scores[params] = float(-np.mean(y * np.log(probs) + (1 - y) * np.log(1 - probs)))
+    return OrderedDict(sorted(scores.items(), key=lambda item: item[1]))
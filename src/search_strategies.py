@@ -0,0 +1,688 @@
+import math
+import time
+import logging
+import numpy as np
+from collections import OrderedDict
+from sklearn.base import BaseEstimator, clone
+from sklearn.metrics.scorer import check_scoring
+from sklearn.pipeline import Pipeline
+from sklearn.utils import safe_indexing
+from sklearn.externals.joblib import delayed
+from src.model_helpers import (_build_cv_results, _get_cv_splits, _get_data_fingerprint, _run_fold_jobs,
+                               _split_cacheable_steps)
+
+__author__ = "ivallesp"
+
+PRUNING_RULES = ["median", "percentile"]
+# Parameters of the SVC step which define its kernel
+KERNEL_PARAMS = ["kernel", "gamma", "degree", "coef0"]
+# String values of the SVC gamma which can be resolved from the train rows. "auto_deprecated" is the default of the
+# sklearn 0.20 SVC, which behaves as "auto"
+GAMMA_RULES = ["auto", "auto_deprecated", "scale"]
+# Order in which the values of a warm start path parameter are walked: from the strongest to the weakest
+# regularization and from the smallest to the largest ensemble
+PATH_ORDERS = {"alpha": "descending", "C": "ascending", "n_estimators": "ascending", "max_iter": "ascending"}
+
+
+class SearchContext(object):
+    """
+    Everything a search strategy needs for evaluating candidates: the data, the estimator, the cross validation
+    scheme, the scorer and the evaluation settings. The evaluate function cross validates a list of candidates over
+    some folds, reading and writing the fold results cache and capturing the out of fold predictions if they are
+    enabled. With the cache enabled, the data of the search is fingerprinted once, when the context is built, and the
+    fingerprint is shared with the evaluate function through the fingerprint memo.
+    """
+    def __init__(self, X, y, estimator, cv, scorer, evaluate, n_jobs=1, verbose=0, random_state=655321,
+                 cache_transformers=False, cv_cache=None, oof_store=None, transform_times=None,
+                 fingerprint_memo=None):
+        self.X = X
+        self.y = y
+        self.estimator = estimator
+        self.cv = cv
+        self.scorer = scorer
+        self.evaluate = evaluate
+        self.n_jobs = n_jobs
+        self.verbose = verbose
+        self.random_state = random_state
+        self.cache_transformers = cache_transformers
+        self.cv_cache = cv_cache
+        self.oof_store = oof_store
+        # Time spent fitting and applying the untuned leading pipeline steps, once per fold transformed
+        self.transform_times = [] if transform_times is None else transform_times
+        # Fingerprints of the data evaluated during the search, by the identity of the data
+        self.fingerprint_memo = {} if fingerprint_memo is None else fingerprint_memo
+        if cv_cache:
+            _get_data_fingerprint(X, y, self.fingerprint_memo)
+        self._splits = None
+
+    @property
+    def splits(self):
+        if self._splits is None:
+            self._splits = _get_cv_splits(self.X, self.y, self.cv)
+        return self._splits
+
+
+class FittedSearch(BaseEstimator):
+    """
+    Outcome of a search strategy: the best candidate of the results refitted over the data. It exposes the same
+    attributes as a fitted GridSearchCV (best_estimator_, best_params_, best_score_, best_index_, cv_results_,
+    n_splits_ and scorer_) and delegates the predictions and scores to the best estimator. Fitting it again refits the
+    best candidate over the new data without searching again.
+    """
+    def __init__(self, estimator, cv_results, scoring=None):
+        self.estimator = estimator
+        self.cv_results = cv_results
+        self.scoring = scoring
+
+    def fit(self, X, y):
+        self.cv_results_ = self.cv_results
+        self.best_index_ = int(np.argmax(self.cv_results["mean_test_score"]))
+        self.best_params_ = self.cv_results["params"][self.best_index_]
+        self.best_score_ = self.cv_results["mean_test_score"][self.best_index_]
+        self.n_splits_ = len([k for k in self.cv_results if k.startswith("split") and k.endswith("_test_score")])
+        self.scorer_ = check_scoring(self.estimator, self.scoring)
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y)
+        return self
+
+    @property
+    def classes_(self):
+        return self.best_estimator_.classes_
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+    def predict_proba(self, X):
+        return self.best_estimator_.predict_proba(X)
+
+    def decision_function(self, X):
+        return self.best_estimator_.decision_function(X)
+
+    def score(self, X, y):
+        return self.scorer_(self.best_estimator_, X, y)
+
+
+def _random_search(X, y, estimator, candidates, evaluate, splits, n_iter, time_budget, random_state):
+    """
+    Evaluates the candidates in random order until n_iter of them have been evaluated or the time budget is exhausted.
+    At least one candidate is always evaluated.
+    :param evaluate: function evaluating a list of candidates over some folds, with signature
+    evaluate(X, y, estimator, candidates, splits) (func)
+    :param n_iter: maximum number of candidates to evaluate. If None, there is no limit (int|None)
+    :param time_budget: wall clock budget, in seconds. If None, there is no limit (float|None)
+    :param random_state: seed used for shuffling the candidates (int)
+    :return: candidates evaluated and their fold results (list of dicts, list of lists of dicts)
+    """
+    logger = logging.getLogger(__name__)
+    order = np.random.RandomState(random_state).permutation(len(candidates))
+    if n_iter is not None:
+        order = order[:n_iter]
+    deadline = time.time() + time_budget if time_budget is not None else None
+    evaluated, fold_results = [], []
+    for i in order:
+        if evaluated and deadline is not None and time.time() > deadline:
+            logger.info("Time budget exhausted after {0} candidates".format(len(evaluated)))
+            break
+        evaluated.append(candidates[i])
+        fold_results.extend(evaluate(X, y, estimator, [candidates[i]], splits))
+    return evaluated, fold_results
+
+
+def _successive_halving(X, y, estimator, candidates, evaluate, cv, factor, resource, min_resources, random_state):
+    """
+    Successive halving search: all the candidates are evaluated with a small amount of resources (rows or estimator
+    size) and only the best 1/factor of them are promoted to the next rung, which uses factor times more resources.
+    The last rung uses all the resources.
+    :param evaluate: function evaluating a list of candidates over some folds, with signature
+    evaluate(X, y, estimator, candidates, splits) (func)
+    :param cv: either a cv object or an integer indicating the number of folds (sklearn obj|int)
+    :param factor: proportion of candidates discarded and resources increase between rungs (int)
+    :param resource: "n_samples" for halving over rows or the name of an integer parameter of the estimator, e.g.
+    "rf__n_estimators" (str)
+    :param min_resources: minimum amount of resources used in any rung (int)
+    :param random_state: seed used for subsampling the rows (int)
+    :return: candidates evaluated in the last rung, their fold results and the history of the rungs (list, list, list)
+    """
+    logger = logging.getLogger(__name__)
+    n_rungs = max(1, int(math.ceil(math.log(len(candidates), factor) - 1e-9)))
+    rows_order = np.random.RandomState(random_state).permutation(len(y))
+    survivors = candidates
+    history = []
+    for rung in range(n_rungs):
+        shrink = factor ** (n_rungs - 1 - rung)
+        if resource == "n_samples":
+            n_resources = max(min_resources, int(len(y) / shrink))
+            rows = np.sort(rows_order[:n_resources])
+            X_rung, y_rung = safe_indexing(X, rows), safe_indexing(y, rows)
+            rung_candidates = survivors
+        else:
+            X_rung, y_rung = X, y
+            rung_candidates = []
+            for params in survivors:
+                full_resources = params.get(resource, estimator.get_params()[resource])
+                n_resources = max(min_resources, int(full_resources / shrink))
+                rung_candidates.append(dict(params, **{resource: n_resources}))
+        splits = _get_cv_splits(X_rung, y_rung, cv)
+        logger.info("Halving rung {0}: {1} candidates, {2} {3}".format(rung, len(survivors), n_resources, resource))
+        fold_results = evaluate(X_rung, y_rung, estimator, rung_candidates, splits)
+        scores = [np.mean([fold["test_score"] for fold in folds]) for folds in fold_results]
+        history.append({"rung": rung, "n_resources": n_resources, "params": rung_candidates,
+                        "mean_test_score": scores})
+        if rung == n_rungs - 1:
+            return survivors, fold_results, history
+        n_promoted = max(1, int(math.ceil(len(survivors) / float(factor))))
+        survivors = [survivors[i] for i in np.argsort(scores)[::-1][:n_promoted]]
+
+
+def _pruning_search(X, y, estimator, candidates, evaluate, splits, pruning, percentile, min_folds):
+    """
+    Pruning search: the folds are scored one at a time for all the candidates still alive and, once min_folds folds
+    have been scored, the candidates whose running mean score falls below the median (or the given percentile) of the
+    running means of the alive candidates are abandoned. The best candidate is never pruned.
+    :param evaluate: function evaluating a list of candidates over some folds, with signature
+    evaluate(X, y, estimator, candidates, splits) (func)
+    :param splits: train and test indices of each fold (list of tuples)
+    :param pruning: pruning rule, one of PRUNING_RULES (str)
+    :param percentile: percentile of the running means below which a candidate is pruned, for the "percentile" rule
+    (float)
+    :param min_folds: number of folds scored before any candidate can be pruned (int)
+    :return: candidates fully evaluated, their fold results and the pruning decision of every candidate (list, list,
+    list)
+    """
+    logger = logging.getLogger(__name__)
+    assert pruning in PRUNING_RULES, "The pruning rule must be one of {0}".format(PRUNING_RULES)
+    threshold_percentile = 50 if pruning == "median" else percentile
+    fold_results = [[] for _ in candidates]
+    decisions = [{"params": params, "pruned": False, "n_folds": len(splits), "running_mean_test_score": None,
+                  "threshold": None} for params in candidates]
+    alive = list(range(len(candidates)))
+    for j, split in enumerate(splits):
+        out = evaluate(X, y, estimator, [candidates[i] for i in alive], [split])
+        for i, folds in zip(alive, out):
+            fold_results[i].extend(folds)
+        if j + 1 < min_folds or j + 1 == len(splits) or len(alive) == 1:
+            continue
+        running_means = np.array([np.mean([fold["test_score"] for fold in fold_results[i]]) for i in alive])
+        threshold = np.percentile(running_means, threshold_percentile)
+        best = alive[int(np.argmax(running_means))]
+        survivors = []
+        for i, running_mean in zip(alive, running_means):
+            if running_mean < threshold and i != best:
+                decisions[i].update({"pruned": True, "n_folds": j + 1, "running_mean_test_score": float(running_mean),
+                                     "threshold": float(threshold)})
+            else:
+                survivors.append(i)
+        logger.info("Pruning after fold {0}: {1} of {2} candidates abandoned".format(j, len(alive) - len(survivors),
+                                                                                      len(alive)))
+        alive = survivors
+    n_folds_saved = sum(len(splits) - decision["n_folds"] for decision in decisions)
+    logger.info("Pruning search saved {0} of {1} fold fits".format(n_folds_saved, len(splits) * len(candidates)))
+    return [candidates[i] for i in alive], [fold_results[i] for i in alive], decisions
+
+
+def _get_warm_start_param(path_param):
+    """
+    Retrieves the name of the warm_start parameter of the step tuned by a path parameter.
+    :param path_param: name of the path parameter, e.g. "glmnet__alpha" (str)
+    :return: name of the warm_start parameter, e.g. "glmnet__warm_start" (str)
+    """
+    return "__".join(path_param.split("__")[:-1] + ["warm_start"])
+
+
+def _sort_path_values(path_param, values):
+    """
+    Sorts the values of a path parameter in the order they have to be walked with warm starts.
+    :param path_param: name of the path parameter (str)
+    :param values: values of the parameter (list)
+    :return: sorted values (list)
+    """
+    order = PATH_ORDERS.get(path_param.split("__")[-1])
+    assert order is not None, "{0} can not be used as a warm start path parameter".format(path_param)
+    return sorted(values, reverse=(order == "descending"))
+
+
+def _fit_and_score_path(estimator, params, path_param, path_values, X, y, train, test, scorer,
+                        transformed_fold=None, oof_paths=None):
+    """
+    Walks the values of a path parameter over a fold using warm starts: each fit starts from the solution of the
+    previous value (or, for ensembles, keeps the trees already grown) and the model is scored at every value.
+    :param params: values of the rest of parameters (dict)
+    :param path_param: name of the path parameter (str)
+    :param path_values: values of the path parameter, in walking order (list)
+    :param transformed_fold: already transformed train and test rows of the fold (tuple|None)
+    :param oof_paths: out of fold predictions files of each path value, if they are being captured (list|None)
+    :return: test score, fit time and score time of each path value (list of dicts)
+    """
+    model = clone(estimator).set_params(**params).set_params(**{_get_warm_start_param(path_param): True})
+    if transformed_fold is None:
+        X_train, X_test = safe_indexing(X, train), safe_indexing(X, test)
+    else:
+        X_train, X_test = transformed_fold
+    y_train, y_test = safe_indexing(y, train), safe_indexing(y, test)
+    results = []
+    fit_time = 0.0
+    for k, value in enumerate(path_values):
+        model.set_params(**{path_param: value})
+        start = time.time()
+        model.fit(X_train, y_train)
+        fit_time += time.time() - start
+        start = time.time()
+        test_score = scorer(model, X_test, y_test)
+        # The fit time is cumulative: it is the cost of reaching this value of the path
+        results.append({"test_score": float(test_score), "fit_time": fit_time, "score_time": time.time() - start})
+        if oof_paths is not None:
+            from src.oof_store import write_oof_predictions
+            write_oof_predictions(oof_paths[k], test, model.predict_proba(X_test)[:, 1])
+    return results
+
+
+def _warm_start_path_search(X, y, estimator, candidates, splits, scorer, path_param, n_jobs=1, verbose=0,
+                            cache_transformers=False, oof_store=None, transform_times=None):
+    """
+    Evaluates the candidates grouping them by the values of all the parameters but the path one. Each group is
+    evaluated with a single warm started walk of the path per fold, instead of a fit from scratch per value.
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :param splits: train and test indices of each fold (list of tuples)
+    :param scorer: scoring function with signature scorer(estimator, X, y) (func)
+    :param path_param: name of the path parameter, e.g. "glmnet__alpha" or "rf__n_estimators" (str)
+    :param cache_transformers: whether to compute the output of the untuned leading pipeline steps once per fold (bool)
+    :param oof_store: folder of the out of fold predictions store. If None, they are not captured (str|unicode|None)
+    :param transform_times: list where the time spent transforming each fold is appended (list|None)
+    :return: candidates, in path order, and their fold results (list of dicts, list of lists of dicts)
+    """
+    logger = logging.getLogger(__name__)
+    assert all(path_param in params for params in candidates), "Every candidate must contain {0}".format(path_param)
+    groups = OrderedDict()
+    for params in candidates:
+        fixed_params = dict((k, v) for k, v in params.items() if k != path_param)
+        groups.setdefault(repr(sorted(fixed_params.items())), (fixed_params, []))[1].append(params[path_param])
+    groups = [(fixed_params, _sort_path_values(path_param, values)) for fixed_params, values in groups.values()]
+    logger.info("Walking {0} warm start paths over {1} folds".format(len(groups), len(splits)))
+    transformer = None
+    if cache_transformers:
+        transformer, estimator = _split_cacheable_steps(estimator, candidates)
+    oof_paths = [None] * len(groups)
+    if oof_store is not None:
+        from src.oof_store import get_oof_predictions_path
+        oof_paths = [[get_oof_predictions_path(oof_store, dict(fixed_params, **{path_param: value}))
+                      for value in values] for fixed_params, values in groups]
+    jobs = [(g, j) for g in range(len(groups)) for j in range(len(splits))]
+
+    def run_job(job, transformed_fold):
+        g, j = job
+        return delayed(_fit_and_score_path)(estimator, groups[g][0], path_param, groups[g][1], X, y, splits[j][0],
+                                            splits[j][1], scorer, transformed_fold, oof_paths[g])
+    out = _run_fold_jobs(jobs, run_job, X, y, splits, transformer, n_jobs, verbose, transform_times)
+    path_results = dict(zip(jobs, out))
+    evaluated, fold_results = [], []
+    for g, (fixed_params, values) in enumerate(groups):
+        for k, value in enumerate(values):
+            evaluated.append(dict(fixed_params, **{path_param: value}))
+            fold_results.append([path_results[(g, j)][k] for j in range(len(splits))])
+    return evaluated, fold_results
+
+
+def _is_shared_neighbors_grid(estimator, candidates):
+    """
+    Checks if a grid can be evaluated sharing the neighbor searches: the estimator must end in a k-nearest neighbors
+    classifier with a minkowski metric, the leading steps must not be tuned and the candidates can only vary the
+    SHARED_NEIGHBORS_PARAMS of the last step.
+    :param estimator: sklearn-like model (sklearn object)
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :return: whether the neighbor searches can be shared (bool)
+    """
+    from sklearn.neighbors import KNeighborsClassifier
+    from src.knn_engine import ProjectedKNeighborsClassifier, SHARED_NEIGHBORS_PARAMS
+    step_name, step = estimator.steps[-1] if isinstance(estimator, Pipeline) else (None, estimator)
+    if not isinstance(step, (KNeighborsClassifier, ProjectedKNeighborsClassifier)):
+        return False
+    if getattr(step, "metric", "minkowski") != "minkowski":
+        return False
+    prefix = "{0}__".format(step_name) if step_name is not None else ""
+    for params in candidates:
+        for name, value in params.items():
+            if not name.startswith(prefix) or name[len(prefix):] not in SHARED_NEIGHBORS_PARAMS:
+                return False
+            if name[len(prefix):] == "weights" and value not in ["uniform", "distance"]:
+                return False
+    return step.weights in ["uniform", "distance"]
+
+
+def _fit_and_score_neighbors(estimator, group, X, y, train, test, scorer, transformed_fold=None, oof_paths=None):
+    """
+    Runs a single neighbor search over a fold for the largest number of neighbors of a group of candidates sharing
+    the metric, and scores every candidate of the group deriving its predictions from that search.
+    :param estimator: k-nearest neighbors step, with the fixed parameters already set (sklearn object)
+    :param group: candidates of the group, with the parameter names of the step (list of dicts)
+    :param transformed_fold: already transformed train and test rows of the fold (tuple|None)
+    :param oof_paths: out of fold predictions files of each candidate, if they are being captured (list|None)
+    :return: test score, fit time and score time of each candidate (list of dicts)
+    """
+    from src.knn_engine import PrecomputedClassifier, predict_proba_from_neighbors
+    if transformed_fold is None:
+        X_train, X_test = safe_indexing(X, train), safe_indexing(X, test)
+    else:
+        X_train, X_test = transformed_fold
+    y_train, y_test = safe_indexing(y, train), safe_indexing(y, test)
+    start = time.time()
+    max_neighbors = max(params.get("n_neighbors", estimator.n_neighbors) for params in group)
+    model = clone(estimator).set_params(**dict(group[0], n_neighbors=max_neighbors)).fit(X_train, y_train)
+    distances, indices = model.kneighbors(X_test)
+    # The cost of the shared search is split among the candidates of the group
+    fit_time = (time.time() - start) / len(group)
+    results = []
+    for k, params in enumerate(group):
+        start = time.time()
+        probs = predict_proba_from_neighbors(distances, indices, y_train,
+                                             params.get("n_neighbors", estimator.n_neighbors),
+                                             params.get("weights", estimator.weights), model.classes_)
+        test_score = scorer(PrecomputedClassifier(model.classes_, probs), X_test, y_test)
+        results.append({"test_score": float(test_score), "fit_time": fit_time, "score_time": time.time() - start})
+        if oof_paths is not None:
+            from src.oof_store import write_oof_predictions
+            write_oof_predictions(oof_paths[k], test, probs[:, 1])
+    return results
+
+
+def _shared_neighbors_search(X, y, estimator, candidates, splits, scorer, n_jobs=1, verbose=0, oof_store=None,
+                             transform_times=None):
+    """
+    Evaluates a k-nearest neighbors grid running a single neighbor search per fold and value of p, for the largest
+    number of neighbors. The predictions of every smaller number of neighbors and of both weightings are derived from
+    the sorted neighbors of that search. The leading pipeline steps are fitted and applied once per fold.
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :param splits: train and test indices of each fold (list of tuples)
+    :param scorer: scoring function with signature scorer(estimator, X, y) (func)
+    :param oof_store: folder of the out of fold predictions store. If None, they are not captured (str|unicode|None)
+    :param transform_times: list where the time spent transforming each fold is appended (list|None)
+    :return: fold results of each candidate (list of lists of dicts)
+    """
+    logger = logging.getLogger(__name__)
+    transformer, step = _split_cacheable_steps(estimator, candidates)
+    step_name, step = step.steps[-1] if isinstance(step, Pipeline) else (None, step)
+    prefix = "{0}__".format(step_name) if step_name is not None else ""
+    step_candidates = [dict((name[len(prefix):], value) for name, value in params.items()) for params in candidates]
+    groups = OrderedDict()
+    for i, params in enumerate(step_candidates):
+        groups.setdefault(params.get("p", step.p), []).append(i)
+    groups = list(groups.values())
+    logger.info("Evaluating {0} candidates with {1} neighbor searches per fold".format(len(candidates), len(groups)))
+    oof_paths = [None] * len(groups)
+    if oof_store is not None:
+        from src.oof_store import get_oof_predictions_path
+        oof_paths = [[get_oof_predictions_path(oof_store, candidates[i]) for i in group] for group in groups]
+    jobs = [(g, j) for g in range(len(groups)) for j in range(len(splits))]
+
+    def run_job(job, transformed_fold):
+        g, j = job
+        return delayed(_fit_and_score_neighbors)(step, [step_candidates[i] for i in groups[g]], X, y, splits[j][0],
+                                                 splits[j][1], scorer, transformed_fold, oof_paths[g])
+    out = _run_fold_jobs(jobs, run_job, X, y, splits, transformer, n_jobs, verbose, transform_times)
+    fold_results = [[None] * len(splits) for _ in candidates]
+    for (g, j), group_results in zip(jobs, out):
+        for i, result in zip(groups[g], group_results):
+            fold_results[i][j] = result
+    return fold_results
+
+
+def _is_shared_kernel_grid(estimator, candidates):
+    """
+    Checks if a grid can be evaluated sharing the kernel matrices: the estimator must end in an SVC with a linear,
+    rbf, poly or sigmoid kernel whose gamma is a number or one of GAMMA_RULES, and the leading steps must not be tuned.
+    :param estimator: sklearn-like model (sklearn object)
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :return: whether the kernel matrices can be shared (bool)
+    """
+    from sklearn.svm import SVC
+    step_name, step = estimator.steps[-1] if isinstance(estimator, Pipeline) else (None, estimator)
+    if not isinstance(step, SVC):
+        return False
+    prefix = "{0}__".format(step_name) if step_name is not None else ""
+    for params in candidates:
+        if any(not name.startswith(prefix) for name in params):
+            return False
+        if params.get("{0}kernel".format(prefix), step.kernel) not in ["linear", "rbf", "poly", "sigmoid"]:
+            return False
+        gamma = params.get("{0}gamma".format(prefix), step.gamma)
+        if isinstance(gamma, basestring) and gamma not in GAMMA_RULES:
+            return False
+    return True
+
+
+def _resolve_gamma(gamma, X_train):
+    """
+    Resolves the gamma of an SVC as the SVC does when it is fitted over the train rows: "auto" is 1 / n_features and
+    "scale" is 1 / (n_features * variance of the train rows).
+    :param gamma: kernel coefficient or one of GAMMA_RULES (float|str)
+    :param X_train: train rows (np.array)
+    :return: kernel coefficient (float)
+    """
+    if not isinstance(gamma, basestring):
+        return gamma
+    assert gamma in GAMMA_RULES, "Unknown gamma: {0}".format(gamma)
+    if gamma == "scale":
+        return 1. / (X_train.shape[1] * np.asarray(X_train).var())
+    return 1. / X_train.shape[1]
+
+
+def _compute_kernel(X, Y, kernel, gamma, degree, coef0):
+    """
+    Computes the kernel matrix between the rows of two matrices, with the same definition SVC uses.
+    :param kernel: "linear", "rbf", "poly" or "sigmoid" (str)
+    :param gamma: kernel coefficient, already resolved with _resolve_gamma (float)
+    :param degree: degree of the polynomial kernel (int)
+    :param coef0: independent term of the polynomial and sigmoid kernels (float)
+    :return: kernel matrix (np.array)
+    """
+    from sklearn.metrics.pairwise import pairwise_kernels
+    kernel_params = {"linear": {},
+                     "rbf": {"gamma": gamma},
+                     "poly": {"gamma": gamma, "degree": degree, "coef0": coef0},
+                     "sigmoid": {"gamma": gamma, "coef0": coef0}}[kernel]
+    return pairwise_kernels(X, Y, metric=kernel, **kernel_params)
+
+
+def _fit_and_score_kernel(estimator, kernel_params, group, X, y, train, test, scorer, transformed_fold=None,
+                          oof_paths=None):
+    """
+    Computes the train and test kernel matrices of a fold once and fits and scores every candidate of a group sharing
+    the kernel parameters (e.g. different values of C) over them.
+    :param estimator: SVC step (sklearn object)
+    :param kernel_params: values of the KERNEL_PARAMS shared by the group (dict)
+    :param group: candidates of the group, with the parameter names of the step (list of dicts)
+    :param transformed_fold: already transformed train and test rows of the fold (tuple|None)
+    :param oof_paths: out of fold predictions files of each candidate, if they are being captured (list|None)
+    :return: test score, fit time and score time of each candidate (list of dicts)
+    """
+    if transformed_fold is None:
+        X_train, X_test = safe_indexing(X, train), safe_indexing(X, test)
+    else:
+        X_train, X_test = transformed_fold
+    y_train, y_test = safe_indexing(y, train), safe_indexing(y, test)
+    start = time.time()
+    # The gamma rules depend on the train rows, as when the SVC is fitted over them
+    kernel_params = dict(kernel_params, gamma=_resolve_gamma(kernel_params["gamma"], X_train))
+    K_train = _compute_kernel(X_train, X_train, **kernel_params)
+    K_test = _compute_kernel(X_test, X_train, **kernel_params)
+    # The cost of the shared kernel matrices is split among the candidates of the group
+    kernel_time = (time.time() - start) / len(group)
+    results = []
+    for k, params in enumerate(group):
+        model = clone(estimator).set_params(**params).set_params(kernel="precomputed")
+        start = time.time()
+        model.fit(K_train, y_train)
+        fit_time = time.time() - start + kernel_time
+        start = time.time()
+        test_score = scorer(model, K_test, y_test)
+        results.append({"test_score": float(test_score), "fit_time": fit_time, "score_time": time.time() - start})
+        if oof_paths is not None:
+            from src.oof_store import write_oof_predictions
+            write_oof_predictions(oof_paths[k], test, model.predict_proba(K_test)[:, 1])
+    return results
+
+
+def _shared_kernel_search(X, y, estimator, candidates, splits, scorer, n_jobs=1, verbose=0, oof_store=None,
+                          transform_times=None):
+    """
+    Evaluates an SVC grid computing the kernel matrices once per fold and kernel parameters (kernel, gamma, degree and
+    coef0) and reusing them for every value of the rest of parameters (C, class_weight...). The leading pipeline steps
+    are fitted and applied once per fold.
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :param splits: train and test indices of each fold (list of tuples)
+    :param scorer: scoring function with signature scorer(estimator, X, y) (func)
+    :param oof_store: folder of the out of fold predictions store. If None, they are not captured (str|unicode|None)
+    :param transform_times: list where the time spent transforming each fold is appended (list|None)
+    :return: fold results of each candidate (list of lists of dicts)
+    """
+    logger = logging.getLogger(__name__)
+    transformer, step = _split_cacheable_steps(estimator, candidates)
+    step_name, step = step.steps[-1] if isinstance(step, Pipeline) else (None, step)
+    prefix = "{0}__".format(step_name) if step_name is not None else ""
+    step_candidates = [dict((name[len(prefix):], value) for name, value in params.items()) for params in candidates]
+    groups = OrderedDict()
+    for i, params in enumerate(step_candidates):
+        kernel_params = dict((name, params.get(name, getattr(step, name))) for name in KERNEL_PARAMS)
+        groups.setdefault(repr(sorted(kernel_params.items())), (kernel_params, []))[1].append(i)
+    groups = list(groups.values())
+    logger.info("Evaluating {0} candidates with {1} kernel matrices per fold".format(len(candidates), len(groups)))
+    oof_paths = [None] * len(groups)
+    if oof_store is not None:
+        from src.oof_store import get_oof_predictions_path
+        oof_paths = [[get_oof_predictions_path(oof_store, candidates[i]) for i in group] for _, group in groups]
+    jobs = [(g, j) for g in range(len(groups)) for j in range(len(splits))]
+
+    def run_job(job, transformed_fold):
+        g, j = job
+        return delayed(_fit_and_score_kernel)(step, groups[g][0], [step_candidates[i] for i in groups[g][1]], X, y,
+                                              splits[j][0], splits[j][1], scorer, transformed_fold, oof_paths[g])
+    out = _run_fold_jobs(jobs, run_job, X, y, splits, transformer, n_jobs, verbose, transform_times)
+    fold_results = [[None] * len(splits) for _ in candidates]
+    for (g, j), group_results in zip(jobs, out):
+        for i, result in zip(groups[g][1], group_results):
+            fold_results[i][j] = result
+    return fold_results
+
+
+def uses_shared_evaluation(estimator, candidates, share_neighbors=True, share_kernels=True):
+    """
+    Checks if the grid search of some candidates is evaluated sharing the neighbor searches or the kernel matrices.
+    :param estimator: sklearn-like model (sklearn object)
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :param share_neighbors: whether the neighbor searches can be shared (bool)
+    :param share_kernels: whether the kernel matrices can be shared (bool)
+    :return: whether the grid uses a shared evaluation (bool)
+    """
+    return ((share_neighbors and _is_shared_neighbors_grid(estimator, candidates)) or
+            (share_kernels and _is_shared_kernel_grid(estimator, candidates)))
+
+
+def grid_search(context, candidates, share_neighbors=True, share_kernels=True):
+    """
+    Evaluates every candidate.
+    :param context: data and evaluation settings (SearchContext)
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :param share_neighbors: if True, the grid of a k-nearest neighbors estimator runs a single neighbor search per fold
+    and metric, for the largest number of neighbors, and derives the rest of candidates from it. It is used when the
+    candidates only vary the n_neighbors, weights, p or n_jobs parameters of the last step (bool)
+    :param share_kernels: if True, the grid of an SVC computes the kernel matrices once per fold and kernel parameters
+    and fits every value of C (and of the rest of non kernel parameters) over them (bool)
+    :return: results (dict)
+    """
+    logger = logging.getLogger(__name__)
+    shared_search = None
+    if share_neighbors and _is_shared_neighbors_grid(context.estimator, candidates):
+        logger.info("Sharing the neighbor searches among the candidates of the grid")
+        shared_search = _shared_neighbors_search
+    elif share_kernels and _is_shared_kernel_grid(context.estimator, candidates):
+        logger.info("Sharing the kernel matrices among the candidates of the grid")
+        shared_search = _shared_kernel_search
+    if shared_search is None:
+        return _build_cv_results(candidates, context.evaluate(context.X, context.y, context.estimator, candidates,
+                                                              context.splits))
+    if context.cv_cache:
+        logger.warning("The fold results cache is not used when sharing the neighbor searches or kernel matrices")
+    fold_results = shared_search(context.X, context.y, context.estimator, candidates, context.splits, context.scorer,
+                                 context.n_jobs, context.verbose, context.oof_store, context.transform_times)
+    return _build_cv_results(candidates, fold_results)
+
+
+def random_search(context, candidates, n_iter=10, time_budget=None):
+    """
+    Evaluates at most n_iter random candidates within the time budget.
+    :param context: data and evaluation settings (SearchContext)
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :param n_iter: maximum number of candidates evaluated. If None, there is no limit (int|None)
+    :param time_budget: wall clock budget, in seconds. If None, there is no limit (float|None)
+    :return: results (dict)
+    """
+    candidates, fold_results = _random_search(context.X, context.y, context.estimator, candidates, context.evaluate,
+                                              context.splits, n_iter, time_budget, context.random_state)
+    return _build_cv_results(candidates, fold_results)
+
+
+def halving_search(context, candidates, factor=3, resource="n_samples", min_resources=100):
+    """
+    Runs a successive halving search. The history of the rungs is stored in the "halving_history" entry.
+    :param context: data and evaluation settings (SearchContext)
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :param factor: elimination factor (int)
+    :param resource: resource increased along the rungs: "n_samples" or the name of an integer parameter of the
+    estimator, e.g. "rf__n_estimators" (str)
+    :param min_resources: minimum amount of resources used in a rung (int)
+    :return: results (dict)
+    """
+    candidates, fold_results, history = _successive_halving(context.X, context.y, context.estimator, candidates,
+                                                            context.evaluate, context.cv, factor, resource,
+                                                            min_resources, context.random_state)
+    results = _build_cv_results(candidates, fold_results)
+    results["halving_history"] = history
+    return results
+
+
+def path_search(context, candidates, path_param=None):
+    """
+    Walks the values of a path parameter with warm starts. It does not use the fold results cache.
+    :param context: data and evaluation settings (SearchContext)
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :param path_param: parameter walked: a regularization parameter (e.g. "glmnet__alpha", "glm__C"), walked from
+    strong to weak, or an ensemble size (e.g. "rf__n_estimators"), grown incrementally. The step it belongs to must
+    support warm_start (str)
+    :return: results (dict)
+    """
+    logger = logging.getLogger(__name__)
+    assert path_param is not None, "The path search requires a path_param"
+    if context.cv_cache:
+        logger.warning("The fold results cache is not used by the path search")
+    candidates, fold_results = _warm_start_path_search(context.X, context.y, context.estimator, candidates,
+                                                       context.splits, context.scorer, path_param, context.n_jobs,
+                                                       context.verbose, context.cache_transformers,
+                                                       context.oof_store, context.transform_times)
+    return _build_cv_results(candidates, fold_results)
+
+
+def pruning_search(context, candidates, pruning="median", percentile=25, min_folds=2):
+    """
+    Scores the folds one at a time and abandons the candidates falling behind. The decision taken on every candidate
+    is stored in the "pruning_history" entry.
+    :param context: data and evaluation settings (SearchContext)
+    :param candidates: parameter sets to be evaluated (list of dicts)
+    :param pruning: "median" abandons the candidates whose running mean score is below the median of the alive
+    candidates and "percentile" the ones below the given percentile (str)
+    :param percentile: percentile used by the "percentile" rule (float)
+    :param min_folds: number of folds scored before any candidate is abandoned (int)
+    :return: results (dict)
+    """
+    candidates, fold_results, decisions = _pruning_search(context.X, context.y, context.estimator, candidates,
+                                                          context.evaluate, context.splits, pruning, percentile,
+                                                          min_folds)
+    results = _build_cv_results(candidates, fold_results)
+    results["pruning_history"] = decisions
+    return results
+
+
+# Every strategy has the signature strategy(context, candidates, **options) and returns a results dictionary with
+# the same structure as the cv_results_ attribute of GridSearchCV
+SEARCH_STRATEGIES = OrderedDict([("grid", grid_search),
+                                 ("random", random_search),
+                                 ("halving", halving_search),
+                                 ("path", path_search),
+                                 ("pruning", pruning_search)])
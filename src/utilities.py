@@ -1,13 +1,13 @@
 __author__ = "ivallesp"
+import os
 import json
 import logging
 
 
 def get_last_data_version():
     logger = logging.getLogger(__name__)
-    with open("./settings.json") as f:
-        settings = json.load(f)
-        version = settings["last_data_version"]
+    from src.common_paths import get_settings
+    version = get_settings()["last_data_version"]
     logger.info("Retrieved last data version name: {}".format(version))
     return version
 
@@ -21,4 +21,17 @@ def prettify_json(dictionary, sort_keys=True, indent=4):
     :return: prettified json (str)
     """
     report = json.dumps(dictionary, sort_keys=sort_keys, indent=indent, separators=(',', ': '))
-    return report
\ No newline at end of file
+    return report
+
+
+def replace_file(tmp_path, path):
+    """
+    Moves a complete temporary file over its destination. On POSIX the rename replaces the destination atomically, so
+    the destination never disappears. Windows can not rename over an existing file, so there it is removed first.
+    :param tmp_path: path of the temporary file (str|unicode)
+    :param path: destination path (str|unicode)
+    :return: None (void)
+    """
+    if os.name == "nt" and os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
@@ -0,0 +1,35 @@
+from unittest import TestCase
+from src.batch_inference import *
+from src.model_store import store_model, get_model_path
+from src.file_loaders import load_train_data, load_tournament_data
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
+import numpy as np
+import shutil
+
+__author__ = "ivallesp"
+
+
+class TestBatchInference(TestCase):
+    def setUp(self):
+        df_train = load_train_data("demo")
+        self.features = list(df_train.columns[df_train.columns.str.startswith("feature")])
+        self.models = {"GLMBatchTest": Pipeline([("stdsc", StandardScaler()), ("glm", LogisticRegression())]),
+                       "NBBatchTest": Pipeline([("stdsc", StandardScaler()), ("nb", GaussianNB())])}
+        for alias, model in self.models.items():
+            model.fit(df_train[self.features], df_train["target"])
+            store_model("demo", alias, model, metadata={"features": self.features})
+
+    def tearDown(self):
+        for alias in self.models:
+            shutil.rmtree(get_model_path("demo", alias), ignore_errors=True)
+
+    def test_score_stored_models(self):
+        ids, probs = score_stored_models("demo", aliases=sorted(self.models), chunksize=30, n_jobs=2)
+        df_tournament = load_tournament_data("demo")
+        assert list(probs) == sorted(self.models)
+        assert (ids == df_tournament["t_id"].values).all()
+        for alias, model in self.models.items():
+            assert np.allclose(probs[alias], model.predict_proba(df_tournament[self.features])[:, 1])
@@ -0,0 +1,60 @@
+from unittest import TestCase
+import shutil
+import tempfile
+from src.battery_profiler import *
+from sklearn.datasets import make_classification
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
+import numpy as np
+
+__author__ = "ivallesp"
+
+
+data, target = make_classification(n_samples=2000, n_features=20, random_state=655321)
+
+
+class TestBatteryProfiler(TestCase):
+    def setUp(self):
+        glm = Pipeline([("stdsc", StandardScaler()), ("glm", LogisticRegression())])
+        glm_params = {"glm__C": [1.0, 0.30, 0.05, 0.01],
+                      "glm__random_state": [655321],
+                      "glm__n_jobs": [-1]}
+        nb = Pipeline([("stdsc", StandardScaler()), ("nb", GaussianNB())])
+        self.battery = [("GLMTest", glm, glm_params), ("NBTest", nb, [{}])]
+
+    def test_fit_power_law(self):
+        coefficient, exponent = fit_power_law([100, 200, 400], [1., 4., 16.])
+        assert np.isclose(exponent, 2)
+        assert np.isclose(coefficient * 800 ** exponent, 64)
+        coefficient, exponent = fit_power_law([100, 200, 400], [1., 100., 10000.])
+        assert exponent == EXPONENT_BOUNDS[1]
+
+    def test_profile_battery(self):
+        plans = profile_battery(data, target, self.battery, cv=3, sizes=[200, 400, 800], n_profiled=2)
+        assert list(plans.keys()) == ["GLMTest", "NBTest"]
+        assert plans["GLMTest"]["n_fits"] == 4 * 3 + 1
+        assert plans["NBTest"]["n_candidates"] == 1
+        assert all(plan["total_fit_time"] > 0 for plan in plans.values())
+        assert list(get_battery_costs(plans).keys()) == ["GLMTest", "NBTest"]
+
+    def test_profile_battery_cache(self):
+        cache = tempfile.mkdtemp()
+        try:
+            plans = profile_battery(data, target, self.battery, cv=3, sizes=[200, 400], n_profiled=1, cache=cache)
+            assert len(os.listdir(cache)) == 2
+            # The stored plans are reused instead of profiling the entries again
+            assert profile_battery(data, target, self.battery, cv=3, sizes=[200, 400], n_profiled=1,
+                                   cache=cache) == plans
+        finally:
+            shutil.rmtree(cache)
+
+    def test_fit_battery_to_budget(self):
+        plans = {"GLMTest": {"n_candidates": 4, "n_fits": 13, "fit_time": 10., "total_fit_time": 130.,
+                             "peak_memory": 10.},
+                 "NBTest": {"n_candidates": 1, "n_fits": 4, "fit_time": 1., "total_fit_time": 4.,
+                            "peak_memory": 1000.}}
+        battery = fit_battery_to_budget(self.battery, plans, time_budget=70, memory_budget=100)
+        assert [alias for alias, _, _ in battery] == ["GLMTest"]
+        assert len(ParameterGrid(battery[0][2])) == 2
@@ -0,0 +1,63 @@
+from unittest import TestCase
+import os
+from src.battery_scheduler import *
+from sklearn.datasets import make_classification
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import GaussianNB
+
+__author__ = "ivallesp"
+
+
+data, target = make_classification(n_samples=500, n_features=20, random_state=655321)
+
+
+class DyingClassifier(GaussianNB):
+    def fit(self, X, y):
+        os._exit(1)
+
+
+class TestBatteryScheduler(TestCase):
+    def setUp(self):
+        glm = Pipeline([("stdsc", StandardScaler()), ("glm", LogisticRegression())])
+        glm_params = {"glm__C": [1.0, 0.30, 0.05],
+                      "glm__random_state": [655321],
+                      "glm__n_jobs": [-1]}
+        nb = Pipeline([("stdsc", StandardScaler()), ("nb", GaussianNB())])
+        self.battery = [("GLMTest", glm, glm_params), ("NBTest", nb, [{}])]
+
+    def test_estimate_battery_cost(self):
+        costs = estimate_battery_cost(self.battery, cv=3)
+        assert list(costs.keys()) == ["GLMTest", "NBTest"]
+        assert costs["GLMTest"] == ESTIMATOR_COSTS["glm"] * 3 * 3
+        assert costs["NBTest"] == ESTIMATOR_COSTS["nb"] * 3
+
+    def test_allocate_cores(self):
+        cores = allocate_cores({"a": 90, "b": 10}, n_cores=10)
+        assert cores["a"] == 9
+        assert cores["b"] == 1
+        cores = allocate_cores({"a": 90, "b": 10}, n_cores=10, max_cores={"a": 4, "b": 4})
+        assert cores["a"] == 4
+
+    def test_run_model_battery(self):
+        trained_battery = run_model_battery(data, target, self.battery, n_cores=2, cv=3)
+        assert list(trained_battery.keys()) == ["GLMTest", "NBTest"]
+        model, results = trained_battery["GLMTest"]
+        assert len(results["params"]) == 3
+        assert all(params["glm__n_jobs"] == 1 for params in results["params"])
+        assert model.predict_proba(data).shape == (500, 2)
+
+    def test_run_model_battery_dead_process(self):
+        battery = self.battery[:1] + [("DeadTest", DyingClassifier(), [{}])]
+        errors = {}
+        trained_battery = run_model_battery(data, target, battery, n_cores=2, cv=3, poll_interval=1, errors=errors)
+        assert list(trained_battery.keys()) == ["GLMTest"]
+        assert len(trained_battery["GLMTest"][1]["params"]) == 3
+        assert list(errors.keys()) == ["DeadTest"]
+
+    def test_limit_inner_threads(self):
+        previous = os.environ.get("OMP_NUM_THREADS")
+        with limit_inner_threads(1):
+            assert os.environ["OMP_NUM_THREADS"] == (previous or "1")
+        assert os.environ.get("OMP_NUM_THREADS") == previous
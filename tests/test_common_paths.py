@@ -50,3 +50,24 @@ class TestCommonPaths(TestCase):
         assert os.path.exists(path)
         shutil.rmtree(path)
         assert not os.path.exists(path)
+
+    def test_get_settings_is_cached(self):
+        settings = get_settings()
+        assert get_settings() is settings
+        stat = os.stat(SETTINGS_PATH)
+        os.utime(SETTINGS_PATH, (stat.st_atime, stat.st_mtime + 1))
+        reloaded_settings = get_settings()
+        os.utime(SETTINGS_PATH, (stat.st_atime, stat.st_mtime))
+        assert reloaded_settings is not settings
+        assert reloaded_settings == settings
+
+    def test_output_path_is_created_again_if_removed(self):
+        path = get_reports_version_path("demo")
+        shutil.rmtree(path)
+        assert get_reports_version_path("demo") == path
+        assert os.path.exists(path)
+        shutil.rmtree(path)
+
+    def test_get_models_path(self):
+        path = get_models_path()
+        assert os.path.exists(path)
@@ -0,0 +1,52 @@
+from unittest import TestCase
+from src.common_paths import *
+from src.dataset_registry import *
+import os
+import shutil
+
+__author__ = "ivallesp"
+
+
+class TestDatasetRegistry(TestCase):
+    def setUp(self):
+        self.manifest_backup = None
+        if os.path.exists(get_manifest_path()):
+            with open(get_manifest_path(), "rb") as f:
+                self.manifest_backup = f.read()
+
+    def tearDown(self):
+        if self.manifest_backup is None:
+            if os.path.exists(get_manifest_path()):
+                os.remove(get_manifest_path())
+        else:
+            with open(get_manifest_path(), "wb") as f:
+                f.write(self.manifest_backup)
+
+    def test_register_data_version(self):
+        description = register_data_version("demo")
+        assert description["archive"] == "numerai_dataset_demo.zip"
+        assert description["files"]["numerai_training_data.csv"]["n_rows"] == 99
+        assert description["files"]["numerai_tournament_data.csv"]["n_rows"] == 99
+        assert len(description["features"]) == 21
+        assert "demo" in load_manifest()["versions"]
+
+    def test_find_version_by_archive_hash(self):
+        description = register_data_version("demo")
+        assert find_version_by_archive_hash(description["archive_sha256"]) == "demo"
+        assert find_version_by_archive_hash(description["archive_sha256"], exclude="demo") is None
+        assert find_version_by_archive_hash("foo") is None
+
+    def test_link_data_version(self):
+        from src.file_loaders import load_train_data
+        # Reading from the zip validates the data and writes the validation memo of the demo folder
+        load_train_data("demo", from_zip=True)
+        version = "test_link"
+        link_data_version("demo", version)
+        path = os.path.join(get_raw_data_path(), version)
+        files = os.listdir(path)
+        source_memo = os.stat(os.path.join(get_raw_data_path(), "demo", "cache", "validation.json"))
+        linked_memo = os.stat(os.path.join(path, "cache", "validation.json"))
+        shutil.rmtree(path)
+        assert "numerai_dataset_demo.zip" in files
+        assert "numerai_training_data.csv" in files
+        assert source_memo.st_ino != linked_memo.st_ino
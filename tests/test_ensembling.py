@@ -0,0 +1,36 @@
+from unittest import TestCase
+from src.ensembling import *
+import numpy as np
+
+__author__ = "ivallesp"
+
+
+rng = np.random.RandomState(655321)
+target = rng.randint(0, 2, 2000)
+signal = np.clip(target * 0.2 + 0.4 + rng.normal(0, 0.15, (2000, 1)).ravel(), 0.01, 0.99)
+predictions = np.column_stack([np.clip(signal + rng.normal(0, 0.1, 2000), 0.01, 0.99) for _ in range(5)] +
+                              [np.full(2000, 0.5)])
+
+
+class TestEnsembling(TestCase):
+    def test_log_loss_columns(self):
+        from sklearn.metrics import log_loss
+        losses = log_loss_columns(predictions, target, batch_size=4)
+        assert np.allclose(losses, [log_loss(target, predictions[:, i]) for i in range(predictions.shape[1])])
+        assert np.isclose(log_loss_columns(predictions[:, 5], target), np.log(2))
+
+    def test_greedy_ensemble_selection(self):
+        weights, history = greedy_ensemble_selection(predictions, target, n_iter=20)
+        assert np.isclose(weights.sum(), 1)
+        assert all(a > b for a, b in zip(history, history[1:]))
+        assert np.isclose(history[-1], log_loss_columns(predictions.dot(weights), target))
+
+    def test_optimize_blend(self):
+        blends = optimize_blend(predictions, target)
+        assert set(blends) == set(BLEND_METHODS)
+        assert blends["weights"][1] <= blends["greedy"][1] + 1e-6
+        assert min(log_loss_columns(predictions, target)) > blends["weights"][1]
+
+    def test_rank_columns(self):
+        ranks = rank_columns(np.array([[0.3, 0.1], [0.1, 0.2], [0.2, 0.3]]))
+        assert np.allclose(ranks * 4, [[3, 1], [1, 2], [2, 3]])
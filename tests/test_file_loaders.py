@@ -1,5 +1,9 @@
 from unittest import TestCase
 from src.file_loaders import *
+import os
+import shutil
+import numpy as np
+import pandas as pd
 
 __author__ = "ivallesp"
 
@@ -19,3 +23,89 @@ class TestFileLoaders(TestCase):
         df_tournament_well = load_tournament_data("demo")
         assert df_train.equals(df_train_well)
         assert df_tournament.equals(df_tournament_well)
+
+    def test_load_train_data_from_cache(self):
+        from src.common_paths import get_raw_data_version_path
+        cache_path = os.path.join(get_raw_data_version_path("demo"), "cache", "numerai_training_data")
+        if os.path.exists(cache_path):
+            shutil.rmtree(cache_path)
+        df_csv = load_train_data(version="demo", use_cache=False)
+        df_first = load_train_data(version="demo")
+        assert os.path.exists(os.path.join(cache_path, "meta.json"))
+        df_cached = load_train_data(version="demo")
+        shutil.rmtree(cache_path)
+        assert df_first.equals(df_csv)
+        assert df_cached.equals(df_csv)
+
+    def test_load_tournament_data_from_cache(self):
+        df_csv = load_tournament_data(version="demo", use_cache=False)
+        load_tournament_data(version="demo")
+        df_cached = load_tournament_data(version="demo")
+        assert df_cached.equals(df_csv)
+
+    def test_load_train_data_compact_schema(self):
+        df = load_train_data(version="demo", use_cache=False, schema="compact")
+        df_well = load_train_data(version="demo", use_cache=False)
+        assert df.shape == df_well.shape
+        assert (df.dtypes[df.columns != "target"] == np.float32).all()
+        assert df["target"].dtype == np.int8
+        assert np.allclose(df.values, df_well.values, atol=1e-6)
+
+    def test_load_tournament_data_quantized_schema(self):
+        df = load_tournament_data(version="demo", use_cache=False, schema="quantized")
+        features = df.columns[df.columns.str.startswith("feature")]
+        assert (df.dtypes[features] == np.uint8).all()
+        assert df["t_id"].dtype == object
+
+    def test_iter_tournament_data(self):
+        df_whole = load_tournament_data(version="demo", use_cache=False)
+        chunks = list(iter_tournament_data(version="demo", chunksize=40, use_cache=False))
+        assert [df.shape[0] for df in chunks] == [40, 40, 19]
+        df_streamed = pd.concat(chunks, ignore_index=True)
+        assert df_streamed.equals(df_whole)
+
+    def test_iter_tournament_data_from_cache(self):
+        df_whole = load_tournament_data(version="demo")
+        chunks = list(iter_tournament_data(version="demo", chunksize=40))
+        df_streamed = pd.concat(chunks, ignore_index=True)
+        assert df_streamed.equals(df_whole)
+
+    def test_iter_tournament_data_from_zip(self):
+        df_whole = load_tournament_data(version="demo", use_cache=False)
+        chunks = list(iter_tournament_data(version="demo", chunksize=40, use_cache=False, from_zip=True))
+        df_streamed = pd.concat(chunks, ignore_index=True)
+        assert df_streamed.equals(df_whole)
+
+    def test_zip_and_csv_caches_are_separate(self):
+        from src.common_paths import get_raw_data_version_path
+        cache_folder = os.path.join(get_raw_data_version_path("demo"), "cache")
+        df_csv = load_train_data(version="demo")
+        df_zip = load_train_data(version="demo", from_zip=True)
+        assert os.path.exists(os.path.join(cache_folder, "numerai_training_data", "meta.json"))
+        assert os.path.exists(os.path.join(cache_folder, "numerai_training_data_zip", "meta.json"))
+        assert df_zip.equals(df_csv)
+
+    def test_validate_numerai_data(self):
+        df = load_train_data(version="demo")
+        report = validate_numerai_data(df, "train")
+        assert report["n_rows"] == 99
+        assert report["n_duplicates"] == 0
+
+    def test_validate_numerai_data_duplicates(self):
+        df = load_train_data(version="demo")
+        df = pd.concat([df, df.iloc[[3, 7]]], ignore_index=True)
+        with self.assertRaises(AssertionError):
+            validate_numerai_data(df, "train")
+
+    def test_validate_numerai_data_out_of_range(self):
+        df = load_tournament_data(version="demo").copy()
+        df.loc[0, "feature1"] = 1.5
+        with self.assertRaises(AssertionError):
+            validate_numerai_data(df, "tournament")
+
+    def test_load_numerai_data_from_zip(self):
+        df_train, df_tournament = load_numerai_data("demo", use_cache=False, from_zip=True)
+        df_train_well = load_train_data("demo", use_cache=False)
+        df_tournament_well = load_tournament_data("demo", use_cache=False)
+        assert df_train.equals(df_train_well)
+        assert df_tournament.equals(df_tournament_well)
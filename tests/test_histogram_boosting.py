@@ -0,0 +1,41 @@
+from unittest import TestCase
+from src.histogram_boosting import *
+from sklearn.datasets import make_classification
+from sklearn.metrics import log_loss
+from sklearn.preprocessing import MinMaxScaler
+import numpy as np
+
+__author__ = "ivallesp"
+
+
+data, target = make_classification(n_samples=1000, n_features=20, random_state=655321)
+data = MinMaxScaler().fit_transform(data)
+
+
+class TestHistogramBoosting(TestCase):
+    def test_fit(self):
+        model = HistGradientBoostingClassifier(n_estimators=50, random_state=655321).fit(data[:800], target[:800])
+        probs = model.predict_proba(data[800:])
+        assert probs.shape == (200, 2)
+        assert log_loss(target[800:], probs) < log_loss(target[800:], np.full(200, target[:800].mean()))
+        assert model.score(data[800:], target[800:]) > 0.8
+
+    def test_uint8_input(self):
+        quantized = np.round(data * 255).astype(np.uint8)
+        model = HistGradientBoostingClassifier(n_estimators=20, random_state=655321)
+        probs_float = model.fit(data, target).predict_proba(data)
+        probs_uint8 = model.fit(quantized, target).predict_proba(quantized)
+        assert np.allclose(probs_float, probs_uint8)
+
+    def test_quantile_binning(self):
+        model = HistGradientBoostingClassifier(n_estimators=20, binning="quantile", random_state=655321)
+        assert model.fit(data * 10 - 5, target).score(data * 10 - 5, target) > 0.8
+
+    def test_warm_start(self):
+        model = HistGradientBoostingClassifier(n_estimators=30, subsample=0.8, random_state=655321)
+        probs = model.fit(data, target).predict_proba(data)
+        model_warm = HistGradientBoostingClassifier(n_estimators=10, subsample=0.8, warm_start=True,
+                                                    random_state=655321).fit(data, target)
+        model_warm.set_params(n_estimators=30).fit(data, target)
+        assert len(model_warm.trees_) == 30
+        assert np.allclose(probs, model_warm.predict_proba(data))
@@ -0,0 +1,41 @@
+from unittest import TestCase
+from src.incremental_training import *
+from sklearn.datasets import make_classification
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.naive_bayes import GaussianNB
+from sklearn.linear_model import SGDClassifier, LogisticRegression
+from sklearn.neural_network import MLPClassifier
+import numpy as np
+import pandas as pd
+
+__author__ = "ivallesp"
+
+
+data, target = make_classification(n_samples=1000, n_features=10, random_state=655321)
+
+
+class TestIncrementalTraining(TestCase):
+    def test_supports_incremental_training(self):
+        assert supports_incremental_training(Pipeline([("stdsc", StandardScaler()), ("glmnet", SGDClassifier())]))
+        assert supports_incremental_training(Pipeline([("stdsc", StandardScaler()), ("nb", GaussianNB())]))
+        assert supports_incremental_training(MLPClassifier(solver="adam"))
+        assert not supports_incremental_training(MLPClassifier(solver="lbfgs"))
+        assert not supports_incremental_training(Pipeline([("stdsc", StandardScaler()),
+                                                           ("glm", LogisticRegression())]))
+
+    def test_get_new_rows(self):
+        df = pd.DataFrame(data, columns=["feature{0}".format(i) for i in range(10)])
+        df["target"] = target
+        new_rows = get_new_rows(df, df.iloc[:600])
+        assert not new_rows[:600].any()
+        assert new_rows[600:].all()
+
+    def test_partial_fit_pipeline(self):
+        model = Pipeline([("stdsc", StandardScaler()), ("nb", GaussianNB())]).fit(data[:600], target[:600])
+        model = partial_fit_pipeline(model, data[600:], target[600:])
+        full_model = Pipeline([("stdsc", StandardScaler()), ("nb", GaussianNB())]).fit(data, target)
+        # The scaler statistics are resumed, so they match the ones of a fit over all the rows
+        assert np.allclose(model.named_steps["stdsc"].mean_, full_model.named_steps["stdsc"].mean_)
+        assert np.allclose(model.named_steps["stdsc"].var_, full_model.named_steps["stdsc"].var_)
+        assert np.allclose(model.named_steps["nb"].class_count_, full_model.named_steps["nb"].class_count_)
@@ -0,0 +1,27 @@
+from unittest import TestCase
+from src.knn_engine import *
+from sklearn.datasets import make_classification
+from sklearn.neighbors import KNeighborsClassifier
+import numpy as np
+
+__author__ = "ivallesp"
+
+
+data, target = make_classification(n_samples=500, n_features=10, random_state=655321)
+
+
+class TestKnnEngine(TestCase):
+    def test_predict_proba_from_neighbors(self):
+        distances, indices = KNeighborsClassifier(n_neighbors=21).fit(data[:400], target[:400]).kneighbors(data[400:])
+        for n_neighbors in [1, 5, 21]:
+            for weights in ["uniform", "distance"]:
+                model = KNeighborsClassifier(n_neighbors=n_neighbors, weights=weights).fit(data[:400], target[:400])
+                probs = predict_proba_from_neighbors(distances, indices, target[:400], n_neighbors, weights)
+                assert np.allclose(probs, model.predict_proba(data[400:]))
+
+    def test_projected_knn(self):
+        model = ProjectedKNeighborsClassifier(n_neighbors=5, n_components=4, random_state=655321)
+        probs = model.fit(data[:400], target[:400]).predict_proba(data[400:])
+        assert probs.shape == (100, 2)
+        assert np.allclose(probs.sum(axis=1), 1)
+        assert model.score(data[400:], target[400:]) > 0.6
@@ -1,5 +1,8 @@
 from unittest import TestCase
-from model_helpers import *
+import os
+import shutil
+import tempfile
+from src.model_helpers import *
 from sklearn.datasets import make_classification
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
@@ -23,3 +26,178 @@ class TestModelHelpers(TestCase):
 
         print model
         print results
+
+    def test_train_model_with_gridsearch_memmap(self):
+        glm_pipeline = Pipeline([("stdsc", StandardScaler()), ("glm", LogisticRegression())])
+        glm_params = {"glm__C": [1.0, 0.30, 0.05],
+                      "glm__random_state": [655321]}
+
+        model, results = train_model_with_gridsearch(data, target, glm_pipeline, glm_params,
+                                                     scoring="neg_log_loss", cv=3, n_jobs=2, verbose=0, memmap=True)
+        model_no_memmap, results_no_memmap = train_model_with_gridsearch(data, target, glm_pipeline, glm_params,
+                                                                         scoring="neg_log_loss", cv=3, n_jobs=1,
+                                                                         verbose=0)
+        assert len(results["params"]) == 3
+        assert np.allclose(results["mean_test_score"], results_no_memmap["mean_test_score"])
+
+    def test_train_model_with_random_search(self):
+        glm_pipeline = Pipeline([("stdsc", StandardScaler()), ("glm", LogisticRegression())])
+        glm_params = {"glm__penalty": ["l1", "l2"],
+                      "glm__C": [1.0, 0.95, 0.90, 0.80, 0.60, 0.30, 0.05],
+                      "glm__random_state": [655321]}
+
+        model, results = train_model_with_gridsearch(data, target, glm_pipeline, glm_params,
+                                                     scoring="neg_log_loss", cv=3, n_jobs=1, verbose=0,
+                                                     search="random", n_iter=4)
+        assert len(results["params"]) == 4
+        assert model.best_params_ in results["params"]
+        assert model.score(data, target) < 0
+        assert model.predict_proba(data).shape == (1000, 2)
+
+    def test_train_model_with_halving_search(self):
+        glm_pipeline = Pipeline([("stdsc", StandardScaler()), ("glm", LogisticRegression())])
+        glm_params = {"glm__penalty": ["l1", "l2"],
+                      "glm__C": [1.0, 0.95, 0.90, 0.80, 0.60, 0.30, 0.05],
+                      "glm__random_state": [655321]}
+
+        model, results = train_model_with_gridsearch(data, target, glm_pipeline, glm_params,
+                                                     scoring="neg_log_loss", cv=3, n_jobs=1, verbose=0,
+                                                     search="halving", factor=3)
+        history = results["halving_history"]
+        assert [len(rung["params"]) for rung in history] == [14, 5, 2]
+        assert history[-1]["n_resources"] == 1000
+        assert len(results["params"]) == 2
+        assert model.predict_proba(data).shape == (1000, 2)
+
+    def test_train_model_with_gridsearch_cv_cache(self):
+        cache_folder = tempfile.mkdtemp()
+        glm_pipeline = Pipeline([("stdsc", StandardScaler()), ("glm", LogisticRegression())])
+        glm_params = {"glm__C": [1.0, 0.30],
+                      "glm__random_state": [655321]}
+        model, results = train_model_with_gridsearch(data, target, glm_pipeline, glm_params,
+                                                     scoring="neg_log_loss", cv=3, cv_cache=cache_folder)
+        glm_params["glm__C"].append(0.05)
+        model, extended_results = train_model_with_gridsearch(data, target, glm_pipeline, glm_params,
+                                                              scoring="neg_log_loss", cv=3, cv_cache=cache_folder)
+        n_cached_folds = sum(len(files) for _, _, files in os.walk(cache_folder))
+        model, auc_results = train_model_with_gridsearch(data, target, glm_pipeline, glm_params,
+                                                         scoring="roc_auc", cv=3, cv_cache=cache_folder)
+        shutil.rmtree(cache_folder)
+        assert n_cached_folds == 9
+        # A different scorer does not reuse the cached scores
+        assert all(0 < score < 1 for score in auc_results["mean_test_score"])
+        assert len(extended_results["params"]) == 3
+        # The folds of the first two candidates are read from the cache, including their fit times
+        assert extended_results["mean_fit_time"][:2] == results["mean_fit_time"]
+
+    def test_get_fold_cache_folder_fingerprints_the_data_once(self):
+        from src.model_helpers import _get_cv_splits, _get_fold_cache_folder
+        cache_folder = tempfile.mkdtemp()
+        glm = LogisticRegression()
+        scorer = check_scoring(glm, "neg_log_loss")
+        splits = _get_cv_splits(data, target, 3)
+        memo = {}
+        folders = [_get_fold_cache_folder(cache_folder, data, target, [split], glm, scorer, memo) for split in splits]
+        shutil.rmtree(cache_folder)
+        # Every fold has its own folder, but the data is fingerprinted only once
+        assert len(set(folders)) == 3
+        assert len(memo) == 1
+
+    def test_train_model_with_gridsearch_cache_transformers(self):
+        glm_pipeline = Pipeline([("stdsc", StandardScaler()), ("glm", LogisticRegression())])
+        glm_params = {"glm__C": [1.0, 0.30, 0.05],
+                      "glm__random_state": [655321]}
+        model, results = train_model_with_gridsearch(data, target, glm_pipeline, glm_params,
+                                                     scoring="neg_log_loss", cv=3, cache_transformers=True)
+        model_well, results_well = train_model_with_gridsearch(data, target, glm_pipeline, glm_params,
+                                                               scoring="neg_log_loss", cv=3)
+        assert np.allclose(results["mean_test_score"], results_well["mean_test_score"])
+        assert model.best_params_ == model_well.best_params_
+        # The transform of each fold is reported once, not added to the fit time of every candidate
+        assert len(results["transform_time"]) == 3
+
+    def test_train_model_with_path_search(self):
+        from sklearn.ensemble import RandomForestClassifier
+        rf_pipeline = Pipeline([("rf", RandomForestClassifier())])
+        rf_params = {"rf__n_estimators": [20, 5, 10],
+                     "rf__max_depth": [None, 5],
+                     "rf__random_state": [655321]}
+        model, results = train_model_with_gridsearch(data, target, rf_pipeline, rf_params,
+                                                     scoring="neg_log_loss", cv=3, search="path",
+                                                     path_param="rf__n_estimators")
+        assert len(results["params"]) == 6
+        assert results["param_rf__n_estimators"] == [5, 10, 20, 5, 10, 20]
+        assert model.predict_proba(data).shape == (1000, 2)
+
+    def test_train_model_with_regularization_path_search(self):
+        from sklearn.linear_model import SGDClassifier
+        glmnet_pipeline = Pipeline([("stdsc", StandardScaler()), ("glmnet", SGDClassifier())])
+        glmnet_params = {"glmnet__loss": ["log"],
+                         "glmnet__alpha": [0.0001, 0.01, 1],
+                         "glmnet__random_state": [655321]}
+        model, results = train_model_with_gridsearch(data, target, glmnet_pipeline, glmnet_params,
+                                                     scoring="neg_log_loss", cv=3, search="path",
+                                                     path_param="glmnet__alpha", cache_transformers=True)
+        assert results["param_glmnet__alpha"] == [1, 0.01, 0.0001]
+
+    def test_train_model_with_gridsearch_oof_store(self):
+        from src.oof_store import get_oof_store_path, load_oof_predictions, score_oof_predictions
+        alias = "test_oof_glm"
+        glm_pipeline = Pipeline([("stdsc", StandardScaler()), ("glm", LogisticRegression())])
+        glm_params = {"glm__C": [1.0, 0.05],
+                      "glm__random_state": [655321]}
+        model, results = train_model_with_gridsearch(data, target, glm_pipeline, glm_params,
+                                                     scoring="neg_log_loss", cv=3, oof_alias=alias)
+        predictions, y = load_oof_predictions(alias)
+        scores = score_oof_predictions(alias)
+        shutil.rmtree(get_oof_store_path(alias))
+        assert len(predictions) == 2
+        assert all(p.shape == (1000,) for p in predictions.values())
+        assert (y == target).all()
+        # The out of fold log loss matches the best cross validated score up to the fold weighting
+        assert np.isclose(-list(scores.values())[0], model.best_score_, atol=1e-3)
+
+    def test_train_model_with_pruning_search(self):
+        glm_pipeline = Pipeline([("stdsc", StandardScaler()), ("glm", LogisticRegression())])
+        glm_params = {"glm__C": [1.0, 0.30, 0.05, 0.001, 0.0001],
+                      "glm__random_state": [655321]}
+        model, results = train_model_with_gridsearch(data, target, glm_pipeline, glm_params,
+                                                     scoring="neg_log_loss", cv=5, search="pruning",
+                                                     pruning="median", min_folds=2)
+        n_pruned = sum(decision["pruned"] for decision in results["pruning_history"])
+        assert len(results["pruning_history"]) == 5
+        assert n_pruned > 0
+        assert len(results["params"]) == 5 - n_pruned
+        assert model.best_params_["glm__C"] != 0.0001
+
+    def test_train_model_with_shared_neighbors(self):
+        from sklearn.neighbors import KNeighborsClassifier
+        knn_pipeline = Pipeline([("stdsc", StandardScaler()), ("knn", KNeighborsClassifier())])
+        knn_params = {"knn__n_neighbors": [3, 13, 34],
+                      "knn__weights": ["uniform", "distance"],
+                      "knn__p": [1, 2]}
+        model, results = train_model_with_gridsearch(data, target, knn_pipeline, knn_params,
+                                                     scoring="neg_log_loss", cv=3)
+        model_well, results_well = train_model_with_gridsearch(data, target, knn_pipeline, knn_params,
+                                                               scoring="neg_log_loss", cv=3, share_neighbors=False)
+        assert results["params"] == results_well["params"]
+        # GridSearchCV weights the folds by their size
+        assert np.allclose(results["mean_test_score"], results_well["mean_test_score"], atol=1e-3)
+        assert model.best_params_ == model_well.best_params_
+
+    def test_train_model_with_shared_kernels(self):
+        from sklearn.svm import SVC
+        svc_pipeline = Pipeline([("stdsc", StandardScaler()), ("svc", SVC())])
+        svc_params = [{"svc__kernel": ["rbf"],
+                       "svc__C": [0.1, 1.0, 10.0],
+                       "svc__gamma": ["auto", 0.01]},
+                      {"svc__kernel": ["poly"],
+                       "svc__C": [0.1, 1.0],
+                       "svc__degree": [2]}]
+        model, results = train_model_with_gridsearch(data, target, svc_pipeline, svc_params,
+                                                     scoring="roc_auc", cv=3)
+        model_well, results_well = train_model_with_gridsearch(data, target, svc_pipeline, svc_params,
+                                                               scoring="roc_auc", cv=3, share_kernels=False)
+        assert results["params"] == results_well["params"]
+        assert np.allclose(results["mean_test_score"], results_well["mean_test_score"], atol=1e-3)
+        assert model.best_params_ == model_well.best_params_
@@ -0,0 +1,42 @@
+from unittest import TestCase
+from src.model_store import *
+from sklearn.datasets import make_classification
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.linear_model import LogisticRegression
+import numpy as np
+import pickle
+import shutil
+
+__author__ = "ivallesp"
+
+
+data, target = make_classification(n_samples=200, n_features=10, random_state=655321)
+
+
+class TestModelStore(TestCase):
+    def setUp(self):
+        self.version = "test_model_store"
+        self.model = Pipeline([("stdsc", StandardScaler()), ("glm", LogisticRegression())]).fit(data, target)
+
+    def tearDown(self):
+        from src.common_paths import get_models_version_path
+        shutil.rmtree(get_models_version_path(self.version), ignore_errors=True)
+
+    def test_store_and_load_model(self):
+        store_model(self.version, "GLMTest", self.model, metadata={"dev_score": 0.69})
+        assert has_model(self.version, "GLMTest")
+        assert list_models(self.version) == ["GLMTest"]
+        assert load_model_metadata(self.version, "GLMTest")["metadata"]["dev_score"] == 0.69
+        model = load_model(self.version, "GLMTest")
+        assert isinstance(model.named_steps["glm"].coef_, np.memmap)
+        assert np.allclose(model.predict_proba(data), self.model.predict_proba(data))
+
+    def test_lazy_model(self):
+        store_model(self.version, "GLMTest", self.model)
+        lazy_model = LazyModel(self.version, "GLMTest")
+        assert lazy_model._model is None
+        unpickled_model = pickle.loads(pickle.dumps(lazy_model))
+        assert np.allclose(unpickled_model.predict_proba(data), self.model.predict_proba(data))
+        assert unpickled_model._model is not None
+        assert lazy_model._model is None
@@ -0,0 +1,61 @@
+from unittest import TestCase
+import json
+import time
+import base64
+from src.numerai_client import *
+
+__author__ = "ivallesp"
+
+
+class _Response(object):
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return self.content
+
+
+class _RecordingSession(object):
+    def __init__(self, token):
+        self.token = token
+        self.calls = []
+
+    def post(self, url, data=None, headers=None):
+        self.calls.append(url)
+        return _Response(201, {"accessToken": self.token, "refreshToken": "refresh", "id": "id"})
+
+    def get(self, url):
+        self.calls.append(url)
+        return _Response(200, [{"start_date": "2000-01-01T00:00:00.000Z", "end_date": "2100-01-01T00:00:00.000Z",
+                                "dataset_id": "dataset", "_id": "competition"}])
+
+
+def _build_token(expiry):
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": expiry}).encode("utf-8")).decode("utf-8").rstrip("=")
+    return "header.{0}.signature".format(payload)
+
+
+class TestNumeraiClient(TestCase):
+    def test_get_token_expiry(self):
+        expiry = int(time.time()) + 3600
+        self.assertAlmostEqual(get_token_expiry(_build_token(expiry)), expiry)
+        self.assertAlmostEqual(get_token_expiry("not a token", default_ttl=100), time.time() + 100, delta=5)
+
+    def test_cached_numerapi_reuses_tokens_and_competition(self):
+        session = _RecordingSession(_build_token(int(time.time()) + 3600))
+        n_api = CachedNumerAPI("email", "password", session=session)
+        for _ in range(3):
+            self.assertEqual(n_api.login()[3], 201)
+            self.assertEqual(n_api.get_current_competition(), ("dataset", "competition", 200))
+        self.assertEqual(len(session.calls), 2)
+        n_api.invalidate_tokens()
+        n_api.login()
+        self.assertEqual(len(session.calls), 3)
+
+    def test_cached_numerapi_renews_expired_tokens(self):
+        session = _RecordingSession(_build_token(int(time.time()) + 10))
+        n_api = CachedNumerAPI("email", "password", session=session)
+        n_api.login()
+        n_api.login()
+        self.assertEqual(len(session.calls), 2)
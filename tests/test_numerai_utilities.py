@@ -15,6 +15,12 @@ class TestNumeraiUtilities(TestCase):
         n_api = get_numerai_api_access()
         assert n_api.login()[3] == 201
 
+    def test_get_numerai_secrets(self):
+        secrets = get_numerai_secrets()
+        assert "username" in secrets
+        # The parsed secrets are reused while the file does not change
+        assert get_numerai_secrets() is secrets
+
     def test_download_last_numerai_data(self):
         with open("settings.json", 'rb') as f:
             settings_backup = f.read()
@@ -63,6 +69,63 @@ class TestNumeraiUtilities(TestCase):
         assert df.columns.tolist() == ["t_id", "probability"]
         assert df.equals(pd.DataFrame({"t_id": indices, "probability": probs})[["t_id", "probability"]])
 
+    def test_build_streamed_submission(self):
+        from src.file_loaders import load_tournament_data
+
+        class ConstantEstimator(object):
+            def predict_proba(self, x):
+                return np.tile([0.4, 0.6], (x.shape[0], 1))
+
+        df_test = load_tournament_data("demo")
+        features = df_test.columns[df_test.columns != "t_id"]
+        build_streamed_submission(version="demo", estimator=ConstantEstimator(), features=features,
+                                  alias="test_demo", chunksize=40)
+        build_streamed_submission(version="demo", estimator=ConstantEstimator(), features=features,
+                                  alias="test_demo", chunksize=40, compress=True)
+        df_compressed = pd.read_csv(get_submission_filepath("demo", "test_demo", compress=True), dtype={"t_id": str})
+        df = pd.read_csv(os.path.join(get_submissions_version_path("demo"), "submission_test_demo.csv"),
+                         sep=",", decimal=".", encoding="utf-8", index_col=False, dtype={"t_id": str})
+        shutil.rmtree(os.path.join(get_submissions_version_path("demo")))
+        assert df.shape == (df_test.shape[0], 2)
+        assert df.columns.tolist() == ["t_id", "probability"]
+        assert df.t_id.tolist() == df_test.t_id.tolist()
+        assert (df.probability == 0.6).all()
+        assert df_compressed.equals(df)
+
+    def test_build_submission_compressed(self):
+        indices = ["1", "2", "3"]
+        probs = [0.1234564, 0.5, 1]
+        build_submission(version="demo", indices=indices, probs=probs, alias="test_demo", compress=True)
+        path = os.path.join(get_submissions_version_path("demo"), "submission_test_demo.csv.gz")
+        df = pd.read_csv(path, compression="gzip", dtype={"t_id": str})
+        shutil.rmtree(os.path.join(get_submissions_version_path("demo")))
+        assert df.t_id.tolist() == indices
+        assert df.probability.tolist() == [0.123456, 0.5, 1.0]
+
+    def test_compressed_submission_is_resolved(self):
+        from src.ensembling import build_blended_submission
+        indices = ["1", "2", "3"]
+        build_submission(version="demo", indices=indices, probs=[0.2, 0.4, 0.6], alias="test_demo_a", compress=True)
+        build_submission(version="demo", indices=indices, probs=[0.4, 0.6, 0.8], alias="test_demo_b")
+        path = get_submission_filepath("demo", "test_demo_a")
+        build_blended_submission(version="demo", aliases=["test_demo_a", "test_demo_b"], weights=np.array([.5, .5]),
+                                 alias="test_demo_blend")
+        df = pd.read_csv(get_submission_filepath("demo", "test_demo_blend"), dtype={"t_id": str})
+        shutil.rmtree(os.path.join(get_submissions_version_path("demo")))
+        assert path.endswith("submission_test_demo_a.csv.gz")
+        assert df.t_id.tolist() == indices
+        assert np.allclose(df.probability.values, [0.3, 0.5, 0.7])
+
+    def test_build_submissions(self):
+        indices = np.array(["1", "2", "3", "4"])
+        probs = {"test_demo_a": np.array([0.1, 0.2, 0.3, 0.4]), "test_demo_b": np.array([0.9, 0.8, 0.7, 0.6])}
+        paths = build_submissions(version="demo", indices=indices, probs=probs, n_threads=2)
+        dfs = dict((alias, pd.read_csv(path, dtype={"t_id": str})) for alias, path in paths.items())
+        shutil.rmtree(os.path.join(get_submissions_version_path("demo")))
+        for alias in probs:
+            assert dfs[alias].t_id.tolist() == indices.tolist()
+            assert np.allclose(dfs[alias].probability.values, probs[alias])
+
     def test_store_score(self):
         score = 0.655321
         alias = "foo"
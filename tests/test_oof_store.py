@@ -0,0 +1,45 @@
+from unittest import TestCase
+from src.oof_store import *
+import numpy as np
+import shutil
+
+__author__ = "ivallesp"
+
+
+class TestOofStore(TestCase):
+    def setUp(self):
+        self.alias = "test_oof_store"
+        self.y = np.array([0, 1, 1, 0])
+
+    def tearDown(self):
+        shutil.rmtree(get_oof_store_path(self.alias), ignore_errors=True)
+
+    def test_write_oof_predictions(self):
+        store_path = open_oof_store(self.alias, self.y)
+        filepath = get_oof_predictions_path(store_path, {"C": 1.0})
+        write_oof_predictions(filepath, np.array([0, 1]), np.array([0.2, 0.7]))
+        assert has_oof_predictions(filepath, np.array([0, 1]))
+        assert not has_oof_predictions(filepath, np.array([2, 3]))
+        assert len(load_oof_predictions(self.alias)[0]) == 0
+        write_oof_predictions(filepath, np.array([2, 3]), np.array([0.9, 0.4]))
+        predictions, y = load_oof_predictions(self.alias)
+        assert list(predictions) == [repr({"C": 1.0})]
+        assert np.allclose(predictions[repr({"C": 1.0})], [0.2, 0.7, 0.9, 0.4])
+        assert (y == self.y).all()
+
+    def test_open_oof_store_target_changed(self):
+        store_path = open_oof_store(self.alias, self.y)
+        filepath = get_oof_predictions_path(store_path, {"C": 1.0})
+        write_oof_predictions(filepath, np.arange(4), np.array([0.2, 0.7, 0.9, 0.4]))
+        open_oof_store(self.alias, 1 - self.y)
+        assert len(load_oof_predictions(self.alias, complete_only=False)[0]) == 0
+
+    def test_score_oof_predictions(self):
+        store_path = open_oof_store(self.alias, self.y)
+        write_oof_predictions(get_oof_predictions_path(store_path, {"C": 1.0}), np.arange(4),
+                              np.array([0.1, 0.9, 0.9, 0.1]))
+        write_oof_predictions(get_oof_predictions_path(store_path, {"C": 0.1}), np.arange(4),
+                              np.array([0.5, 0.5, 0.5, 0.5]))
+        scores = score_oof_predictions(self.alias)
+        assert list(scores) == [repr({"C": 1.0}), repr({"C": 0.1})]
+        assert np.isclose(scores[repr({"C": 0.1})], np.log(2))
@@ -0,0 +1,49 @@
+from unittest import TestCase
+import functools
+from src.search_strategies import *
+from src.model_helpers import _evaluate_candidates
+from sklearn.datasets import make_classification
+from sklearn.metrics.scorer import check_scoring
+from sklearn.model_selection import ParameterGrid
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.linear_model import LogisticRegression
+
+__author__ = "ivallesp"
+
+
+data, target = make_classification(n_samples=500, n_features=20, random_state=655321)
+
+
+class TestSearchStrategies(TestCase):
+    def setUp(self):
+        self.glm_pipeline = Pipeline([("stdsc", StandardScaler()), ("glm", LogisticRegression())])
+        self.candidates = list(ParameterGrid({"glm__C": [1.0, 0.30, 0.05], "glm__random_state": [655321]}))
+        scorer = check_scoring(self.glm_pipeline, "neg_log_loss")
+        evaluate = functools.partial(_evaluate_candidates, scorer=scorer)
+        self.context = SearchContext(data, target, self.glm_pipeline, 3, scorer, evaluate)
+
+    def test_strategies_share_the_interface(self):
+        for name, strategy in SEARCH_STRATEGIES.items():
+            options = {"path_param": "glm__C"} if name == "path" else {}
+            results = strategy(self.context, self.candidates, **options)
+            assert len(results["params"]) == len(results["mean_test_score"]) > 0
+
+    def test_fitted_search(self):
+        results = grid_search(self.context, self.candidates)
+        model = FittedSearch(self.glm_pipeline, results, "neg_log_loss").fit(data, target)
+        assert model.best_params_ == results["params"][int(np.argmax(results["mean_test_score"]))]
+        assert model.n_splits_ == 3
+        assert model.predict_proba(data).shape == (500, 2)
+        assert model.score(data, target) < 0
+        # Refitting it trains the best candidate over the new data without searching again
+        model.fit(data[:100], target[:100])
+        assert model.best_estimator_.named_steps["glm"].coef_.shape == (1, 20)
+
+    def test_resolve_gamma(self):
+        from src.search_strategies import _resolve_gamma
+        X_train = data[:100]
+        self.assertAlmostEqual(_resolve_gamma("auto", X_train), 1. / 20)
+        self.assertAlmostEqual(_resolve_gamma("auto_deprecated", X_train), 1. / 20)
+        self.assertAlmostEqual(_resolve_gamma("scale", X_train), 1. / (20 * X_train.var()))
+        self.assertEqual(_resolve_gamma(0.1, X_train), 0.1)